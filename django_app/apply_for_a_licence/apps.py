@@ -7,6 +7,8 @@ class ApplyForALicenceConfig(AppConfig):
     name = "apply_for_a_licence"
 
     def ready(self) -> None:
+        from apply_for_a_licence import signals  # noqa: F401
+
         if settings.ENVIRONMENT == "test":
             # if we're running on a test environment, we want to override the process_email_step method,
             # so we always use the same code for testing and don't send any emails
@@ -115,3 +115,11 @@ class TypeOfRelationshipChoices(models.TextChoices):
     recipient = "recipient", "Recipient"
     business = "business", "Business"
     named_individuals = "named_individuals", "Named Individuals"
+
+
+class DocumentStorageStatusChoices(models.TextChoices):
+    # waiting to be copied to the permanent bucket
+    pending = "pending", "Pending"
+    stored = "stored", "Stored"
+    # it couldn't be copied after DOCUMENT_COPY_MAX_ATTEMPTS tries
+    failed = "failed", "Failed"
@@ -11,6 +11,87 @@ from django import forms
 from django_chunk_upload_handlers.clam_av import VirusFoundInFileException
 from utils.s3 import get_all_session_files
 
+VALID_MIME_TYPES = [
+    # word documents
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.template",
+    # spreadsheets
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.template",
+    "application/vnd.ms-excel",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    # powerpoints
+    "application/vnd.ms-powerpoint",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    # pdf
+    "application/pdf",
+    # other
+    "text/plain",
+    "text/csv",
+    "application/zip",
+    "text/html",
+    # images
+    "image/jpeg",
+    "image/png",
+]
+VALID_EXTENSIONS = [
+    # word documents
+    ".doc",
+    ".docx",
+    ".odt",
+    ".fodt",
+    # spreadsheets
+    ".xls",
+    ".xlsx",
+    ".ods",
+    ".fods",
+    # powerpoints
+    ".ppt",
+    ".pptx",
+    ".odp",
+    ".fodp",
+    # pdf
+    ".pdf",
+    # other
+    ".txt",
+    ".csv",
+    ".zip",
+    ".html",
+    # images
+    ".jpeg",
+    ".jpg",
+    ".png",
+]
+# in bytes, 100MB
+MAX_DOCUMENT_SIZE = 104857600
+MAX_DOCUMENTS = 10
+
+
+def validate_document(file_name: str, original_name: str, mime_type: str | None, size: int, uploaded_documents: int) -> None:
+    """Checks that a document is one we accept, raising a ValidationError if not.
+
+    This is used by the upload form, and to check the documents that are uploaded straight to S3. The MIME type is read
+    from the file itself, so it's None if we haven't got the file yet and only the other checks are made."""
+    _, file_extension = os.path.splitext(file_name)
+    valid_extension = file_extension.lower() in VALID_EXTENSIONS
+    valid_file_types = (
+        ", ".join(VALID_EXTENSIONS[:-1]).replace(".", "").upper() + " or " + VALID_EXTENSIONS[-1].replace(".", "").upper()
+    )
+
+    if (mime_type is not None and mime_type not in VALID_MIME_TYPES) or not valid_extension:
+        raise forms.ValidationError(
+            f"{original_name} cannot be uploaded.\n\nThe selected file must be a {valid_file_types}",
+            code="invalid_file_type",
+        )
+
+    # has the user already uploaded 10 files?
+    if uploaded_documents + 1 > MAX_DOCUMENTS:
+        raise forms.ValidationError("You can only select up to 10 files at the same time", code="too_many")
+
+    # is the document too large?
+    if size > MAX_DOCUMENT_SIZE:
+        raise forms.ValidationError("The selected file must be smaller than 100 MB", code="too_large")
+
 
 class UploadDocumentsForm(BaseForm):
     revalidate_on_done = False
@@ -41,79 +122,15 @@ class UploadDocumentsForm(BaseForm):
                     "The selected file contains a virus",
                 )
 
-            # is the document a valid file type?
-            mimetype = get_mime_type(document.file)
-            valid_mimetype = mimetype in [
-                # word documents
-                "application/msword",
-                "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                "application/vnd.openxmlformats-officedocument.wordprocessingml.template",
-                # spreadsheets
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.template",
-                "application/vnd.ms-excel",
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                # powerpoints
-                "application/vnd.ms-powerpoint",
-                "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                # pdf
-                "application/pdf",
-                # other
-                "text/plain",
-                "text/csv",
-                "application/zip",
-                "text/html",
-                # images
-                "image/jpeg",
-                "image/png",
-            ]
-            valid_extensions = [
-                # word documents
-                ".doc",
-                ".docx",
-                ".odt",
-                ".fodt",
-                # spreadsheets
-                ".xls",
-                ".xlsx",
-                ".ods",
-                ".fods",
-                # powerpoints
-                ".ppt",
-                ".pptx",
-                ".odp",
-                ".fodp",
-                # pdf
-                ".pdf",
-                # other
-                ".txt",
-                ".csv",
-                ".zip",
-                ".html",
-                # images
-                ".jpeg",
-                ".jpg",
-                ".png",
-            ]
-
-            _, file_extension = os.path.splitext(document.name)
-            valid_extension = file_extension.lower() in valid_extensions
-            valid_file_types = (
-                ", ".join(valid_extensions[:-1]).replace(".", "").upper() + " or " + valid_extensions[-1].replace(".", "").upper()
+            # is the document a valid file type, are there too many, or is it too large?
+            session_files = get_all_session_files(TemporaryDocumentStorage(), self.request.session)
+            validate_document(
+                file_name=document.name,
+                # the name the user gave the file, set by the upload handler
+                original_name=getattr(document, "original_name", document.name),
+                mime_type=get_mime_type(document.file),
+                size=document.size,
+                uploaded_documents=len(session_files),
             )
 
-            if not valid_mimetype or not valid_extension:
-                raise forms.ValidationError(
-                    f"{document.original_name} cannot be uploaded.\n\nThe selected file must be a {valid_file_types}",
-                    code="invalid_file_type",
-                )
-
-            # has the user already uploaded 10 files?
-            if session_files := get_all_session_files(TemporaryDocumentStorage(), self.request.session):
-                if len(session_files) + 1 > 10:
-                    raise forms.ValidationError("You can only select up to 10 files at the same time", code="too_many")
-
-            # is the document too large?
-            if document.size > 104857600:
-                raise forms.ValidationError("The selected file must be smaller than 100 MB", code="too_large")
-
         return documents
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apply_for_a_licence", "0008_historicallicence_user_licence_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompaniesHouseCompany",
+            fields=[
+                ("company_number", models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ("company_name", models.CharField(max_length=255)),
+                ("address_line_1", models.CharField(blank=True, max_length=255)),
+                ("address_line_2", models.CharField(blank=True, max_length=255)),
+                ("locality", models.CharField(blank=True, max_length=255)),
+                ("postal_code", models.CharField(blank=True, max_length=20)),
+                ("country", models.CharField(blank=True, max_length=100)),
+                ("snapshot_date", models.DateField(db_comment="the date of the snapshot the company was last seen in")),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apply_for_a_licence", "0009_companieshousecompany"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="licence",
+            index=models.Index(fields=["created_at", "id"], name="licence_created_at_id_idx"),
+        ),
+    ]
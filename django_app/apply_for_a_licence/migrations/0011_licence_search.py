@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apply_for_a_licence", "0010_licence_created_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicallicence",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                db_comment="what caseworkers search on, set by update_search_vector()", editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="licence",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                db_comment="what caseworkers search on, set by update_search_vector()", editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="licence",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="licence_search_vector_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="licence",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["regimes"], name="licence_regimes_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="licence",
+            index=models.Index(fields=["type_of_service"], name="licence_type_of_service_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="licence",
+            index=models.Index(fields=["who_do_you_want_the_licence_to_cover"], name="licence_who_to_cover_idx"),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:38
+
+from apply_for_a_licence.utils import get_licence_reference
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def reassign_duplicate_references(apps, schema_editor):
+    """References were assigned at random before the sequence, so a few licences may share one. The first licence
+    with a reference keeps it, and the others are given a new one from the sequence, so the unique index can be
+    added. Every reference that's changed is printed, as the applicant will have been told the old one."""
+    Licence = apps.get_model("apply_for_a_licence", "Licence")
+    duplicated_references = (
+        Licence.objects.values("reference").annotate(count=Count("pk")).filter(count__gt=1).values_list("reference", flat=True)
+    )
+    for reference in list(duplicated_references):
+        for licence in Licence.objects.filter(reference=reference).order_by("created_at", "pk")[1:]:
+            while True:
+                with schema_editor.connection.cursor() as cursor:
+                    cursor.execute("SELECT nextval('licence_reference_seq')")
+                    new_reference = get_licence_reference(cursor.fetchone()[0])
+                if not Licence.objects.filter(reference=new_reference).exists():
+                    break
+            # update() so the licence's modified_at and history are left alone
+            Licence.objects.filter(pk=licence.pk).update(reference=new_reference)
+            print(f"\n  Licence {licence.pk} shared the reference {reference!r}, and has been given {new_reference!r}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apply_for_a_licence", "0011_licence_search"),
+    ]
+
+    operations = [
+        # one number for each of the 16^6 references, see get_licence_reference()
+        migrations.RunSQL(
+            "CREATE SEQUENCE licence_reference_seq MINVALUE 0 MAXVALUE 16777215 START 0",
+            reverse_sql="DROP SEQUENCE licence_reference_seq",
+        ),
+        migrations.RunPython(reassign_duplicate_references, reverse_code=migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="historicallicence",
+            name="reference",
+            field=models.CharField(db_index=True, max_length=6),
+        ),
+        migrations.AlterField(
+            model_name="licence",
+            name="reference",
+            field=models.CharField(max_length=6, unique=True),
+        ),
+    ]
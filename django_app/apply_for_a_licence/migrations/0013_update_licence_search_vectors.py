@@ -0,0 +1,58 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+
+# the licences are updated this many at a time, each batch in its own transaction, so the table isn't locked while
+# all of them are
+BATCH_SIZE = 500
+
+
+def update_search_vectors(apps, schema_editor):
+    # the same as Licence.get_search_vector(), as the model can't be used in a migration
+    Licence = apps.get_model("apply_for_a_licence", "Licence")
+    Organisation = apps.get_model("apply_for_a_licence", "Organisation")
+    organisations = (
+        Organisation.objects.filter(licence=OuterRef("pk"), type_of_relationship__in=["business", "recipient"])
+        .values("licence")
+        .annotate(
+            text=StringAgg(
+                Concat("name", Value(" "), Coalesce("registered_company_number", Value("")), output_field=TextField()),
+                delimiter=" ",
+            )
+        )
+        .values("text")
+    )
+    search_vector = SearchVector(
+        "reference",
+        "applicant_full_name",
+        "applicant_user_email_address",
+        Subquery(organisations, output_field=TextField()),
+        config="simple",
+        weight="A",
+    ) + SearchVector("service_activities", "purpose_of_provision", config="english", weight="C")
+
+    last_pk = None
+    while True:
+        licences = Licence.objects.order_by("pk")
+        if last_pk is not None:
+            licences = licences.filter(pk__gt=last_pk)
+        batch = list(licences.values_list("pk", flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        Licence.objects.filter(pk__in=batch).update(search_vector=search_vector)
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+    # each batch is committed as it's done, see BATCH_SIZE
+    atomic = False
+
+    dependencies = [
+        ("apply_for_a_licence", "0012_licence_reference_unique"),
+    ]
+
+    operations = [
+        migrations.RunPython(update_search_vectors, reverse_code=migrations.RunPython.noop),
+    ]
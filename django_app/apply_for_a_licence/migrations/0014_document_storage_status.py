@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apply_for_a_licence", "0013_update_licence_search_vectors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="copy_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="last_copy_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="storage_status",
+            field=models.CharField(
+                choices=[("pending", "Pending"), ("stored", "Stored"), ("failed", "Failed")],
+                db_comment="whether the file has been copied to the permanent bucket yet",
+                default="stored",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicaldocument",
+            name="copy_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="historicaldocument",
+            name="last_copy_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="historicaldocument",
+            name="storage_status",
+            field=models.CharField(
+                choices=[("pending", "Pending"), ("stored", "Stored"), ("failed", "Failed")],
+                db_comment="whether the file has been copied to the permanent bucket yet",
+                default="stored",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                condition=models.Q(("storage_status", "pending")), fields=["created_at"], name="document_pending_storage_idx"
+            ),
+        ),
+    ]
@@ -1,19 +1,28 @@
 # mypy: disable-error-code="attr-defined,misc"
-import uuid
+from typing import Any
 
 from core.document_storage import PermanentDocumentStorage
 from core.models import BaseModel, BaseModelID
 from django.contrib.auth.models import User
+from django.contrib.postgres.aggregates import StringAgg
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    CombinedSearchVector,
+    SearchVector,
+    SearchVectorField,
+)
 from django.contrib.sessions.models import Session
-from django.db import models
-from django.db.models import QuerySet
+from django.db import connection, models
+from django.db.models import OuterRef, QuerySet, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat
 from django.forms import model_to_dict
 from django_countries.fields import CountryField
 from utils.companies_house import get_formatted_address
 
 from . import choices
 from .types import Licensee
+from .utils import get_licence_reference
 
 
 class Licence(BaseModel):
@@ -22,7 +31,7 @@ class Licence(BaseModel):
     licensing_grounds = ArrayField(models.CharField(choices=choices.LicensingGroundsChoices.choices), null=True)
     licensing_grounds_legal_advisory = ArrayField(models.CharField(choices=choices.LicensingGroundsChoices.choices), null=True)
     regimes = ArrayField(base_field=models.CharField(max_length=255), blank=True, null=True)
-    reference = models.CharField(max_length=6)
+    reference = models.CharField(max_length=6, unique=True)
     business_registered_on_companies_house = models.CharField(
         choices=choices.YesNoDoNotKnowChoices.choices,
         max_length=11,
@@ -58,15 +67,72 @@ class Licence(BaseModel):
     applicant_business = models.CharField(max_length=300, verbose_name="Business you work for", blank=False, null=True)
     applicant_role = models.CharField(max_length=255, blank=False, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    search_vector = SearchVectorField(
+        null=True, editable=False, db_comment="what caseworkers search on, set by update_search_vector()"
+    )
+
+    class Meta:
+        indexes = [
+            # the list of applications is paged through in the order they were created, in either direction
+            models.Index(fields=["created_at", "id"], name="licence_created_at_id_idx"),
+            GinIndex(fields=["search_vector"], name="licence_search_vector_idx"),
+            # the list of applications can be filtered by these
+            GinIndex(fields=["regimes"], name="licence_regimes_idx"),
+            models.Index(fields=["type_of_service"], name="licence_type_of_service_idx"),
+            models.Index(fields=["who_do_you_want_the_licence_to_cover"], name="licence_who_to_cover_idx"),
+        ]
 
     def assign_reference(self) -> str:
-        """Assigns a unique reference to this Licence object"""
-        reference = uuid.uuid4().hex[:6].upper()
-        if self.__class__.objects.filter(reference=reference).exists():
-            return self.assign_reference()
+        """Assigns a unique reference to this Licence object, from the next number in the licence_reference_seq
+        sequence"""
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval('licence_reference_seq')")
+                reference = get_licence_reference(cursor.fetchone()[0])
+            # the sequence never repeats a reference, but one may have been assigned at random before it was used
+            if not self.__class__.objects.filter(reference=reference).exists():
+                break
         self.reference = reference
         return reference
 
+    @staticmethod
+    def get_search_vector() -> CombinedSearchVector:
+        """Returns the expression for a licence's search_vector. Names, references and numbers are matched as they're
+        written, whereas the descriptions of the services are stemmed, so e.g. "advise" matches "advising"."""
+        organisations = (
+            Organisation.objects.filter(
+                licence=OuterRef("pk"),
+                type_of_relationship__in=[
+                    choices.TypeOfRelationshipChoices.business,
+                    choices.TypeOfRelationshipChoices.recipient,
+                ],
+            )
+            .values("licence")
+            .annotate(
+                text=StringAgg(
+                    Concat("name", Value(" "), Coalesce("registered_company_number", Value("")), output_field=TextField()),
+                    delimiter=" ",
+                )
+            )
+            .values("text")
+        )
+        return SearchVector(
+            "reference",
+            "applicant_full_name",
+            "applicant_user_email_address",
+            Subquery(organisations, output_field=TextField()),
+            config="simple",
+            weight="A",
+        ) + SearchVector("service_activities", "purpose_of_provision", config="english", weight="C")
+
+    def update_search_vector(self) -> None:
+        """Updates what caseworkers search this application on. This is done by the signals whenever the application,
+        or the businesses and recipients on it, are saved, so only needs to be called after they're bulk created or
+        changed with update()."""
+        self.__class__.objects.filter(pk=self.pk).update(search_vector=self.get_search_vector())
+        # so saving this instance again doesn't overwrite it
+        self.refresh_from_db(fields=["search_vector"])
+
     @property
     def recipients(self) -> "QuerySet[Organisation]":
         return self.organisations.filter(type_of_relationship=choices.TypeOfRelationshipChoices.recipient)
@@ -75,7 +141,10 @@ class Licence(BaseModel):
         licensees = []
 
         if self.who_do_you_want_the_licence_to_cover == choices.WhoDoYouWantTheLicenceToCoverChoices.business:
-            for organisation in self.organisations.filter(type_of_relationship=choices.TypeOfRelationshipChoices.business):
+            # filtered here rather than in the database, so organisations that have been prefetched are used
+            for organisation in self.organisations.all():
+                if organisation.type_of_relationship != choices.TypeOfRelationshipChoices.business:
+                    continue
                 licensees.append(
                     Licensee(
                         name=organisation.name,
@@ -207,9 +276,58 @@ class Document(BaseModel):
         # if we're storing the document in the DB, we can assume it's in the permanent bucket
         storage=PermanentDocumentStorage(),
     )
+    storage_status = models.CharField(
+        max_length=10,
+        choices=choices.DocumentStorageStatusChoices.choices,
+        default=choices.DocumentStorageStatusChoices.stored,
+        db_comment="whether the file has been copied to the permanent bucket yet",
+    )
+    copy_attempts = models.PositiveSmallIntegerField(default=0)
+    last_copy_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(storage_status=choices.DocumentStorageStatusChoices.pending),
+                name="document_pending_storage_idx",
+            ),
+        ]
+
+    @property
+    def is_stored(self) -> bool:
+        return self.storage_status == choices.DocumentStorageStatusChoices.stored
 
     def file_name(self) -> str:
         return self.file.name.split("/")[-1]
 
     def url(self) -> str:
         return self.file.url
+
+
+class CompaniesHouseCompany(models.Model):
+    """A company from the Companies House Basic Company Data snapshot, so a company number can be looked up without
+    calling the Companies House API. The snapshot is loaded with the ingest_companies_house_snapshot command."""
+
+    company_number = models.CharField(max_length=8, primary_key=True)
+    company_name = models.CharField(max_length=255)
+    address_line_1 = models.CharField(max_length=255, blank=True)
+    address_line_2 = models.CharField(max_length=255, blank=True)
+    locality = models.CharField(max_length=255, blank=True)
+    postal_code = models.CharField(max_length=20, blank=True)
+    country = models.CharField(max_length=100, blank=True)
+    snapshot_date = models.DateField(db_comment="the date of the snapshot the company was last seen in")
+
+    def get_company_details(self) -> dict[str, Any]:
+        """Returns the company's details in the same shape as the Companies House API does."""
+        return {
+            "company_number": self.company_number,
+            "company_name": self.company_name,
+            "registered_office_address": {
+                "address_line_1": self.address_line_1,
+                "address_line_2": self.address_line_2,
+                "locality": self.locality,
+                "postal_code": self.postal_code,
+                "country": self.country,
+            },
+        }
@@ -0,0 +1,43 @@
+import logging
+from typing import Any
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from utils.pdf import PDF_CACHE_PREFIX, delete_cached_pdfs
+
+from .models import Document, Individual, Licence, Organisation
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Organisation)
+@receiver(post_save, sender=Individual)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Organisation)
+@receiver(post_delete, sender=Individual)
+@receiver(post_delete, sender=Document)
+def touch_licence(sender: Any, instance: Organisation | Individual | Document, **kwargs: object) -> None:
+    """Bump the modified_at of the licence when one of its related objects changes, and update what it's searched on.
+
+    The cached PDFs of a licence are keyed on its modified_at, so this stops a stale PDF being served. We use update()
+    so this doesn't create a historical record of the licence."""
+    Licence.objects.filter(pk=instance.licence_id).update(modified_at=timezone.now(), search_vector=Licence.get_search_vector())
+
+
+@receiver(post_save, sender=Licence)
+def update_licence_search_vector(sender: Any, instance: Licence, **kwargs: object) -> None:
+    """Update what the licence is searched on whenever it's saved. update() doesn't send post_save, so this doesn't
+    call itself."""
+    Licence.objects.filter(pk=instance.pk).update(search_vector=Licence.get_search_vector())
+
+
+@receiver(post_delete, sender=Licence)
+def delete_licence_cached_pdfs(sender: Any, instance: Licence, **kwargs: object) -> None:
+    """Remove the cached PDFs of a licence when it's deleted."""
+    if instance.reference:
+        try:
+            delete_cached_pdfs(f"{PDF_CACHE_PREFIX}/{instance.reference}/")
+        except (BotoCoreError, ClientError):
+            logger.exception(f"Failed to delete the cached PDFs of licence {instance.reference}")
@@ -32,6 +32,11 @@ views_business_urls = [
         views_business.DoYouKnowTheRegisteredCompanyNumberView.as_view(),
         name="do_you_know_the_registered_company_number",
     ),
+    path(
+        "company-details/<str:company_number>",
+        views_business.CompanyDetailsView.as_view(),
+        name="company_details",
+    ),
     path(
         "where-business-located/<uuid:business_uuid>",
         views_business.WhereIsTheBusinessLocatedView.as_view(),
@@ -142,6 +147,9 @@ views_grounds_purpose_urls = [
 views_documents_urls = [
     path("upload-documents", views_documents.UploadDocumentsView.as_view(), name="upload_documents"),
     path("delete-documents", views_documents.DeleteDocumentsView.as_view(), name="delete_documents"),
+    path("start-document-upload", views_documents.StartDirectUploadView.as_view(), name="start_direct_upload"),
+    path("complete-document-upload", views_documents.CompleteDirectUploadView.as_view(), name="complete_direct_upload"),
+    path("document-upload-status", views_documents.DirectUploadStatusView.as_view(), name="direct_upload_status"),
     path("download-document/<str:file_name>", views_documents.DownloadDocumentView.as_view(), name="download_document"),
 ]
 
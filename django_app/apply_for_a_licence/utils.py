@@ -1,20 +1,118 @@
+import copy
+import hashlib
+import json
+from typing import Any
+
+from django import forms
 from django.conf import settings
+from django.forms.models import construct_instance
+from django.forms.utils import ErrorDict
 from django.http import HttpRequest
 
+# licence references are 6 hexadecimal characters, so there are 16^6 (2^24) of them
+LICENCE_REFERENCE_MASK = 0xFFFFFF
+
+# the session key under which the result of validating each step is kept, so it's not revalidated needlessly
+VALIDATED_STEPS_SESSION_KEY = "validated_steps"
+
 
 def get_dirty_form_data(request: HttpRequest, step_name: str) -> dict:
     """Get the dirty form data from the session."""
     return request.session.get(step_name, {})
 
 
-def get_cleaned_data_for_step(request: HttpRequest, step_name: str) -> dict:
-    """Helper function to get the cleaned data for a particular step"""
+def compact_dirty_form_data(form: forms.Form) -> dict[str, Any]:
+    """Returns the dirty data of a submitted form in the compact shape it's kept in the session."""
+    form_data = dict(form.data.copy())
+
+    # first get rid of some useless cruft
+    form_data.pop("csrfmiddlewaretoken", None)
+    form_data.pop("encoding", None)
+
+    # Django QueryDict is a weird beast, we need to check if the key maps to a list of values (as it does with a
+    # multi-select field) and if it does, we need to convert it to a list. If not, we can just keep the value as is.
+    # We also need to keep the value as it is if the form is an ArrayField.
+    for key, value in form_data.items():
+        if not isinstance(form.fields.get(key), forms.MultipleChoiceField):
+            if len(value) == 1:
+                form_data[key] = value[0]
+
+    return form_data
+
+
+def get_dirty_data_hash(dirty_data: dict) -> str:
+    return hashlib.sha256(json.dumps(dirty_data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_validated_step(request: HttpRequest, step_name: str, dirty_data: dict, form: forms.Form) -> None:
+    """Keeps the result of validating a step's dirty data in the session, so it can be reused until the data changes.
+
+    The cleaned data is only kept if it survives being stored in the (JSON) session as it is, e.g. forms that clean
+    their data into files or dates are revalidated every time."""
+    cleaned_data = form.cleaned_data if form.is_valid() else None
+    try:
+        if cleaned_data is not None and json.loads(json.dumps(cleaned_data)) != cleaned_data:
+            return
+    except (TypeError, ValueError):
+        return
+
+    validated_steps = request.session.get(VALIDATED_STEPS_SESSION_KEY, {})
+    validated_steps[step_name] = {"hash": get_dirty_data_hash(dirty_data), "cleaned_data": cleaned_data}
+    request.session[VALIDATED_STEPS_SESSION_KEY] = validated_steps
+
+    # the form this request has already validated for the step might be out of date now
+    getattr(request, "_validated_forms", {}).pop(step_name, None)
+
+
+def restore_validated_form(form: forms.Form, cleaned_data: dict[str, Any]) -> forms.Form:
+    """Makes a bound form look as if it's been validated, without running its (potentially expensive) clean methods."""
+    form.cleaned_data = cleaned_data
+    form._errors = ErrorDict()
+    if isinstance(form, forms.ModelForm):
+        form.instance = construct_instance(form, form.instance, form._meta.fields, form._meta.exclude)
+    return form
+
+
+def get_validated_form(request: HttpRequest, step_name: str) -> forms.Form | None:
+    """Returns the form for a step bound to, and validated against, its dirty data in the session, or None if the data
+    isn't valid.
+
+    A step is only revalidated when its dirty data has changed since it was last validated. Forms with
+    revalidate_on_done = False (e.g. ones that verify a one-time code) are never revalidated once they've been
+    validated successfully, as their data can become invalid with time, or validating it has side effects."""
     from apply_for_a_licence.urls import step_to_view_dict
 
-    view_class = step_to_view_dict[step_name]
-    form_class = view_class.form_class
-    form = form_class(get_dirty_form_data(request, step_name), request=request)
-    if form.is_valid():
+    # the same forms are often asked for more than once in the same request, only build them once
+    if not hasattr(request, "_validated_forms"):
+        request._validated_forms = {}
+    if step_name in request._validated_forms:
+        return request._validated_forms[step_name]
+
+    form_class = step_to_view_dict[step_name].form_class
+    dirty_data = get_dirty_form_data(request, step_name)
+    form = form_class(dirty_data, request=request)
+
+    validated_step = request.session.get(VALIDATED_STEPS_SESSION_KEY, {}).get(step_name)
+    if validated_step and (
+        validated_step["hash"] == get_dirty_data_hash(dirty_data)
+        or (validated_step["cleaned_data"] is not None and not form_class.revalidate_on_done)
+    ):
+        if validated_step["cleaned_data"] is None:
+            form = None
+        else:
+            form = restore_validated_form(form, copy.deepcopy(validated_step["cleaned_data"]))
+    else:
+        cache_validated_step(request, step_name, dirty_data, form)
+        if not form.is_valid():
+            form = None
+
+    request._validated_forms[step_name] = form
+    return form
+
+
+def get_cleaned_data_for_step(request: HttpRequest, step_name: str) -> dict:
+    """Helper function to get the cleaned data for a particular step"""
+    if form := get_validated_form(request, step_name):
         return form.cleaned_data
     else:
         return {}
@@ -33,12 +131,7 @@ def get_all_cleaned_data(request: HttpRequest) -> dict:
 
 
 def get_form(request: HttpRequest, step_name: str) -> dict:
-    from apply_for_a_licence.urls import step_to_view_dict
-
-    view_class = step_to_view_dict[step_name]
-    form_class = view_class.form_class
-    form = form_class(get_dirty_form_data(request, step_name), request=request)
-    if form.is_valid():
+    if form := get_validated_form(request, step_name):
         return form
     else:
         return {}
@@ -68,3 +161,18 @@ def get_active_regimes() -> list[dict[str, str]]:
         active_regimes = []
 
     return active_regimes
+
+
+def get_licence_reference(number: int) -> str:
+    """Returns the licence reference for a number from the licence_reference_seq sequence.
+
+    Each step is reversible on 24 bits (multiplying by an odd number, adding, and XORing with a right shift), so every
+    number maps to a different reference, while consecutive numbers give references that look unrelated."""
+    if not 0 <= number <= LICENCE_REFERENCE_MASK:
+        raise ValueError(f"{number} is outside the range of licence references")
+
+    number = (number * 0x5BD1E9 + 0x3C6EF3) & LICENCE_REFERENCE_MASK
+    number ^= number >> 13
+    number = (number * 0x27D4EB) & LICENCE_REFERENCE_MASK
+    number ^= number >> 11
+    return f"{number:06X}"
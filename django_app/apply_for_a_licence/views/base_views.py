@@ -1,5 +1,6 @@
 from typing import Any
 
+from apply_for_a_licence.utils import compact_dirty_form_data
 from core.forms.base_forms import BaseForm
 from core.views.base_views import BaseFormView
 from django.http import HttpResponse
@@ -80,7 +81,7 @@ class AddAnEntityView(BaseFormView):
         """Override this method to return the data you want to store in the session."""
         return {
             "cleaned_data": form.cleaned_data,
-            "dirty_data": form.data,
+            "dirty_data": compact_dirty_form_data(form),
         }
 
     def get_session_data(self, session_data: dict[str, Any]) -> dict[str, Any]:
@@ -1,17 +1,31 @@
+import inspect
 import logging
 import urllib.parse
 import uuid
 from typing import Any, Dict
 
+from apply_for_a_licence.exceptions import (
+    CompaniesHouse500Error,
+    CompaniesHouseException,
+)
 from apply_for_a_licence.forms import forms_business as forms
+from apply_for_a_licence.utils import compact_dirty_form_data
 from apply_for_a_licence.views.base_views import AddAnEntityView, DeleteAnEntityView
+from asgiref.sync import sync_to_async
+from authentication.mixins import LoginRequiredMixin
 from core.views.base_views import BaseFormView
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
+from django.views.generic import View
+from django_ratelimit.core import is_ratelimited
 from django_ratelimit.decorators import ratelimit
+from utils.companies_house import (
+    get_details_from_companies_house,
+    get_formatted_address,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -96,7 +110,7 @@ class DoYouKnowTheRegisteredCompanyNumberView(BaseFormView):
                 "readable_address": form.cleaned_data["registered_office_address"],
                 "companies_house": True,
             },
-            "dirty_data": form.data,
+            "dirty_data": compact_dirty_form_data(form),
         }
         self.request.session["companies_house_businesses"] = companies_house_businesses
         return super().form_valid(form)
@@ -121,9 +135,56 @@ class DoYouKnowTheRegisteredCompanyNumberView(BaseFormView):
     def get_context_data(self, **kwargs: object) -> dict[str, Any]:
         context = super().get_context_data()
         context["page_title"] = "Registered Company Number"
+        # the page looks the company up as soon as a valid number has been entered, with 00000000 replaced by the number
+        context["company_details_url"] = reverse("company_details", kwargs={"company_number": "00000000"})
         return context
 
 
+class CompanyDetailsView(LoginRequiredMixin, View):
+    """Looks up a company as soon as its number has been entered on DoYouKnowTheRegisteredCompanyNumberView, so the
+    details are already cached by the time the form is submitted. Returns the company's name and address as JSON.
+
+    It's asynchronous so that waiting on Companies House doesn't tie up a worker."""
+
+    http_method_names = ["get"]
+
+    async def dispatch(self, request: HttpRequest, *args: object, **kwargs: object) -> HttpResponse:
+        # checking the user is logged in can hit the database, so it's done in a thread. If they are, we get back the
+        # coroutine for the handler, otherwise the redirect to the login page
+        response = await sync_to_async(super().dispatch)(request, *args, **kwargs)
+        if inspect.iscoroutine(response):
+            response = await response
+        return response
+
+    async def get(self, request: HttpRequest, company_number: str, *args: object, **kwargs: object) -> JsonResponse:
+        # the same policy as submitting the form, but counted separately so looking a company up ahead of time doesn't
+        # use up the user's attempts at submitting it
+        limited = await sync_to_async(is_ratelimited)(
+            request, group="company_details", key="ip", rate=settings.RATELIMIT, increment=True
+        )
+        if limited:
+            return JsonResponse({"success": False}, status=429)
+
+        if not (company_number.isdigit() and len(company_number) == 8):
+            return JsonResponse({"success": False}, status=400)
+
+        try:
+            company_details = await sync_to_async(get_details_from_companies_house)(company_number)
+        except CompaniesHouseException:
+            return JsonResponse({"success": False}, status=404)
+        except CompaniesHouse500Error:
+            return JsonResponse({"success": False}, status=503)
+
+        return JsonResponse(
+            {
+                "success": True,
+                "company_number": company_details["company_number"],
+                "company_name": company_details["company_name"],
+                "registered_office_address": get_formatted_address(company_details["registered_office_address"]),
+            }
+        )
+
+
 class ManualCompaniesHouseInputView(BaseFormView):
     form_class = forms.ManualCompaniesHouseInputForm
     template_name = "apply_for_a_licence/form_steps/manual_companies_house_input.html"
@@ -140,10 +201,14 @@ class CheckCompanyDetailsView(BaseFormView):
 
     def get_context_data(self, **kwargs) -> Dict[str, Any]:
         context = super().get_context_data(**kwargs)
-        context["company_details"] = self.request.session["companies_house_businesses"][self.kwargs["business_uuid"]][
-            "cleaned_data"
-        ]
-        context["business_uuid"] = self.kwargs["business_uuid"]
+        business_uuid = self.kwargs["business_uuid"]
+        # once the details have been confirmed, they're moved to the business list
+        company_details = (
+            self.request.session.get("companies_house_businesses", {}).get(business_uuid)
+            or self.request.session["businesses"][business_uuid]
+        )
+        context["company_details"] = company_details["cleaned_data"]
+        context["business_uuid"] = business_uuid
         return context
 
     def form_valid(self, form):
@@ -153,20 +218,20 @@ class CheckCompanyDetailsView(BaseFormView):
         self.business_uuid = self.kwargs.get("business_uuid", str(uuid.uuid4()))
         # used to display the business_uuid data in business_added.html
 
-        company_details = self.request.session["companies_house_businesses"][self.kwargs["business_uuid"]]["cleaned_data"]
-        company_details_dirty_data = self.request.session["companies_house_businesses"][self.kwargs["business_uuid"]][
-            "dirty_data"
-        ]
-        current_businesses[self.business_uuid] = {
-            "cleaned_data": {
-                "company_number": company_details["company_number"],
-                "name": company_details["name"],
-                "readable_address": company_details["readable_address"],
-                "companies_house": True,
-            },
-            "dirty_data": company_details_dirty_data,
-        }
-        self.request.session["businesses"] = current_businesses
+        # move the business from the companies house list, rather than keeping it in the session twice
+        companies_house_businesses = self.request.session.get("companies_house_businesses", {})
+        if company_details := companies_house_businesses.pop(self.kwargs["business_uuid"], None):
+            current_businesses[self.business_uuid] = {
+                "cleaned_data": {
+                    "company_number": company_details["cleaned_data"]["company_number"],
+                    "name": company_details["cleaned_data"]["name"],
+                    "readable_address": company_details["cleaned_data"]["readable_address"],
+                    "companies_house": True,
+                },
+                "dirty_data": company_details["dirty_data"],
+            }
+            self.request.session["companies_house_businesses"] = companies_house_businesses
+            self.request.session["businesses"] = current_businesses
         return super().form_valid(form)
 
 
@@ -1,5 +1,5 @@
 import logging
-import uuid
+import os
 from typing import Any
 
 from apply_for_a_licence.forms import forms_documents as forms
@@ -7,16 +7,28 @@ from authentication.mixins import LoginRequiredMixin
 from core.document_storage import TemporaryDocumentStorage
 from core.utils import is_ajax
 from core.views.base_views import BaseFormView
-from django.core.cache import cache
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.forms import Form
-from django.http import Http404, HttpResponse, JsonResponse
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
 from django.views.generic import View
+from utils.background import run_in_background
+from utils.document_uploads import (
+    DocumentUploadStatus,
+    check_uploaded_document,
+    get_document_upload_statuses,
+    remove_document_upload_status,
+    set_document_upload_status,
+    start_document_upload,
+)
 from utils.s3 import (
+    add_user_uploaded_file,
     generate_presigned_url,
     get_all_session_files,
     get_user_uploaded_files,
+    remove_user_uploaded_file,
 )
 
 logger = logging.getLogger(__name__)
@@ -41,6 +53,7 @@ class UploadDocumentsView(BaseFormView):
         context = super().get_context_data(**kwargs)
         if session_files := get_all_session_files(TemporaryDocumentStorage(), self.request.session):
             context["session_files"] = session_files
+        context["direct_uploads_enabled"] = settings.DIRECT_UPLOADS_ENABLED
         return context
 
     def form_valid(self, form: Form) -> HttpResponse:
@@ -48,10 +61,8 @@ class UploadDocumentsView(BaseFormView):
 
         If the request is not Ajax, redirect to the summary page (the next step in the form)."""
         for temporary_file in form.cleaned_data["document"]:
-            # adding the file name to the cache, so we can retrieve it later and confirm they uploaded it
-            # we add a unique identifier to the key, so we do not overwrite previous uploads
-            redis_cache_key = f"{self.request.session.session_key}{uuid.uuid4()}"
-            cache.set(redis_cache_key, temporary_file.original_name)
+            # adding the file name to the session's index of uploaded files, so we can confirm they uploaded it later
+            add_user_uploaded_file(self.request.session, temporary_file.original_name)
 
             if is_ajax(self.request):
                 # if it's an AJAX request, then files are sent to this view one at a time, so we can return a response
@@ -87,6 +98,8 @@ class DeleteDocumentsView(LoginRequiredMixin, View):
         if file_name := self.request.GET.get("file_name"):
             object_key = f"{self.request.session.session_key}/{file_name}"
             TemporaryDocumentStorage().delete(object_key)
+            remove_user_uploaded_file(self.request.session, file_name)
+            remove_document_upload_status(self.request.session.session_key, file_name)
             if is_ajax(self.request):
                 return JsonResponse({"success": True}, status=200)
             else:
@@ -98,6 +111,75 @@ class DeleteDocumentsView(LoginRequiredMixin, View):
             return redirect(reverse("upload_documents"))
 
 
+class DirectUploadMixin:
+    """Views used by JS users to upload documents straight to S3, only available if direct uploads are enabled."""
+
+    http_method_names = ["post"]
+
+    def dispatch(self, request: HttpRequest, *args: object, **kwargs: object) -> HttpResponse:
+        if not settings.DIRECT_UPLOADS_ENABLED:
+            raise Http404()
+        return super().dispatch(request, *args, **kwargs)  # type: ignore[misc]
+
+    def get_file_name(self) -> str:
+        # the file is stored in the session's folder, so it can't have a path of its own
+        return os.path.basename(self.request.POST.get("file_name", "").strip())
+
+
+class StartDirectUploadView(LoginRequiredMixin, DirectUploadMixin, View):
+    """Checks a document can be uploaded, and returns a presigned POST the browser can use to upload it to S3."""
+
+    def post(self, *args: object, **kwargs: object) -> HttpResponse:
+        file_name = self.get_file_name()
+        try:
+            size = int(self.request.POST.get("size", ""))
+        except ValueError:
+            size = None
+        if not file_name or size is None:
+            return JsonResponse({"success": False}, status=400)
+
+        try:
+            presigned_upload = start_document_upload(self.request.session.session_key, file_name, size)
+        except ValidationError as e:
+            return JsonResponse({"success": False, "error": e.messages[0], "file_name": file_name}, status=200)
+
+        return JsonResponse(
+            {"success": True, "file_name": file_name, "url": presigned_upload["url"], "fields": presigned_upload["fields"]},
+            status=200,
+        )
+
+
+class CompleteDirectUploadView(LoginRequiredMixin, DirectUploadMixin, View):
+    """Called by the browser once it's uploaded a document to S3, so it's checked in the background."""
+
+    def post(self, *args: object, **kwargs: object) -> HttpResponse:
+        file_name = self.get_file_name()
+        upload_status = get_document_upload_statuses(self.request.session.session_key).get(file_name)
+        if not upload_status or upload_status["status"] != DocumentUploadStatus.pending:
+            return JsonResponse({"success": False}, status=400)
+
+        set_document_upload_status(self.request.session.session_key, file_name, DocumentUploadStatus.checking)
+        run_in_background(check_uploaded_document, self.request.session.session_key, file_name)
+        return JsonResponse({"success": True, "file_name": file_name, "status": DocumentUploadStatus.checking}, status=202)
+
+
+class DirectUploadStatusView(LoginRequiredMixin, DirectUploadMixin, View):
+    """Polled by the browser to find out whether a document it uploaded to S3 has passed its checks."""
+
+    http_method_names = ["get"]
+
+    def get(self, *args: object, **kwargs: object) -> HttpResponse:
+        file_name = os.path.basename(self.request.GET.get("file_name", ""))
+        if not (upload_status := get_document_upload_statuses(self.request.session.session_key).get(file_name)):
+            raise Http404()
+
+        if upload_status["status"] == DocumentUploadStatus.failed:
+            return JsonResponse(
+                {"success": False, "status": upload_status["status"], "error": upload_status["error"], "file_name": file_name}
+            )
+        return JsonResponse({"success": True, "status": upload_status["status"], "file_name": file_name})
+
+
 class DownloadDocumentView(LoginRequiredMixin, View):
     http_method_names = ["get"]
 
@@ -1,5 +1,6 @@
 import logging
 import uuid
+from functools import partial
 from typing import Any
 
 from apply_for_a_licence.forms.forms_end import DeclarationForm
@@ -14,12 +15,15 @@ from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
+from django.utils.functional import cached_property
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
-from utils.notifier import send_email
+from utils.notifier import queue_email
+from utils.pdf import get_licence_pdf_cache_key, schedule_licence_pdf_generation
 from utils.s3 import get_all_session_files
 from utils.save_to_db import SaveToDB
 from view_a_licence.utils import get_view_a_licence_application_url
+from view_a_licence.views import DownloadPDFView as ViewALicenceDownloadPDFView
 
 logger = logging.getLogger(__name__)
 
@@ -107,25 +111,38 @@ class DeclarationView(BaseFormView):
 
             save_object.save_recipient()
 
-            # moving the uploaded documents to permanent storage
             save_object.save_documents()
 
-        # Send confirmation email to the user
-        send_email(
-            email=new_licence_object.applicant_user_email_address,
-            template_id=settings.PUBLIC_USER_NEW_APPLICATION_TEMPLATE_ID,
-            context={"name": new_licence_object.applicant_full_name, "application_number": new_licence_object.reference},
-        )
+            # the businesses, recipients and individuals are bulk created, which doesn't send the signals that would
+            # otherwise update what the application is searched on
+            new_licence_object.update_search_vector()
 
-        # Send confirmation email to OTSI staff
-        view_application_url = get_view_a_licence_application_url(new_licence_object.reference)
+            # the emails are added to the outbox along with the application, and sent once it's been committed
+            queue_email(
+                email=new_licence_object.applicant_user_email_address,
+                template_id=settings.PUBLIC_USER_NEW_APPLICATION_TEMPLATE_ID,
+                context={"name": new_licence_object.applicant_full_name, "application_number": new_licence_object.reference},
+            )
 
-        for email in settings.NEW_APPLICATION_ALERT_RECIPIENTS:
-            send_email(
-                email=email,
-                template_id=settings.OTSI_NEW_APPLICATION_TEMPLATE_ID,
-                context={"application_number": new_licence_object.reference, "url": view_application_url},
+            view_application_url = get_view_a_licence_application_url(new_licence_object.reference)
+            for email in settings.NEW_APPLICATION_ALERT_RECIPIENTS:
+                queue_email(
+                    email=email,
+                    template_id=settings.OTSI_NEW_APPLICATION_TEMPLATE_ID,
+                    context={"application_number": new_licence_object.reference, "url": view_application_url},
+                )
+
+        # moving the uploaded documents to permanent storage, now the application has been committed
+        save_object.promote_documents()
+
+        # generate the PDFs the applicant and caseworkers will download, once the application has been committed
+        transaction.on_commit(
+            partial(
+                schedule_licence_pdf_generation,
+                new_licence_object.reference,
+                {view.template_name: view.header for view in (DownloadPDFView, ViewALicenceDownloadPDFView)},
             )
+        )
 
         # Successfully saved to DB - clear session ready for new application.
         # only do this if we're not in debug mode, sometimes nice to back and re-submit
@@ -146,8 +163,15 @@ class DownloadPDFView(LoginRequiredMixin, BaseDownloadPDFView):
     template_name = "apply_for_a_licence/download_application_pdf.html"
     header = "Apply for a licence to provide sanctioned trade services: application submitted "
 
+    @cached_property
+    def licence(self) -> Licence:
+        return Licence.objects.get(reference=self.reference)
+
+    def get_pdf_cache_key(self) -> str:
+        return get_licence_pdf_cache_key(self.licence, self.template_name)
+
     def get_context_data(self, **kwargs: object) -> dict[str, Any]:
         context = super().get_context_data(**kwargs)
         self.reference = self.request.GET.get("reference", "")
-        context["licence"] = Licence.objects.get(reference=self.reference)
+        context["licence"] = self.licence
         return context
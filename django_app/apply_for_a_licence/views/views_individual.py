@@ -5,6 +5,7 @@ from typing import Any
 
 from apply_for_a_licence.choices import NationalityAndLocation
 from apply_for_a_licence.forms import forms_individual as forms
+from apply_for_a_licence.utils import compact_dirty_form_data
 from apply_for_a_licence.views.base_views import AddAnEntityView, DeleteAnEntityView
 from core.views.base_views import BaseFormView
 from django.http import HttpResponse
@@ -23,7 +24,7 @@ class AddAnIndividualView(AddAnEntityView):
         return {
             "name_data": {
                 "cleaned_data": form.cleaned_data,
-                "dirty_data": form.data,
+                "dirty_data": compact_dirty_form_data(form),
             }
         }
 
@@ -66,7 +67,7 @@ class WhatIsIndividualsAddressView(AddAnEntityView):
         return {
             "address_data": {
                 "cleaned_data": form.cleaned_data,
-                "dirty_data": form.data,
+                "dirty_data": compact_dirty_form_data(form),
             }
         }
 
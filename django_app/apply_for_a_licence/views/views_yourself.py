@@ -5,7 +5,7 @@ import uuid
 from apply_for_a_licence.choices import NationalityAndLocation
 from apply_for_a_licence.forms import forms_individual as individual_forms
 from apply_for_a_licence.forms import forms_yourself as forms
-from apply_for_a_licence.utils import get_form
+from apply_for_a_licence.utils import compact_dirty_form_data, get_form
 from apply_for_a_licence.views.base_views import DeleteAnEntityView
 from core.views.base_views import BaseFormView
 from django.http import HttpResponse
@@ -21,7 +21,7 @@ class AddYourselfView(BaseFormView):
     def form_valid(self, form: forms.AddYourselfForm) -> HttpResponse:
         your_details = {
             "cleaned_data": form.cleaned_data,
-            "dirty_data": form.data,
+            "dirty_data": compact_dirty_form_data(form),
         }
         self.request.session["name_data"] = your_details
 
@@ -68,7 +68,7 @@ class AddYourselfAddressView(BaseFormView):
     def form_valid(self, form: forms.AddYourselfUKAddressForm | forms.AddYourselfNonUKAddressForm) -> HttpResponse:
         your_address = {
             "cleaned_data": form.cleaned_data,
-            "dirty_data": form.data,
+            "dirty_data": compact_dirty_form_data(form),
         }
         self.request.session["your_address"] = your_address
 
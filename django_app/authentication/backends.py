@@ -6,6 +6,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import BaseBackend, ModelBackend
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import transaction
 from django.http import HttpRequest
 
@@ -16,7 +17,34 @@ from .utils import get_client, get_userinfo
 UserModel = get_user_model()
 
 
-class OneLoginBackend(BaseBackend):
+def get_user_cache_key(user_id: int) -> str:
+    return f"authenticated_user:{user_id}"
+
+
+class CachedUserMixin:
+    """Gets the user that's logged in to a session, keeping them in the cache for USER_CACHE_TTL seconds if
+    USER_CACHE_ENABLED, so every request doesn't have to look them up. The user is removed from the cache whenever
+    they're saved or deleted, see signals.py.
+
+    Django still checks the session's auth hash against the cached user, so changing their password logs them out."""
+
+    def get_user(self, user_id: int) -> User | None:
+        """Get a user by the ID stored in their session"""
+        cache_key = get_user_cache_key(user_id)
+        if settings.USER_CACHE_ENABLED and (user := cache.get(cache_key)) is not None:
+            return user
+
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+
+        if settings.USER_CACHE_ENABLED:
+            cache.set(cache_key, user, timeout=settings.USER_CACHE_TTL)
+        return user
+
+
+class OneLoginBackend(CachedUserMixin, BaseBackend):
     def authenticate(self, request: HttpRequest, **credentials: Any) -> User | None:
         # GOV.UK One Login is only enabled on the apply-for-a-licence sites.
         if is_view_a_licence_site(request.site):
@@ -53,16 +81,8 @@ class OneLoginBackend(BaseBackend):
 
         return user
 
-    def get_user(self, user_id: int) -> User | None:
-        """Get a user by the ID stored in their session"""
-
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
-
 
-class StaffSSOBackend(AuthbrokerBackend):
+class StaffSSOBackend(CachedUserMixin, AuthbrokerBackend):
     def authenticate(self, request: HttpRequest, **credentials: Any) -> User | None:
         # GOV.UK One Login is only enabled on the apply-for-a-licence sites.
         if is_apply_for_a_licence_site(request.site):
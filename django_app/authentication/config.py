@@ -1,10 +1,14 @@
 import json
 import logging
-from typing import Any
+import threading
+import time
+from typing import Any, Callable
 
 import requests
 from authentication.constants import ONE_LOGIN_UNSET_NAME
 from authentication.types import UserInfo
+from authlib.jose import JsonWebKey, KeySet
+from authlib.jose.rfc7517 import Key
 from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
@@ -12,11 +16,17 @@ logger = logging.getLogger(__name__)
 
 class OneLoginConfig:
     CACHE_KEY = "one_login_metadata_cache"
+    JWKS_CACHE_KEY = "one_login_jwks_cache"
     CACHE_EXPIRY = 60 * 60  # seconds
+    # the keys are only fetched again for an unknown kid this often, so tokens with made up kids can't make us
+    # call One Login on every request
+    JWKS_MIN_REFRESH_INTERVAL = 60  # seconds
     CONFIGURATION_ENDPOINT = "https://oidc.integration.account.gov.uk/.well-known/openid-configuration"
 
-    def __init__(self) -> None:
-        self._conf: dict[str, Any] = {}
+    # the metadata and keys are shared by every instance in the process, by cache key: (when it expires, value)
+    _local_cache: dict[str, tuple[float, Any]] = {}
+    _local_cache_lock = threading.Lock()
+    _jwks_refreshed_at: dict[str, float] = {}
 
     @staticmethod
     def get_user_create_mapping(profile: UserInfo) -> dict[str, Any]:
@@ -30,34 +40,79 @@ class OneLoginConfig:
         }
 
     def get_public_keys(self) -> list[dict[str, str]]:
-        # https://docs.sign-in.service.gov.uk/integrate-with-integration-environment/authenticate-your-user/#validate-your-id-token
-        resp = requests.get(self.openid_config["jwks_uri"])
-        resp.raise_for_status()
-        data = resp.json()
+        return self.key_set.as_dict()["keys"]
 
-        return data["keys"]
+    @property
+    def key_set(self) -> KeySet:
+        return self._get_cached(self.JWKS_CACHE_KEY, self._get_jwks, parse=JsonWebKey.import_key_set)
+
+    def get_public_key(self, kid: str | None) -> Key:
+        """Returns the key the ID token was signed with. If it isn't one of the keys we have, One Login may have
+        rotated its keys, so they're fetched again. Raises a ValueError if the key can't be found."""
+        try:
+            return self.key_set.find_by_kid(kid)
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        with self._local_cache_lock:
+            refreshed_at = self._jwks_refreshed_at.get(self.JWKS_CACHE_KEY)
+            if refreshed_at is not None and now - refreshed_at < self.JWKS_MIN_REFRESH_INTERVAL:
+                raise ValueError(f"Unknown key {kid}, and the keys have been fetched recently")
+            self._jwks_refreshed_at[self.JWKS_CACHE_KEY] = now
+
+        logger.info(f"one login keys: fetching again for unknown key {kid}")
+        key_set = self._get_cached(self.JWKS_CACHE_KEY, self._get_jwks, parse=JsonWebKey.import_key_set, refresh=True)
+        return key_set.find_by_kid(kid)
+
+    def load_key(self, header: dict[str, Any], payload: dict[str, Any]) -> Key:
+        """Finds the key to validate an ID token with, for passing to jwt.decode."""
+        return self.get_public_key(header.get("kid"))
 
     @property
     def openid_config(self) -> dict[str, Any]:
-        # Cached on instance
-        if self._conf:
-            logger.debug("one login conf: using instance attribute")
-            return self._conf
+        return self._get_cached(self.CACHE_KEY, self._get_configuration)
+
+    def _get_cached(
+        self,
+        cache_key: str,
+        fetch: Callable[[], dict[str, Any]],
+        parse: Callable[[dict[str, Any]], Any] | None = None,
+        refresh: bool = False,
+    ) -> Any:
+        """Returns a value from One Login, looking in the process's cache, then the redis store, before fetching it.
+        The parsed value is kept in the process, and the raw value in the redis store along with when it was fetched,
+        so the process's copy expires when the redis one does rather than CACHE_EXPIRY after it was loaded."""
+        now = time.monotonic()
+
+        # Cached in the process
+        if not refresh and (cached := self._local_cache.get(cache_key)) and cached[0] > now:
+            logger.debug(f"{cache_key}: using process value")
+            return cached[1]
 
         # Cached in redis store
-        cache_config = cache.get(self.CACHE_KEY)
-        if cache_config:
-            logger.debug("one login conf: using cache value")
-            self._conf = json.loads(cache_config)
-            return self._conf
-
-        # Retrieve and store value
-        config = self._get_configuration()
-        cache.set(self.CACHE_KEY, json.dumps(config), timeout=self.CACHE_EXPIRY)
-        self._conf = config
-        logger.debug("one login conf: using fresh value")
+        stored = None if refresh else cache.get(cache_key)
+        stored = json.loads(stored) if stored else {}
+        if "fetched_at" in stored:
+            logger.debug(f"{cache_key}: using cache value")
+        else:
+            # Retrieve and store value
+            stored = {"fetched_at": time.time(), "value": fetch()}
+            cache.set(cache_key, json.dumps(stored), timeout=self.CACHE_EXPIRY)
+            logger.debug(f"{cache_key}: using fresh value")
+
+        raw_value = stored["value"]
+        value = parse(raw_value) if parse else raw_value
+        expires_in = stored["fetched_at"] + self.CACHE_EXPIRY - time.time()
+        self._local_cache[cache_key] = (now + expires_in, value)
+        return value
+
+    def _get_jwks(self) -> dict[str, Any]:
+        # https://docs.sign-in.service.gov.uk/integrate-with-integration-environment/authenticate-your-user/#validate-your-id-token
+        resp = requests.get(self.openid_config["jwks_uri"])
+        resp.raise_for_status()
 
-        return self._conf
+        return resp.json()
 
     def _get_configuration(self) -> dict[str, Any]:
         resp = requests.get(self.CONFIGURATION_ENDPOINT)
@@ -92,3 +147,4 @@ class LocalOneLoginConfig(OneLoginConfig):
 
     CONFIGURATION_ENDPOINT = "http://localhost:28081/.well-known/openid-configuration"
     CACHE_KEY = "one_login_metadata_cache_local"
+    JWKS_CACHE_KEY = "one_login_jwks_cache_local"
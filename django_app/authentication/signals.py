@@ -0,0 +1,20 @@
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import get_user_cache_key
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def delete_cached_user(sender: Any, instance: User, **kwargs: object) -> None:
+    """Remove the user from the cache the backends keep them in when they change.
+
+    They're removed again once the transaction is committed, in case another request cached the old user in between."""
+    cache_key = get_user_cache_key(instance.pk)
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
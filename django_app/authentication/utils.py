@@ -1,5 +1,7 @@
 import base64
+import functools
 import logging
+import threading
 from typing import Any
 
 from authlib.integrations.requests_client import OAuth2Session
@@ -9,6 +11,8 @@ from authlib.oidc.core import IDToken
 from django.conf import settings
 from django.http import HttpRequest
 from django.urls import reverse
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 from . import types
 from .constants import LOGIN_SCOPE
@@ -16,16 +20,47 @@ from .constants import LOGIN_SCOPE
 logger = logging.getLogger(__name__)
 TOKEN_SESSION_KEY = "_one_login_token"
 
+_http_adapter: HTTPAdapter | None = None
+_http_adapter_lock = threading.Lock()
 
+
+@functools.lru_cache(maxsize=1)
 def get_client_secret() -> bytes:
     """Returns the base64 decoded client secret"""
     return base64.b64decode(settings.GOV_UK_ONE_LOGIN_CLIENT_SECRET)
 
 
+@functools.lru_cache
+def get_client_auth_method(token_url: str) -> PrivateKeyJWT:
+    return PrivateKeyJWT(token_endpoint=token_url)
+
+
+def get_http_adapter() -> HTTPAdapter:
+    """Returns the connection pool that every One Login client shares, so connections are kept alive between requests
+    rather than a new one being opened for each call.
+
+    Only failures to connect are retried for the token endpoint, as an auth code can only be used once."""
+    global _http_adapter
+    if _http_adapter is None:
+        with _http_adapter_lock:
+            if _http_adapter is None:
+                _http_adapter = HTTPAdapter(
+                    pool_maxsize=settings.GOV_UK_ONE_LOGIN_POOL_SIZE,
+                    max_retries=Retry(
+                        total=settings.GOV_UK_ONE_LOGIN_RETRIES,
+                        backoff_factor=0.2,
+                        status_forcelist=(502, 503, 504),
+                        allowed_methods=frozenset({"GET"}),
+                    ),
+                )
+    return _http_adapter
+
+
 def get_client(request: HttpRequest) -> OAuth2Session:
     callback_url = reverse("authentication:callback")
     redirect_uri = request.build_absolute_uri(callback_url)
 
+    # the session is bound to this request's token, but its connections come from the shared pool
     session = OAuth2Session(
         client_id=settings.GOV_UK_ONE_LOGIN_CLIENT_ID,
         client_secret=get_client_secret(),
@@ -33,7 +68,11 @@ def get_client(request: HttpRequest) -> OAuth2Session:
         redirect_uri=redirect_uri,
         scope=LOGIN_SCOPE,
         token=request.session.get(TOKEN_SESSION_KEY, None),
+        default_timeout=settings.GOV_UK_ONE_LOGIN_TIMEOUT,
     )
+    adapter = get_http_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
 
     return session
 
@@ -42,7 +81,7 @@ def get_token(request: HttpRequest, auth_code: str) -> dict:
     client = get_client(request)
     config = settings.GOV_UK_ONE_LOGIN_CONFIG()
 
-    client.register_client_auth_method(PrivateKeyJWT(token_endpoint=config.token_url))
+    client.register_client_auth_method(get_client_auth_method(config.token_url))
 
     # https://docs.sign-in.service.gov.uk/integrate-with-integration-environment/authenticate-your-user/#receive-response-for-make-a-token-request
     token = client.fetch_token(
@@ -69,7 +108,8 @@ def validate_token(request: HttpRequest, token: dict[str, Any]) -> None:
     # https://docs.sign-in.service.gov.uk/integrate-with-integration-environment/authenticate-your-user/#understand-your-id-token
     claims = jwt.decode(
         token["id_token"],
-        config.get_public_keys(),
+        # the key is found by the token's kid, from the keys cached across logins
+        config.load_key,
         claims_cls=IDToken,
         claims_options={
             "iss": {"essential": True, "value": config.issuer},
@@ -24,6 +24,7 @@ class BaseSettings(PydanticBaseSettings):
     clam_av_domain: str = ""
 
     companies_house_api_key: str | None = None
+    companies_house_cache_ttl: int = 60 * 60 * 24
 
     gov_notify_api_key: str = ""
     email_verify_code_template_id: str = ""
@@ -52,6 +53,7 @@ class BaseSettings(PydanticBaseSettings):
     temporary_s3_bucket_name: str = "temporary-document-bucket"
     permanent_s3_bucket_name: str = "permanent-document-bucket"
     presigned_url_expiry_seconds: int = 3600
+    direct_uploads_enabled: bool = False
 
     include_private_urls: bool = False
 
@@ -77,6 +79,20 @@ class BaseSettings(PydanticBaseSettings):
     redis_host: str = ""
     redis_port: int = 6379
 
+    # PDF generation
+    pdf_browser_pool_size: int = 2
+    pdf_browser_max_renders: int = 100
+    pdf_render_queue_size: int = 20
+    pdf_render_queue_timeout_seconds: int = 10
+    pdf_render_timeout_seconds: int = 30
+    pdf_cache_enabled: bool = True
+    pdf_generation_enabled: bool = True
+    background_task_workers: int = 2
+    session_db_write_through: bool = False
+    user_cache_enabled: bool = False
+    telemetry_enabled: bool = True
+    telemetry_metrics_token: str = ""
+
     # CSP settings
     csp_report_only: bool = True
     csp_report_uri: str | None = None
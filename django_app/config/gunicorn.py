@@ -12,3 +12,10 @@ access_log_format = os.environ.get(
 worker_class = "gevent"
 worker_connections = os.environ.get("GUNICORN_WORKER_CONNECTIONS", "50")
 workers = os.environ.get("GUNICORN_WORKERS", "1")
+
+
+def post_worker_init(worker):
+    # launch the worker's PDF browsers as it boots, rather than in the first request that needs one
+    from utils.pdf import start_browser_pool
+
+    start_browser_pool()
@@ -81,6 +81,12 @@ AWS_ACCESS_KEY_ID = TEMPORARY_S3_BUCKET_ACCESS_KEY_ID
 PERMANENT_S3_BUCKET_ACCESS_KEY_ID = env.permanent_s3_bucket_configuration["access_key_id"]
 PERMANENT_S3_BUCKET_SECRET_ACCESS_KEY = env.permanent_s3_bucket_configuration["secret_access_key"]
 PERMANENT_S3_BUCKET_NAME = env.permanent_s3_bucket_configuration["bucket_name"]
+# the number of documents copied from the temporary to the permanent bucket at the same time when an application is submitted
+DOCUMENT_COPY_WORKERS = 5
+# a document that couldn't be copied is tried again by the store_pending_documents command, once it's been waiting this
+# many seconds, until it's been tried DOCUMENT_COPY_MAX_ATTEMPTS times
+DOCUMENT_COPY_RETRY_DELAY_SECONDS = 60
+DOCUMENT_COPY_MAX_ATTEMPTS = 5
 
 # S3FileUploadHandler
 AWS_ACCESS_KEY_ID = TEMPORARY_S3_BUCKET_ACCESS_KEY_ID
@@ -109,6 +115,13 @@ FILE_UPLOAD_HANDLERS = (
     "core.custom_upload_handler.CustomFileUploadHandler",
 )  # Order is important
 
+# if enabled, JS users upload documents straight to the temporary bucket using a presigned POST, rather than through
+# the FILE_UPLOAD_HANDLERS. The documents are then checked (including for viruses) in the background
+DIRECT_UPLOADS_ENABLED = env.direct_uploads_enabled
+DIRECT_UPLOAD_URL_EXPIRY_SECONDS = 15 * 60
+# a document that's been checking for longer than this is given up on, e.g. the process checking it died
+DIRECT_UPLOAD_CHECK_TIMEOUT_SECONDS = 5 * 60
+
 # CLAM AV
 CLAM_AV_USERNAME = env.clam_av_username
 CLAM_AV_PASSWORD = env.clam_av_password
@@ -117,6 +130,8 @@ CHUNK_UPLOADER_RAISE_EXCEPTION_ON_VIRUS_FOUND = False
 
 # MIDDLEWARE
 MIDDLEWARE = [
+    # first, so the time the rest of the middleware takes is counted
+    "core.middleware.TelemetryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django_permissions_policy.PermissionsPolicyMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -202,6 +217,22 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # COMPANIES HOUSE API
 COMPANIES_HOUSE_API_KEY = env.companies_house_api_key
+# how long a company's details are cached for (in seconds), and how long a number that doesn't exist is remembered for
+COMPANIES_HOUSE_CACHE_TTL = env.companies_house_cache_ttl
+COMPANIES_HOUSE_NEGATIVE_CACHE_TTL = 5 * 60
+# how long a lookup waits for the same number to be looked up by another request, before looking it up itself
+COMPANIES_HOUSE_LOOKUP_WAIT = 5
+# requests to Companies House time out after these many seconds, to connect and then to read the response
+COMPANIES_HOUSE_CONNECT_TIMEOUT = 3
+COMPANIES_HOUSE_READ_TIMEOUT = 5
+# how many times temporary server errors are retried, and how many connections each process keeps open
+COMPANIES_HOUSE_RETRIES = 2
+COMPANIES_HOUSE_POOL_SIZE = 10
+# after this many failures in a row, we stop calling Companies House for a while (in seconds)
+COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD = 5
+COMPANIES_HOUSE_CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+# companies in our copy of the Companies House snapshot older than this are checked with the API
+COMPANIES_HOUSE_SNAPSHOT_MAX_AGE_DAYS = 45
 
 # GOV NOTIFY
 GOV_NOTIFY_API_KEY = env.gov_notify_api_key
@@ -213,6 +244,19 @@ if "," in env.new_application_alert_recipients:  # check if multiple recipients
     NEW_APPLICATION_ALERT_RECIPIENTS = env.new_application_alert_recipients.split(",")
 else:
     NEW_APPLICATION_ALERT_RECIPIENTS = [env.new_application_alert_recipients]
+# emails in the outbox are sent this many at a time, by this many threads
+NOTIFY_OUTBOX_BATCH_SIZE = 50
+NOTIFY_OUTBOX_WORKERS = 5
+# an email that fails is retried after this many seconds, doubling each time up to the maximum, until it's been tried
+# NOTIFY_OUTBOX_MAX_ATTEMPTS times
+NOTIFY_OUTBOX_RETRY_BACKOFF_SECONDS = 30
+NOTIFY_OUTBOX_MAX_RETRY_BACKOFF_SECONDS = 60 * 60
+NOTIFY_OUTBOX_MAX_ATTEMPTS = 8
+# an email claimed by a worker that hasn't been sent after this many seconds is assumed to have been abandoned (e.g. the
+# worker was killed part way through), and is claimed again
+NOTIFY_OUTBOX_CLAIM_TIMEOUT_SECONDS = 10 * 60
+# staff are told about a user waiting to be accepted at most once in this many seconds, however often they try
+PENDING_USER_ALERT_INTERVAL_SECONDS = 60 * 60
 
 # SENTRY
 SENTRY_DSN = env.sentry_dsn
@@ -230,6 +274,11 @@ if SENTRY_ENABLED:
         traces_sample_rate=SENTRY_TRACES_SAMPLE_RATE,
     )
 
+# the number and duration of the queries, cache operations and outbound requests each request makes, see
+# core/telemetry.py. The latency histogram can only be scraped with the token, and not at all if it isn't set
+TELEMETRY_ENABLED = env.telemetry_enabled
+TELEMETRY_METRICS_TOKEN = env.telemetry_metrics_token
+
 # Email Verification settings
 EMAIL_VERIFY_TIMEOUT_SECONDS = env.email_verify_timeout_seconds
 
@@ -258,6 +307,14 @@ GOV_UK_ONE_LOGIN_CLIENT_ID = env.gov_uk_one_login_client_id
 GOV_UK_ONE_LOGIN_CLIENT_SECRET = env.gov_uk_one_login_client_secret
 GOV_UK_ONE_LOGIN_CONFIG = OneLoginConfig
 GOV_UK_ONE_LOGIN_ENABLED = False
+# the connections to One Login are shared by every request the process handles
+GOV_UK_ONE_LOGIN_POOL_SIZE = 10
+GOV_UK_ONE_LOGIN_TIMEOUT = 10  # seconds
+GOV_UK_ONE_LOGIN_RETRIES = 2
+
+# the user that's logged in is cached between requests, rather than looked up on each one
+USER_CACHE_ENABLED = env.user_cache_enabled
+USER_CACHE_TTL = 60  # seconds
 
 TRUNCATE_WORDS_LIMIT = 30
 
@@ -278,7 +335,7 @@ REDIS_URL = env.redis_url
 # Caches
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "core.cache.RedisCache",
         "LOCATION": REDIS_URL,
         "TIMEOUT": 60 * 60 * 24,  # in seconds: 60 * 60 * 24 (24 hours)
         "OPTIONS": {
@@ -291,6 +348,48 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 # Session cookie age is set to 40 minutes
 SESSION_COOKIE_AGE = 40 * 60
 SESSION_LAST_ACTIVITY_KEY = "last_form_submission"
+# sessions are kept in Redis, compressed. The database row is always created as other models have a foreign key to it,
+# and refreshed every few minutes so its expire_date stays current, but it's only kept up to date with every change if
+# write-through is turned on
+SESSION_ENGINE = "core.session_backend"
+SESSION_DB_WRITE_THROUGH = env.session_db_write_through
+SESSION_DB_REFRESH_INTERVAL_SECONDS = 5 * 60
+
+# PDF generation
+# the number of headless browsers each process keeps running to render PDFs
+PDF_BROWSER_POOL_SIZE = env.pdf_browser_pool_size
+# browsers are recycled after this many renders
+PDF_BROWSER_MAX_RENDERS = env.pdf_browser_max_renders
+# how many PDF jobs can wait for a free browser, and how long they wait for a space in the queue (in seconds)
+PDF_RENDER_QUEUE_SIZE = env.pdf_render_queue_size
+PDF_RENDER_QUEUE_TIMEOUT = env.pdf_render_queue_timeout_seconds
+# how long a request waits for its PDF to be rendered (in seconds)
+PDF_RENDER_TIMEOUT = env.pdf_render_timeout_seconds
+# rendered PDFs are cached in the permanent bucket. Bump the version whenever the PDF templates change
+PDF_CACHE_ENABLED = env.pdf_cache_enabled
+PDF_TEMPLATE_VERSION = "1"
+# the PDFs of a new application are generated in the background once it's been submitted
+PDF_GENERATION_ENABLED = env.pdf_generation_enabled
+PDF_GENERATION_ATTEMPTS = 3
+# in seconds, doubled after each failed attempt
+PDF_GENERATION_RETRY_BACKOFF = 2
+# how long a download waits for a PDF that's being generated in the background, before rendering it itself (in seconds)
+PDF_GENERATION_WAIT = 10
+# how long the status of a background PDF generation is kept for (in seconds)
+PDF_GENERATION_STATUS_TIMEOUT = 60 * 60
+
+# Bulk export of applications
+# the number of files fetched (or PDFs rendered) at the same time while streaming an export
+BULK_EXPORT_WORKERS = 4
+BULK_EXPORT_MAX_APPLICATIONS = 100
+
+# Application list
+# how long the counts of the application list's facets are cached for (in seconds)
+LICENCE_FACETS_CACHE_SECONDS = 60
+
+# Background tasks
+# the number of threads each process uses to run tasks in the background
+BACKGROUND_TASK_WORKERS = env.background_task_workers
 
 # CSP policies
 
@@ -311,6 +410,12 @@ CSP_SCRIPT_SRC = (
 
 # JS scripts can import other scripts, following the same rules as above
 CSP_CONNECT_SRC = CSP_SCRIPT_SRC
+if DIRECT_UPLOADS_ENABLED:
+    # JS uploads documents straight to the temporary bucket
+    CSP_CONNECT_SRC += (
+        AWS_ENDPOINT_URL or f"https://{TEMPORARY_S3_BUCKET_NAME}.s3.amazonaws.com",
+        f"https://{TEMPORARY_S3_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com",
+    )
 
 # CSS elements with a src attribute can only be loaded from report-a-suspected-breach itself,
 # inline, e.g. <style> tags, or from Cloudflare
@@ -1,3 +1,5 @@
+import fnmatch
+
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.core.cache.backends.dummy import DummyCache
 from django.forms import Form
@@ -39,11 +41,30 @@ class TestingCache(DummyCache):
     def set(self, key, value, **kwargs):
         self.dict_cache[key] = value
 
-    def iter_keys(self, *args, search="", **kwargs):
-        for key in self.dict_cache.keys():
-            if search in key:
+    def delete(self, key, *args, **kwargs):
+        return self.dict_cache.pop(key, None) is not None
+
+    def iter_keys(self, search="*", *args, **kwargs):
+        # match keys against the glob-style pattern like redis does
+        for key in list(self.dict_cache.keys()):
+            if fnmatch.fnmatchcase(key, search):
                 yield key
 
+    def hset(self, key, field, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.dict_cache.setdefault(key, {})[field] = value
+
+    def hdel(self, key, *fields, version=None):
+        hash_value = self.dict_cache.get(key, {})
+        return len([field for field in fields if hash_value.pop(field, None) is not None])
+
+    def hincrby(self, key, amounts, timeout=DEFAULT_TIMEOUT, version=None):
+        hash_value = self.dict_cache.setdefault(key, {})
+        for field, amount in amounts.items():
+            hash_value[field] = str(int(hash_value.get(field, 0)) + amount)
+
+    def hgetall(self, key, version=None):
+        return dict(self.dict_cache.get(key, {}))
+
     def clear(self):
         self.dict_cache = {}
 
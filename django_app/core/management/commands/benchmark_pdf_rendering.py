@@ -0,0 +1,133 @@
+import statistics
+
+from apply_for_a_licence.choices import (
+    NationalityAndLocation,
+    TypeOfRelationshipChoices,
+    TypeOfServicesChoices,
+    WhoDoYouWantTheLicenceToCoverChoices,
+    YesNoChoices,
+    YesNoDoNotKnowChoices,
+)
+from apply_for_a_licence.models import Document, Individual, Licence, Organisation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from utils.pdf import PhaseTimer, render_pdf, shutdown_browser_pool
+
+
+def get_percentiles(durations: list[float]) -> tuple[float, float]:
+    """Returns the p50 and p95 of the durations."""
+    if len(durations) == 1:
+        return durations[0], durations[0]
+    percentiles = statistics.quantiles(durations, n=100, method="inclusive")
+    return percentiles[49], percentiles[94]
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the PDF of a large synthetic application a number of times and reports the p50/p95 of each phase. "
+        "The application is created in a transaction that is rolled back, so nothing is saved. "
+        "Usage: pipenv run django_app/python manage.py benchmark_pdf_rendering --iterations 20"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument("--recipients", type=int, default=50)
+        parser.add_argument("--individuals", type=int, default=50)
+        parser.add_argument("--documents", type=int, default=10)
+        parser.add_argument("--template", type=str, default="view_a_licence/view_application_pdf.html")
+
+    def handle(self, *args, **options):
+        durations: dict[str, list[float]] = {}
+        sizes = []
+        browser_memory = []
+
+        try:
+            with transaction.atomic():
+                licence = self.create_synthetic_licence(options["recipients"], options["individuals"], options["documents"])
+                for iteration in range(options["iterations"]):
+                    timer = PhaseTimer()
+                    with timer.phase("template"):
+                        template_string = render_to_string(
+                            options["template"],
+                            context={"header": "Benchmark", "reference": licence.reference, "licence": licence},
+                        )
+                    rendered_pdf = render_pdf(mark_safe(template_string), timer)
+
+                    for phase, duration in timer.durations.items():
+                        durations.setdefault(phase, []).append(duration)
+                    sizes.append(len(rendered_pdf.data))
+                    if rendered_pdf.browser_memory is not None:
+                        browser_memory.append(rendered_pdf.browser_memory)
+                    self.stdout.write(f"Iteration {iteration + 1}: {timer.server_timing()}")
+
+                transaction.set_rollback(True)
+        finally:
+            shutdown_browser_pool()
+
+        self.stdout.write(f"{'phase':<12} {'count':>5} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+        for phase, phase_durations in durations.items():
+            p50, p95 = get_percentiles(phase_durations)
+            self.stdout.write(f"{phase:<12} {len(phase_durations):>5} {p50:>10.2f} {p95:>10.2f}")
+
+        self.stdout.write(f"PDF size: {statistics.median(sizes) / 1024:.1f}KB")
+        if browser_memory:
+            self.stdout.write(f"Browser JS heap: {max(browser_memory) / 1024 / 1024:.1f}MB (max)")
+        self.stdout.write(self.style.SUCCESS("Benchmark complete"))
+
+    def create_synthetic_licence(self, recipients: int, individuals: int, documents: int) -> Licence:
+        licence = Licence.objects.create(
+            reference="BENCH1",
+            business_registered_on_companies_house=YesNoDoNotKnowChoices.yes,
+            type_of_service=TypeOfServicesChoices.professional_and_business,
+            professional_or_business_services=["accounting", "legal_advisory"],
+            licensing_grounds=["civil_society", "energy"],
+            licensing_grounds_legal_advisory=["civil_society"],
+            service_activities="Benchmarking the PDF rendering\n" * 20,
+            purpose_of_provision="Benchmarking the PDF rendering\n" * 20,
+            held_existing_licence=YesNoChoices.no,
+            is_third_party=False,
+            who_do_you_want_the_licence_to_cover=WhoDoYouWantTheLicenceToCoverChoices.individual,
+            applicant_user_email_address="benchmark@example.com",
+            applicant_full_name="Benchmark Applicant",
+            applicant_business="Benchmark Ltd",
+            applicant_role="Benchmarker",
+        )
+        Organisation.objects.create(
+            licence=licence,
+            name="Benchmark employer",
+            type_of_relationship=TypeOfRelationshipChoices.named_individuals,
+            address_line_1="1 Benchmark Street",
+            country="GB",
+        )
+        Organisation.objects.bulk_create(
+            Organisation(
+                licence=licence,
+                name=f"Recipient {index}",
+                website="https://example.com",
+                type_of_relationship=TypeOfRelationshipChoices.recipient,
+                address_line_1=f"{index} Recipient Road",
+                town_or_city="Paris",
+                country="FR",
+                additional_contact_details="Call in the mornings",
+                relationship_provider="Supplier",
+            )
+            for index in range(recipients)
+        )
+        Individual.objects.bulk_create(
+            Individual(
+                licence=licence,
+                first_name="Individual",
+                last_name=str(index),
+                nationality_and_location=NationalityAndLocation.uk_national_uk_location,
+                address_line_1=f"{index} Individual Lane",
+                postcode="SW1A 1AA",
+                country="GB",
+            )
+            for index in range(individuals)
+        )
+        Document.objects.bulk_create(
+            Document(licence=licence, file=f"benchmark/document-{index}.pdf") for index in range(documents)
+        )
+        return licence
@@ -0,0 +1,79 @@
+import time
+
+from apply_for_a_licence.models import Licence
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from .benchmark_pdf_rendering import get_percentiles
+
+# the synthetic licences are given references made of the letters G-Z, so they can't collide with real ones, which are
+# hexadecimal
+SYNTHETIC_REFERENCE = " || ".join(f"chr(71 + (number / {20**position}) %% 20)" for position in range(6))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the licence table with synthetic applications, then times assigning references and reports the "
+        "p50/p95, along with the query plan for checking a reference. Everything is done in a transaction that is "
+        "rolled back, so nothing is saved (though the numbers taken from the sequence aren't given back). Unless DEBUG "
+        "is on, it only runs with --confirm-benchmark-database. "
+        "Usage: pipenv run django_app/python manage.py benchmark_reference_allocation --rows 10000000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--allocations", type=int, default=1000)
+        parser.add_argument(
+            "--confirm-benchmark-database",
+            action="store_true",
+            help="You must specify this to run the command when DEBUG is off",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["confirm_benchmark_database"]:
+            raise CommandError(
+                "This command fills the licence table and uses up its reference sequence, "
+                "pass --confirm-benchmark-database to run it when DEBUG is off"
+            )
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {Licence._meta.db_table} (
+                        created_at, modified_at, reference, business_registered_on_companies_house, type_of_service,
+                        service_activities, who_do_you_want_the_licence_to_cover
+                    )
+                    SELECT now(), now(), {SYNTHETIC_REFERENCE}, 'No', 'energy_related', 'Benchmark', 'business'
+                    FROM generate_series(0, %s - 1) AS number
+                    """,
+                    [options["rows"]],
+                )
+                cursor.execute(f"ANALYZE {Licence._meta.db_table}")
+            self.stdout.write(f"Inserted {options['rows']} licences in {time.perf_counter() - start:.1f}s")
+
+            durations = []
+            licence = Licence()
+            for _ in range(options["allocations"]):
+                start = time.perf_counter()
+                licence.assign_reference()
+                durations.append((time.perf_counter() - start) * 1000)
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"EXPLAIN ANALYZE SELECT 1 FROM {Licence._meta.db_table} WHERE reference = %s LIMIT 1",
+                    [licence.reference],
+                )
+                query_plan = [row[0] for row in cursor.fetchall()]
+
+            transaction.set_rollback(True)
+
+        p50, p95 = get_percentiles(durations)
+        self.stdout.write(f"{'allocations':<12} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+        self.stdout.write(f"{len(durations):<12} {p50:>10.2f} {p95:>10.2f}")
+        self.stdout.write("Query plan for checking a reference:")
+        for line in query_plan:
+            self.stdout.write(f"    {line}")
+        self.stdout.write(self.style.SUCCESS("Benchmark complete"))
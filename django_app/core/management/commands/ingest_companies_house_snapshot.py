@@ -0,0 +1,116 @@
+import csv
+import io
+import zipfile
+from datetime import date
+from typing import Iterator
+
+from apply_for_a_licence.models import CompaniesHouseCompany
+from django.core.management.base import BaseCommand, CommandError
+
+# the countries Companies House uses for UK addresses in the snapshot, normalised to how the API returns them
+UK_COUNTRIES = {
+    "ENGLAND": "England",
+    "WALES": "Wales",
+    "SCOTLAND": "Scotland",
+    "NORTHERN IRELAND": "Northern Ireland",
+    "ENGLAND/WALES": "England/Wales",
+    "UNITED KINGDOM": "United Kingdom",
+    "GREAT BRITAIN": "United Kingdom",
+}
+
+
+def read_snapshot_rows(path: str) -> Iterator[dict[str, str]]:
+    """Yields the rows of a Basic Company Data snapshot, which is either a CSV file or a ZIP of CSV files."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as snapshot_zip:
+            for name in snapshot_zip.namelist():
+                if name.lower().endswith(".csv"):
+                    with snapshot_zip.open(name) as csv_file:
+                        yield from read_csv_rows(io.TextIOWrapper(csv_file, encoding="utf-8-sig"))
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as csv_file:
+            yield from read_csv_rows(csv_file)
+
+
+def read_csv_rows(csv_file: io.TextIOBase) -> Iterator[dict[str, str]]:
+    reader = csv.reader(csv_file)
+    # some of the column names in the snapshot have a leading space
+    header = [column.strip() for column in next(reader)]
+    for row in reader:
+        yield dict(zip(header, row))
+
+
+def get_company_from_row(row: dict[str, str], snapshot_date: date) -> CompaniesHouseCompany | None:
+    """Returns the company in a row of the snapshot, or None if it can't be answered from the snapshot - e.g. its
+    registered office is outside the UK, in which case the API is used instead."""
+    country = row.get("RegAddress.Country", "").strip().upper()
+    if country and country not in UK_COUNTRIES:
+        return None
+
+    return CompaniesHouseCompany(
+        company_number=row["CompanyNumber"].strip(),
+        company_name=row["CompanyName"].strip()[:255],
+        address_line_1=row.get("RegAddress.AddressLine1", "").strip()[:255],
+        address_line_2=row.get("RegAddress.AddressLine2", "").strip()[:255],
+        locality=row.get("RegAddress.PostTown", "").strip()[:255],
+        postal_code=row.get("RegAddress.PostCode", "").strip()[:20],
+        country=UK_COUNTRIES.get(country, ""),
+        snapshot_date=snapshot_date,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads the Companies House Basic Company Data snapshot, so company numbers can be looked up without calling "
+        "the Companies House API. Companies that aren't in the snapshot are removed once it's been loaded. "
+        "Usage: pipenv run django_app/python manage.py ingest_companies_house_snapshot <path> <path> ... "
+        "--snapshot-date 2024-01-01"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", type=str, help="the snapshot's CSV or ZIP files")
+        parser.add_argument("--snapshot-date", type=date.fromisoformat, default=date.today())
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        snapshot_date = options["snapshot_date"]
+        ingested = 0
+        batch: list[CompaniesHouseCompany] = []
+
+        for path in options["paths"]:
+            try:
+                for row in read_snapshot_rows(path):
+                    if company := get_company_from_row(row, snapshot_date):
+                        batch.append(company)
+                    if len(batch) >= options["batch_size"]:
+                        ingested += self.save_batch(batch)
+                        batch = []
+            except (OSError, KeyError, csv.Error) as e:
+                raise CommandError(f"Failed to read the snapshot {path}: {e}")
+        ingested += self.save_batch(batch)
+        if not ingested:
+            raise CommandError("No companies were found in the snapshot, so the existing companies have been kept")
+
+        deleted, _ = CompaniesHouseCompany.objects.filter(snapshot_date__lt=snapshot_date).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f"Ingested {ingested} companies, and removed {deleted} that are no longer in the snapshot")
+        )
+
+    def save_batch(self, batch: list[CompaniesHouseCompany]) -> int:
+        if not batch:
+            return 0
+        CompaniesHouseCompany.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["company_number"],
+            update_fields=[
+                "company_name",
+                "address_line_1",
+                "address_line_2",
+                "locality",
+                "postal_code",
+                "country",
+                "snapshot_date",
+            ],
+        )
+        return len(batch)
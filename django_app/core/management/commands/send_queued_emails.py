@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from utils.notifier import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends the emails in the outbox through GOV.UK Notify, checking for new ones every few seconds. Any number of "
+        "these workers can run at once. "
+        "Usage: pipenv run django_app/python manage.py send_queued_emails"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="send the emails that are due, then stop")
+        parser.add_argument("--interval", type=float, default=5, help="seconds to wait when there's nothing to send")
+
+    def handle(self, *args, **options):
+        while True:
+            # the worker runs for a long time, so don't hold on to a connection the database has closed
+            close_old_connections()
+            sent = 0
+            while batch := send_queued_emails():
+                sent += batch
+            if sent:
+                self.stdout.write(self.style.SUCCESS(f"Tried to send {sent} emails"))
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
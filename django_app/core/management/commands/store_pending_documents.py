@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from utils.save_to_db import store_pending_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the documents that couldn't be copied to the permanent bucket when their application was submitted, "
+        "checking for new ones every minute. "
+        "Usage: pipenv run django_app/python manage.py store_pending_documents"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="copy the documents that are due, then stop")
+        parser.add_argument("--interval", type=float, default=60, help="seconds to wait between checks")
+
+    def handle(self, *args, **options):
+        while True:
+            # the worker runs for a long time, so don't hold on to a connection the database has closed
+            close_old_connections()
+            if tried := store_pending_documents():
+                self.stdout.write(self.style.SUCCESS(f"Tried to copy {tried} documents"))
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
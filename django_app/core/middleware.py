@@ -1,22 +1,35 @@
-from django.contrib.sites.middleware import (
-    CurrentSiteMiddleware as DjangoCurrentSiteMiddleware,
+import contextlib
+import json
+import logging
+
+import sentry_sdk
+from core.sites import get_site_for_host
+from core.telemetry import (
+    TelemetryCategory,
+    collect_telemetry,
+    install_http_instrumentation,
+    record_view_latency,
+    time_db_query,
 )
-from django.http import HttpRequest
-from django.urls import resolve
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.utils.deprecation import MiddlewareMixin
 
+telemetry_logger = logging.getLogger("telemetry")
 
-class CurrentSiteMiddleware(DjangoCurrentSiteMiddleware):
+
+class CurrentSiteMiddleware(MiddlewareMixin):
     """Middleware that sets `site` attribute to request object."""
 
-    # List of views that do not add the site to the current request object.
-    site_exempt_views = [
-        "healthcheck:healthcheck_ping",
-    ]
+    # the paths that do not add the site to the current request object, e.g. the healthcheck, which is called by host
+    # names that aren't one of the sites
+    site_exempt_path_prefixes = ("/healthcheck/", "/telemetry/")
 
     def process_request(self, request: HttpRequest) -> None:
         """Middleware that sets `site` attribute to request object."""
-        if resolve(request.path).view_name not in self.site_exempt_views:
-            super().process_request(request)
+        if not request.path_info.startswith(self.site_exempt_path_prefixes):
+            request.site = get_site_for_host(request.get_host())
 
 
 class SetPermittedCrossDomainPolicyHeaderMiddleware:
@@ -60,3 +73,67 @@ class XSSProtectionMiddleware:
         response = self.get_response(request)
         response.headers["X-XSS-Protection"] = "0"
         return response
+
+
+class TelemetryMiddleware:
+    """Middleware that times the database queries, cache operations and outbound HTTP requests each request makes,
+    see core/telemetry.py.
+
+    It should be the first middleware, so the time spent in the rest of them is counted. The timings are logged,
+    sent to Sentry, added to the view's latency histogram, and returned to staff in the Server-Timing header."""
+
+    server_timing_descriptions = {
+        TelemetryCategory.db: "queries",
+        TelemetryCategory.cache: "cache operations",
+        TelemetryCategory.http: "outbound requests",
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_http_instrumentation()
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.TELEMETRY_ENABLED:
+            return self.get_response(request)
+
+        with collect_telemetry() as telemetry, contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(time_db_query))
+            response = self.get_response(request)
+            duration = telemetry.duration
+
+        view_name = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        telemetry_logger.info(
+            json.dumps(
+                {
+                    "view": view_name,
+                    "method": request.method,
+                    "status": response.status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    **telemetry.as_dict(),
+                }
+            )
+        )
+
+        if settings.SENTRY_ENABLED:
+            for category, total in telemetry.totals.items():
+                sentry_sdk.set_measurement(f"{category}_count", total.count)
+                sentry_sdk.set_measurement(f"{category}_duration", total.duration * 1000, "millisecond")
+
+        record_view_latency(view_name, duration)
+
+        user = getattr(request, "user", None)
+        if settings.DEBUG or (user is not None and user.is_authenticated and user.is_staff):
+            timings = telemetry.server_timings + [
+                f'{category};dur={total.duration * 1000:.1f};desc="{total.count} {self.server_timing_descriptions[category]}"'
+                for category, total in telemetry.totals.items()
+            ]
+            app_duration = duration - sum(total.duration for total in telemetry.totals.values())
+            timings.append(f"app;dur={app_duration * 1000:.1f}")
+            timings.append(f"total;dur={duration * 1000:.1f}")
+            # the view may have added timings of its own
+            if existing_timings := response.headers.get("Server-Timing"):
+                timings.insert(0, existing_timings)
+            response.headers["Server-Timing"] = ", ".join(timings)
+
+        return response
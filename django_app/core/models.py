@@ -1,6 +1,7 @@
 import uuid
 
 from django.db import models
+from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
 
@@ -23,3 +24,46 @@ class BaseModelID(BaseModel):
 
     class Meta:
         abstract = True
+
+
+class OutboxEmailStatus(models.TextChoices):
+    pending = "pending", "Pending"
+    # claimed by a worker, which is sending it
+    sending = "sending", "Sending"
+    sent = "sent", "Sent"
+    # it failed too many times, or in a way that can't be retried
+    dead = "dead", "Dead"
+
+
+class OutboxEmail(models.Model):
+    """An email waiting to be sent through GOV.UK Notify.
+
+    Emails are added to the outbox in the same transaction as whatever they're about, so they're only sent if it's
+    committed, and aren't lost if Notify can't be reached. They're sent by the send_queued_emails command."""
+
+    email = models.EmailField()
+    template_id = models.CharField(max_length=255)
+    personalisation = models.JSONField(default=dict)
+    reference = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=OutboxEmailStatus.choices, default=OutboxEmailStatus.pending)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True, db_comment="when a worker last claimed the email to send it")
+    notification_id = models.CharField(max_length=255, blank=True, db_comment="the ID Notify gave the email once sent")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status=OutboxEmailStatus.pending),
+                name="outbox_email_pending_idx",
+            ),
+            models.Index(
+                fields=["claimed_at"],
+                condition=models.Q(status=OutboxEmailStatus.sending),
+                name="outbox_email_sending_idx",
+            ),
+        ]
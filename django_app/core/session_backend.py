@@ -0,0 +1,139 @@
+"""
+Cached sessions that keep the wizard state in Redis in a compact, versioned format.
+
+The database row is always created when the session is, as other models (e.g. UserEmailVerification) have a foreign
+key to it. It's written again at most once every SESSION_DB_REFRESH_INTERVAL_SECONDS after that (or on every change,
+if SESSION_DB_WRITE_THROUGH is set), so its expire_date stays ahead of the session's real expiry and clearsessions
+doesn't delete the row, and its verification records, while the session's still in use. It's also written on the
+first save after the key's cycled (e.g. on login), so it's never left without the session's data. The row is only read
+when the session isn't in the cache (e.g. a session started before this backend was deployed).
+"""
+
+import logging
+import zlib
+from typing import Any, Callable
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "core.session_backend"
+
+# bump this, and add a function to SCHEMA_MIGRATIONS, whenever the shape of the data stored in the session changes
+SESSION_SCHEMA_VERSION = 1
+SCHEMA_VERSION_KEY = "_schema_version"
+
+# the parts of a form's data that are never needed once the form has been submitted
+REDUNDANT_FORM_DATA_KEYS = ("csrfmiddlewaretoken", "encoding")
+
+
+def _compact_dirty_data(dirty_data: Any) -> Any:
+    if isinstance(dirty_data, dict):
+        return {key: value for key, value in dirty_data.items() if key not in REDUNDANT_FORM_DATA_KEYS}
+    return dirty_data
+
+
+def migrate_to_version_1(session_data: dict[str, Any]) -> dict[str, Any]:
+    """Removes the parts of the submitted form data that aren't needed, and the Companies House businesses that have
+    already been added to the application."""
+    for entity_key in ("businesses", "recipients", "individuals"):
+        for entity in session_data.get(entity_key, {}).values():
+            if not isinstance(entity, dict):
+                continue
+            entity["dirty_data"] = _compact_dirty_data(entity.get("dirty_data"))
+            for nested_key in ("name_data", "address_data"):
+                if isinstance(entity.get(nested_key), dict):
+                    entity[nested_key]["dirty_data"] = _compact_dirty_data(entity[nested_key].get("dirty_data"))
+
+    for key in ("name_data", "your_address"):
+        if isinstance(session_data.get(key), dict):
+            session_data[key]["dirty_data"] = _compact_dirty_data(session_data[key].get("dirty_data"))
+
+    businesses = session_data.get("businesses", {})
+    if companies_house_businesses := session_data.get("companies_house_businesses"):
+        session_data["companies_house_businesses"] = {
+            business_uuid: business
+            for business_uuid, business in companies_house_businesses.items()
+            if business_uuid not in businesses
+        }
+
+    return session_data
+
+
+# maps each schema version to the function that migrates session data from the version before it
+SCHEMA_MIGRATIONS: dict[int, Callable[[dict[str, Any]], dict[str, Any]]] = {
+    1: migrate_to_version_1,
+}
+
+
+def migrate_session_data(session_data: dict[str, Any]) -> dict[str, Any]:
+    """Brings session data that was saved with an older schema version up to date. Sessions saved before the schema
+    was versioned are version 0."""
+    version = session_data.pop(SCHEMA_VERSION_KEY, 0)
+    for next_version in range(version + 1, SESSION_SCHEMA_VERSION + 1):
+        session_data = SCHEMA_MIGRATIONS[next_version](session_data)
+    return session_data
+
+
+class SessionStore(CachedDBStore):
+    """Implements sessions that are stored in the cache as compressed, versioned blobs, backed by the database."""
+
+    cache_key_prefix = KEY_PREFIX
+
+    def encode_for_cache(self, session_data: dict[str, Any]) -> bytes:
+        return zlib.compress(self.serializer().dumps({**session_data, SCHEMA_VERSION_KEY: SESSION_SCHEMA_VERSION}))
+
+    def decode_from_cache(self, cached_data: bytes) -> dict[str, Any] | None:
+        try:
+            return self.serializer().loads(zlib.decompress(cached_data))
+        except (zlib.error, ValueError, TypeError):
+            logger.warning("Cached session data could not be decoded, falling back to the database")
+            return None
+
+    def load(self) -> dict[str, Any]:
+        try:
+            cached_data = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends raise an exception on invalid cache keys. If this happens, reset the session.
+            cached_data = None
+
+        session_data = self.decode_from_cache(cached_data) if cached_data is not None else None
+        if session_data is None:
+            session = self._get_session_from_db()
+            if not session:
+                return {}
+            session_data = migrate_session_data(self.decode(session.session_data))
+            self._cache.set(
+                self.cache_key,
+                self.encode_for_cache(session_data),
+                timeout=self.get_expiry_age(expiry=session.expire_date),
+            )
+            return session_data
+
+        return migrate_session_data(session_data)
+
+    @property
+    def db_refreshed_cache_key(self) -> str:
+        return f"{self.cache_key}:db_refreshed"
+
+    def save(self, must_create: bool = False) -> None:
+        if self.session_key is None:
+            return self.create()
+
+        if must_create:
+            DBStore.save(self, must_create)
+            self._cache.set(self.db_refreshed_cache_key, True, timeout=settings.SESSION_DB_REFRESH_INTERVAL_SECONDS)
+        elif settings.SESSION_DB_WRITE_THROUGH or self._cache.add(
+            self.db_refreshed_cache_key, True, timeout=settings.SESSION_DB_REFRESH_INTERVAL_SECONDS
+        ):
+            DBStore.save(self, must_create)
+
+        data = self._get_session(no_load=must_create)
+        self._cache.set(self.cache_key, self.encode_for_cache(data), timeout=self.get_expiry_age())
+
+    def cycle_key(self) -> None:
+        super().cycle_key()
+        # the data is usually changed straight after (e.g. login() adds the user), so write the row again when it's saved
+        self._cache.delete(self.db_refreshed_cache_key)
@@ -1,9 +1,13 @@
 import functools
+import threading
 from typing import Any
 
 from django.contrib.sites.models import Site
 from django.core.exceptions import PermissionDenied
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.http import HttpRequest, HttpResponse
+from django.http.request import split_domain_port
 
 
 class SiteName:
@@ -11,6 +15,40 @@ class SiteName:
     view_a_licence = "view-a-licence"
 
 
+# the sites by their domain, loaded the first time a request needs one
+_sites_by_domain: dict[str, Site] | None = None
+_sites_by_domain_lock = threading.Lock()
+
+
+def get_sites_by_domain(reload: bool = False) -> dict[str, Site]:
+    global _sites_by_domain
+    if _sites_by_domain is None or reload:
+        with _sites_by_domain_lock:
+            if _sites_by_domain is None or reload:
+                _sites_by_domain = {site.domain.lower(): site for site in Site.objects.all()}
+    return _sites_by_domain
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def clear_sites_by_domain(sender: Any, **kwargs: object) -> None:
+    global _sites_by_domain
+    _sites_by_domain = None
+
+
+def get_site_for_host(host: str) -> Site:
+    """Returns the site for the request's host, in the same way as Site.objects.get_current(), but from the sites in
+    memory. The sites are loaded again once for a host we don't know, in case it's been added by another process.
+    Raises Site.DoesNotExist if there isn't one."""
+    host = host.lower()
+    domain, _ = split_domain_port(host)
+    for reload in (False, True):
+        sites_by_domain = get_sites_by_domain(reload=reload)
+        if site := sites_by_domain.get(host) or sites_by_domain.get(domain):
+            return site
+    raise Site.DoesNotExist(f"There isn't a site for {host}")
+
+
 def require_apply_for_a_licence() -> Any:
     def decorator(f: Any) -> Any:
         """Decorator to require that a view only accepts requests from the apply-for-a-licence site."""
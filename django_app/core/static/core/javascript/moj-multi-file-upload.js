@@ -188,11 +188,18 @@ $.MultiFileUpload.prototype.deleteRowContainerIfNoFilesUploaded = function () {
 
 $.MultiFileUpload.prototype.uploadFile = function (file) {
     this.params.uploadFileEntryHook(this, file);
-    var formData = new FormData();
-    formData.append('document', file);
     var item = $(this.getFileRowHtml(file));
     this.feedbackContainer.find('.moj-multi-file-upload__list').append(item);
 
+    if (this.params.startDirectUploadUrl) {
+        // upload the file straight to S3, rather than through the server
+        this.uploadFileDirectly(file, item);
+        return;
+    }
+
+    var formData = new FormData();
+    formData.append('document', file);
+
     // Show the uploaded files container
     var token = $('input[name="csrfmiddlewaretoken"]').attr('value');
     $.ajax({
@@ -205,40 +212,129 @@ $.MultiFileUpload.prototype.uploadFile = function (file) {
         processData: false,
         contentType: false,
         success: $.proxy(function (response) {
-            if (response.success) {
-                item.find('.moj-multi-file-upload__message').html(this.getSuccessHtml(response.file_name, response.file_url));
-                this.status.html("Success");
-                item.find('.moj-multi-file-upload__actions').append(this.getDeleteButtonHtml(response.file_name));
-            } else {
-                item.remove()
-                this.deleteRowContainerIfNoFilesUploaded()
-
-                // Error summary handling
-                if ($('.govuk-error-summary__list').length) {
-                    // We have an error summary box already
-                    $('.govuk-error-summary__list').last().append(this.getErrorSummaryListElementHtml(response.error, first_error = false));
-                } else {
-                    // We need to create an error summary box
-                    $('.govuk-grid-column-two-thirds').last().prepend(this.getErrorSummaryHtml(response.error))
-                }
-            }
+            this.onUploadResponse(item, response);
         }, this),
         error: $.proxy(function (jqXHR, textStatus, errorThrown) {
             this.params.uploadFileErrorHook(this, file, jqXHR, textStatus, errorThrown);
             item.remove()
         }, this),
-        xhr: function () {
-            var xhr = new XMLHttpRequest();
-            xhr.upload.addEventListener('progress', function (e) {
-                if (e.lengthComputable) {
-                    var percentComplete = e.loaded / e.total;
-                    percentComplete = parseInt(percentComplete * 100, 10);
-                    item.find('.moj-multi-file-upload__progress').text(' ' + percentComplete + '%');
-
-                }
-            }, false);
-            return xhr;
+        xhr: this.getProgressXhr(item)
+    });
+};
+
+$.MultiFileUpload.prototype.getProgressXhr = function (item) {
+    return function () {
+        var xhr = new XMLHttpRequest();
+        xhr.upload.addEventListener('progress', function (e) {
+            if (e.lengthComputable) {
+                var percentComplete = e.loaded / e.total;
+                percentComplete = parseInt(percentComplete * 100, 10);
+                item.find('.moj-multi-file-upload__progress').text(' ' + percentComplete + '%');
+
+            }
+        }, false);
+        return xhr;
+    };
+};
+
+$.MultiFileUpload.prototype.onUploadResponse = function (item, response) {
+    if (response.success) {
+        item.find('.moj-multi-file-upload__message').html(this.getSuccessHtml(response.file_name, response.file_url));
+        this.status.html("Success");
+        item.find('.moj-multi-file-upload__actions').append(this.getDeleteButtonHtml(response.file_name));
+    } else {
+        item.remove()
+        this.deleteRowContainerIfNoFilesUploaded()
+
+        // Error summary handling
+        if ($('.govuk-error-summary__list').length) {
+            // We have an error summary box already
+            $('.govuk-error-summary__list').last().append(this.getErrorSummaryListElementHtml(response.error, first_error = false));
+        } else {
+            // We need to create an error summary box
+            $('.govuk-grid-column-two-thirds').last().prepend(this.getErrorSummaryHtml(response.error))
         }
+    }
+};
+
+$.MultiFileUpload.prototype.uploadFileDirectly = function (file, item) {
+    var token = $('input[name="csrfmiddlewaretoken"]').attr('value');
+    var onError = $.proxy(function (jqXHR, textStatus, errorThrown) {
+        this.params.uploadFileErrorHook(this, file, jqXHR, textStatus, errorThrown);
+        item.remove()
+    }, this);
+
+    // 1. check the file can be uploaded, and get a presigned POST to upload it with
+    $.ajax({
+        url: this.params.startDirectUploadUrl,
+        type: 'post',
+        data: {file_name: file.name, size: file.size},
+        headers: {
+            'X-CSRFToken': token
+        },
+        error: onError,
+        success: $.proxy(function (response) {
+            if (!response.success) {
+                this.onUploadResponse(item, response);
+                return;
+            }
+
+            // 2. upload the file to S3, the file has to be the last field of the form
+            var formData = new FormData();
+            $.each(response.fields, function (name, value) {
+                formData.append(name, value);
+            });
+            formData.append('file', file);
+            $.ajax({
+                url: response.url,
+                type: 'post',
+                data: formData,
+                processData: false,
+                contentType: false,
+                error: onError,
+                xhr: this.getProgressXhr(item),
+                success: $.proxy(function () {
+                    // 3. tell the server the file has been uploaded, so it's checked
+                    $.ajax({
+                        url: this.params.completeDirectUploadUrl,
+                        type: 'post',
+                        data: {file_name: response.file_name},
+                        headers: {
+                            'X-CSRFToken': token
+                        },
+                        error: onError,
+                        success: $.proxy(function () {
+                            this.pollDirectUploadStatus(item, response.file_name, onError);
+                        }, this)
+                    });
+                }, this)
+            });
+        }, this)
+    });
+};
+
+// the checks are given up on by the server after 5 minutes, so stop asking shortly after that
+$.MultiFileUpload.prototype.maxDirectUploadStatusPolls = 330;
+
+$.MultiFileUpload.prototype.pollDirectUploadStatus = function (item, file_name, onError, polls) {
+    // 4. wait for the checks to finish, then show the outcome as if it had been uploaded through the server
+    polls = polls || 0;
+    if (polls >= this.maxDirectUploadStatusPolls) {
+        onError(null, 'timeout');
+        return;
+    }
+    $.ajax({
+        url: this.params.directUploadStatusUrl + "?file_name=" + encodeURIComponent(file_name),
+        type: 'get',
+        dataType: 'json',
+        error: onError,
+        success: $.proxy(function (response) {
+            if (response.status === 'passed' || response.status === 'failed') {
+                this.onUploadResponse(item, response);
+            } else {
+                setTimeout($.proxy(this.pollDirectUploadStatus, this, item, file_name, onError, polls + 1), 1000);
+            }
+        }, this)
     });
 };
 
@@ -0,0 +1,179 @@
+"""
+Where the time goes in each request: how many database queries, cache operations and outbound HTTP calls (S3,
+Companies House, Notify, One Login...) it made, and how long they took.
+
+TelemetryMiddleware starts a RequestTelemetry for each request, and the hooks below add to it - the database through
+an execute wrapper, the cache through core.cache.RedisCache, and outbound HTTP through urllib3, which both requests and
+boto3 send their requests through. Work done outside a request, e.g. in a background thread, isn't counted.
+
+The latency of each view is also kept as a histogram in redis, for every process to add to, which MetricsView
+serves in the Prometheus text format.
+"""
+
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from django.core.cache import cache
+from urllib3.connectionpool import HTTPConnectionPool
+
+
+class TelemetryCategory:
+    db = "db"
+    cache = "cache"
+    http = "http"
+
+
+# the upper bounds of the latency histogram's buckets, in seconds
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LATENCY_CACHE_KEY_PREFIX = "telemetry_latency"
+
+
+@dataclasses.dataclass
+class TimingTotal:
+    count: int = 0
+    duration: float = 0  # seconds
+
+
+@dataclasses.dataclass
+class RequestTelemetry:
+    start: float = dataclasses.field(default_factory=time.perf_counter)
+    totals: dict[str, TimingTotal] = dataclasses.field(
+        default_factory=lambda: {
+            TelemetryCategory.db: TimingTotal(),
+            TelemetryCategory.cache: TimingTotal(),
+            TelemetryCategory.http: TimingTotal(),
+        }
+    )
+    # metrics the view added for the Server-Timing header, see add_server_timing()
+    server_timings: list[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return time.perf_counter() - self.start
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            f"{category}_{field}": round(total.duration * 1000, 2) if field == "ms" else total.count
+            for category, total in self.totals.items()
+            for field in ("count", "ms")
+        }
+
+
+_current_telemetry: contextvars.ContextVar[RequestTelemetry | None] = contextvars.ContextVar("current_telemetry", default=None)
+# the categories being timed, so an operation that's made up of others (e.g. urllib3 following a redirect) is only
+# counted once
+_timing: contextvars.ContextVar[frozenset[str]] = contextvars.ContextVar("timing", default=frozenset())
+
+
+def get_current_telemetry() -> RequestTelemetry | None:
+    return _current_telemetry.get()
+
+
+@contextlib.contextmanager
+def collect_telemetry() -> Iterator[RequestTelemetry]:
+    """Collects the telemetry of everything done in the block."""
+    telemetry = RequestTelemetry()
+    token = _current_telemetry.set(telemetry)
+    try:
+        yield telemetry
+    finally:
+        _current_telemetry.reset(token)
+
+
+@contextlib.contextmanager
+def timer(category: str) -> Iterator[None]:
+    """Adds the time the block takes to the current request's telemetry, if there is one."""
+    telemetry = _current_telemetry.get()
+    timing = _timing.get()
+    if telemetry is None or category in timing:
+        yield
+        return
+
+    token = _timing.set(timing | {category})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = telemetry.totals[category]
+        total.count += 1
+        total.duration += time.perf_counter() - start
+        _timing.reset(token)
+
+
+def timed(category: str) -> Callable[[Callable], Callable]:
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timer(category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_server_timing(metrics: str) -> None:
+    """Adds metrics to the Server-Timing header of the current request's response, if there is one. Like the rest of
+    the request's timings, they're only sent to staff."""
+    telemetry = _current_telemetry.get()
+    if telemetry is not None and metrics:
+        telemetry.server_timings.append(metrics)
+
+
+def time_db_query(execute: Callable, sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+    """A database execute wrapper, see https://docs.djangoproject.com/en/4.2/topics/db/instrumentation/"""
+    with timer(TelemetryCategory.db):
+        return execute(sql, params, many, context)
+
+
+_http_instrumentation_installed = False
+_http_instrumentation_lock = threading.Lock()
+
+
+def install_http_instrumentation() -> None:
+    """Times every request urllib3 makes, which is how both requests and boto3 talk to the outside world."""
+    global _http_instrumentation_installed
+    with _http_instrumentation_lock:
+        if not _http_instrumentation_installed:
+            HTTPConnectionPool.urlopen = timed(TelemetryCategory.http)(HTTPConnectionPool.urlopen)  # type: ignore[method-assign]
+            _http_instrumentation_installed = True
+
+
+def get_latency_cache_key(view_name: str) -> str:
+    return f"{LATENCY_CACHE_KEY_PREFIX}:{view_name}"
+
+
+def record_view_latency(view_name: str, duration: float) -> None:
+    """Adds a request to the view's latency histogram. The count of each bucket is kept on its own, rather than
+    cumulatively, so a request is a single increment."""
+    bucket = next((str(upper_bound) for upper_bound in LATENCY_BUCKETS if duration <= upper_bound), "+Inf")
+    cache.hincrby(
+        get_latency_cache_key(view_name),
+        {bucket: 1, "count": 1, "sum_microseconds": round(duration * 1_000_000)},
+        timeout=None,
+    )
+
+
+def get_latency_metrics() -> str:
+    """Returns the latency histogram of every view in the Prometheus text format."""
+    lines = [
+        "# HELP django_view_duration_seconds How long each view took to respond, including the middleware.",
+        "# TYPE django_view_duration_seconds histogram",
+    ]
+    for cache_key in sorted(cache.iter_keys(f"{LATENCY_CACHE_KEY_PREFIX}:*")):
+        view_name = cache_key.removeprefix(f"{LATENCY_CACHE_KEY_PREFIX}:")
+        counts = {field: int(value) for field, value in cache.hgetall(cache_key).items()}
+        label = 'view="{}"'.format(view_name.replace("\\", "\\\\").replace('"', '\\"'))
+
+        cumulative = 0
+        for upper_bound in [*map(str, LATENCY_BUCKETS), "+Inf"]:
+            cumulative += counts.get(upper_bound, 0)
+            lines.append(f'django_view_duration_seconds_bucket{{{label},le="{upper_bound}"}} {cumulative}')
+        lines.append(f"django_view_duration_seconds_sum{{{label}}} {counts.get('sum_microseconds', 0) / 1_000_000}")
+        lines.append(f"django_view_duration_seconds_count{{{label}}} {counts.get('count', 0)}")
+    return "\n".join(lines) + "\n"
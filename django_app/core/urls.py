@@ -7,11 +7,13 @@ from django.urls import include, path
 from .views import cookie_views, generic_views
 from .views.base_views import RedirectBaseDomainView
 from .views.generic_views import PingSessionView, SessionExpiredView
+from .views.telemetry_views import MetricsView
 
 public_urls = [
     path("", RedirectBaseDomainView.as_view(), name="initial_redirect_view"),
     path("give-feedback/", include("feedback.urls")),
     path("healthcheck/", include("healthcheck.urls")),
+    path("telemetry/metrics", MetricsView.as_view(), name="telemetry_metrics"),
     path("throw_error/", lambda x: 1 / 0),
     path("apply/", include("apply_for_a_licence.urls")),
     path("cookies-policy", cookie_views.CookiesConsentView.as_view(), name="cookies_consent"),
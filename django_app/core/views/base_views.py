@@ -1,10 +1,14 @@
 import datetime
 from typing import Any
 
-from apply_for_a_licence.utils import get_dirty_form_data
+from apply_for_a_licence.utils import (
+    cache_validated_step,
+    compact_dirty_form_data,
+    get_dirty_form_data,
+)
 from authentication.mixins import LoginRequiredMixin
 from core.sites import is_apply_for_a_licence_site, is_view_a_licence_site
-from django import forms
+from core.telemetry import add_server_timing
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 from django.shortcuts import redirect
@@ -15,7 +19,15 @@ from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.safestring import mark_safe
 from django.views.generic import DetailView, FormView, RedirectView
 from django_ratelimit.exceptions import Ratelimited
-from playwright.sync_api import PdfMargins, sync_playwright
+from utils.pdf import (
+    PDFRenderingUnavailable,
+    PhaseTimer,
+    cache_pdf,
+    get_cached_pdf,
+    record_pdf_metrics,
+    render_pdf,
+    wait_for_generated_pdf,
+)
 
 
 class BaseFormView(LoginRequiredMixin, FormView):
@@ -73,19 +85,7 @@ class BaseFormView(LoginRequiredMixin, FormView):
         self.form = form
 
         # we want to store the dirty form data in the session, so we can access it later on
-        form_data = dict(form.data.copy())
-
-        # first get rid of some useless cruft
-        form_data.pop("csrfmiddlewaretoken", None)
-        form_data.pop("encoding", None)
-
-        # Django QueryDict is a weird beast, we need to check if the key maps to a list of values (as it does with a
-        # multi-select field) and if it does, we need to convert it to a list. If not, we can just keep the value as is.
-        # We also need to keep the value as it is if the form is an ArrayField.
-        for key, value in form_data.items():
-            if not isinstance(form.fields.get(key), forms.MultipleChoiceField):
-                if len(value) == 1:
-                    form_data[key] = value[0]
+        form_data = compact_dirty_form_data(form)
 
         self.changed_fields = {}
         if previous_data := get_dirty_form_data(self.request, self.step_name):
@@ -95,6 +95,8 @@ class BaseFormView(LoginRequiredMixin, FormView):
 
         # now keep it in the session
         self.request.session[self.step_name] = form_data
+        # along with the result of validating it, so it doesn't have to be revalidated until it changes
+        cache_validated_step(self.request, self.step_name, form_data, form)
 
         # get the success_url as this might change the value of redirect_after_post to avoid duplicating conditional
         # logic in the get_success_url method
@@ -141,22 +143,42 @@ class BaseDownloadPDFView(DetailView):
     def get(self, request: HttpRequest, **kwargs: object) -> HttpResponse:
         self.reference = self.request.GET.get("reference", "")
         filename = f"application-{self.reference}.pdf"
-        pdf_data = None
-        template_string = render_to_string(self.template_name, context=self.get_context_data(**kwargs))
-        margins = PdfMargins(left="1.25in", right="1.25in", top="1in", bottom="1in")
-
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.set_content(mark_safe(template_string))
-            page.wait_for_function("document.fonts.ready.then(fonts => fonts.status === 'loaded')")
-            pdf_data = page.pdf(format="A4", tagged=True, margin=margins)
-            browser.close()
+
+        timer = PhaseTimer()
+        browser_memory = None
+        cache_key = self.get_pdf_cache_key()
+        with timer.phase("cache"):
+            pdf_data = get_cached_pdf(cache_key) if cache_key else None
+            if not pdf_data and cache_key and wait_for_generated_pdf(cache_key):
+                # it's just been generated in the background
+                pdf_data = get_cached_pdf(cache_key)
+
+        if not pdf_data:
+            with timer.phase("template"):
+                template_string = render_to_string(self.template_name, context=self.get_context_data(**kwargs))
+
+            try:
+                rendered_pdf = render_pdf(mark_safe(template_string), timer)
+            except PDFRenderingUnavailable:
+                return HttpResponse("The application could not be downloaded at this time, please try again", status=503)
+
+            pdf_data = rendered_pdf.data
+            browser_memory = rendered_pdf.browser_memory
+            if cache_key:
+                cache_pdf(cache_key, pdf_data)
+
+        record_pdf_metrics(self.reference, timer, len(pdf_data), browser_memory)
 
         response = HttpResponse(pdf_data, content_type="application/pdf")
         response["Content-Disposition"] = f"inline; filename={filename}"
+        # only sent to staff, by TelemetryMiddleware
+        add_server_timing(timer.server_timing())
         return response
 
+    def get_pdf_cache_key(self) -> str | None:
+        """Override this method to return the key the rendered PDF should be cached under, or None to not cache it."""
+        return None
+
     def get_context_data(self, **kwargs: object) -> dict[str, Any]:
         self.object: list[Any] = []
         context = super().get_context_data(**kwargs)
@@ -0,0 +1,25 @@
+import hmac
+
+from core.telemetry import get_latency_metrics
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse
+from django.views import View
+
+
+class MetricsView(View):
+    """The latency histogram of each view, in the Prometheus text format, for scraping.
+
+    The scraper must send the TELEMETRY_METRICS_TOKEN as a bearer token. If the token isn't set, the page doesn't
+    exist."""
+
+    http_method_names = ["get"]
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        if not settings.TELEMETRY_METRICS_TOKEN:
+            raise Http404()
+
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization, f"Bearer {settings.TELEMETRY_METRICS_TOKEN}"):
+            return HttpResponse(status=403)
+
+        return HttpResponse(get_latency_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,71 @@
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns this process' background executor, creating it the first time it's needed."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_TASK_WORKERS, thread_name_prefix="background-task")
+        return _executor
+
+
+def closing_db_connections(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wraps a function that's run in a thread other than the request's, so any database connection it opens is
+    closed once it's done - each thread gets its own connection, and Django only closes the request thread's."""
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+
+    return wrapper
+
+
+def run_in_background(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Runs the function in a background thread of this process, so the request doesn't have to wait for it.
+
+    There's no task queue, so the task is lost if the process dies before it's finished - only use this for work
+    that can safely be done again later (e.g. warming a cache)."""
+
+    @closing_db_connections
+    def run_task() -> Any:
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logger.exception("Background task %s failed", func.__name__)
+            raise
+
+    return get_executor().submit(run_task)
+
+
+async def iterate_in_thread(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """Turns a blocking iterator into an async one, fetching each item in a thread.
+
+    Under ASGI, Django reads the whole of a sync iterator given to a StreamingHttpResponse into memory before
+    sending any of it, so anything that's too big for that must be streamed with this instead."""
+    done = object()
+    get_next = sync_to_async(next, thread_sensitive=False)
+    try:
+        while (item := await get_next(iterator, done)) is not done:
+            yield item
+    finally:
+        # if the download was cancelled, let the iterator clean up after itself
+        if close := getattr(iterator, "close", None):
+            await sync_to_async(close, thread_sensitive=False)()
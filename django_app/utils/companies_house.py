@@ -1,4 +1,8 @@
 import base64
+import logging
+import threading
+import time
+from datetime import date, timedelta
 from typing import Any
 
 import requests
@@ -7,7 +11,12 @@ from apply_for_a_licence.exceptions import (
     CompaniesHouseException,
 )
 from django.conf import settings
+from django.core.cache import cache
 from django_countries import countries
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
 
 COMPANIES_HOUSE_BASE_DOMAIN = "https://api.companieshouse.gov.uk"
 
@@ -19,24 +28,184 @@ def get_companies_house_basic_auth_token(api_key: str = settings.COMPANIES_HOUSE
     return base64.b64encode(bytes(f"{api_key}:", "utf-8")).decode("utf-8")
 
 
+# Companies House returns a 500 for a company number that doesn't exist, so we only retry the other server errors
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class CircuitBreaker:
+    """Stops calls to a service that keeps failing, so requests fail straight away rather than waiting on it.
+
+    After failure_threshold failures in a row the breaker opens, and no calls are allowed for reset_timeout seconds.
+    After that, one call at a time is allowed through to test the service, and the breaker closes once one succeeds.
+    The state is kept per process."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # let this call through to test the service, the breaker stays open for everyone else until it's done
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"Circuit breaker opened after {self.failures} failures in a row")
+                self.opened_at = time.monotonic()
+
+
+companies_house_circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD,
+    reset_timeout=settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_RESET_TIMEOUT,
+)
+
+_companies_house_session: requests.Session | None = None
+_companies_house_session_lock = threading.Lock()
+
+
+def get_companies_house_session() -> requests.Session:
+    """Returns this process' session for the Companies House API, creating it the first time it's needed.
+
+    The session keeps connections to Companies House open between requests, and retries the server errors that are
+    likely to be temporary with a jittered, exponential backoff."""
+    global _companies_house_session
+    with _companies_house_session_lock:
+        if _companies_house_session is None:
+            retry = Retry(
+                total=settings.COMPANIES_HOUSE_RETRIES,
+                backoff_factor=0.2,
+                backoff_jitter=0.2,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=["GET"],
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_maxsize=settings.COMPANIES_HOUSE_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.headers["Authorization"] = f"Basic {get_companies_house_basic_auth_token()}"
+            _companies_house_session = session
+        return _companies_house_session
+
+
+def get_companies_house_cache_key(registration_number: str) -> str:
+    return f"companies_house:{registration_number}"
+
+
 def get_details_from_companies_house(registration_number: str) -> dict[str, Any]:
     """
     Retrieves and returns details of a company from Companies House
     using registration number that is passed in.
+
+    The details are cached, as are numbers that Companies House says don't exist (for a shorter time). Most companies
+    are in our copy of the Companies House snapshot, so the API is only called for the companies that aren't, or if
+    our copy is out of date. If the same number is being looked up by another request, we wait for its result rather
+    than asking Companies House again.
     """
+    cache_key = get_companies_house_cache_key(registration_number)
+    if (cached_lookup := cache.get(cache_key)) is not None:
+        return get_cached_lookup_result(cached_lookup)
+
+    indexed_company = get_indexed_company(registration_number)
+    if indexed_company and indexed_company.snapshot_date >= date.today() - timedelta(
+        days=settings.COMPANIES_HOUSE_SNAPSHOT_MAX_AGE_DAYS
+    ):
+        company_details = indexed_company.get_company_details()
+        cache.set(cache_key, {"company_details": company_details}, timeout=settings.COMPANIES_HOUSE_CACHE_TTL)
+        return company_details
+
+    lock_key = f"{cache_key}:lock"
+    if not (locked := cache.add(lock_key, True, timeout=settings.COMPANIES_HOUSE_LOOKUP_WAIT)):
+        deadline = time.monotonic() + settings.COMPANIES_HOUSE_LOOKUP_WAIT
+        while time.monotonic() < deadline and cache.get(lock_key) is not None:
+            time.sleep(0.1)
+            if (cached_lookup := cache.get(cache_key)) is not None:
+                return get_cached_lookup_result(cached_lookup)
+        # the other lookup failed, or is taking too long, so we look it up ourselves
+
+    try:
+        company_details = request_details_from_companies_house(registration_number)
+    except CompaniesHouseException as e:
+        cache.set(cache_key, {"error": str(e)}, timeout=settings.COMPANIES_HOUSE_NEGATIVE_CACHE_TTL)
+        raise
+    except CompaniesHouse500Error:
+        if indexed_company:
+            # Companies House is down, our copy of the company is out of date but it's better than nothing
+            return indexed_company.get_company_details()
+        raise
+    else:
+        cache.set(cache_key, {"company_details": company_details}, timeout=settings.COMPANIES_HOUSE_CACHE_TTL)
+        return company_details
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def get_indexed_company(registration_number: str) -> Any:
+    """Returns the company from our copy of the Companies House snapshot, or None if it's not in it."""
+    # imported here, as the models use get_formatted_address from this module
+    from apply_for_a_licence.models import CompaniesHouseCompany
+
+    return CompaniesHouseCompany.objects.filter(company_number=registration_number).first()
+
+
+def get_cached_lookup_result(cached_lookup: dict[str, Any]) -> dict[str, Any]:
+    if "error" in cached_lookup:
+        raise CompaniesHouseException(cached_lookup["error"])
+    return cached_lookup["company_details"]
+
+
+def request_details_from_companies_house(registration_number: str) -> dict[str, Any]:
+    """Asks the Companies House API for the details of a company.
+
+    If Companies House has been failing, the circuit breaker is open and we don't ask at all, the user is sent
+    straight to enter the company's details manually."""
+    if not companies_house_circuit_breaker.allow_request():
+        raise CompaniesHouse500Error
+
+    try:
+        response = get_companies_house_session().get(
+            f"{COMPANIES_HOUSE_BASE_DOMAIN}/company/{registration_number}",
+            timeout=(settings.COMPANIES_HOUSE_CONNECT_TIMEOUT, settings.COMPANIES_HOUSE_READ_TIMEOUT),
+        )
+    except requests.RequestException:
+        logger.exception("Failed to connect to Companies House")
+        companies_house_circuit_breaker.record_failure()
+        raise CompaniesHouse500Error
 
-    get_company_headers = {"Authorization": f"Basic {get_companies_house_basic_auth_token()}"}
-    response = requests.get(
-        f"{COMPANIES_HOUSE_BASE_DOMAIN}/company/{registration_number}",
-        headers=get_company_headers,
-    )
     if response.status_code == 200:
+        companies_house_circuit_breaker.record_success()
         return response.json()
 
+    if response.status_code == 404:
+        # the only response that means the company doesn't exist, so the only one that's cached
+        companies_house_circuit_breaker.record_success()
+        raise CompaniesHouseException(f"Companies House API request failed: {response.status_code}")
+
     if response.status_code == 500:
+        companies_house_circuit_breaker.record_success()
         raise CompaniesHouse500Error
 
-    raise CompaniesHouseException(f"Companies House API request failed: {response.status_code}")
+    # a bad or throttled API key (401/403/429), or a server error we've already retried, counts as Companies House
+    # failing rather than the company not existing
+    logger.error(f"Companies House API request failed: {response.status_code}")
+    companies_house_circuit_breaker.record_failure()
+    raise CompaniesHouse500Error
 
 
 def get_formatted_address(address_dict: dict[str, Any]) -> str:
@@ -0,0 +1,198 @@
+"""
+Documents that the browser uploads straight to the temporary bucket, rather than through UploadDocumentsView.
+
+The browser asks for a presigned POST that can only upload to a staging key, uploads the file, then tells us it's done.
+The file is then checked in the background (its type, size, and whether it contains a virus). If it passes, the exact
+version that was checked is copied into the session's folder, which the presigned POST can't write to, and added to the
+session's uploaded files. Either way, the staging copy is deleted. The browser polls for the outcome.
+
+The presigned POST can be used until it expires, so the browser could upload different bytes to the staging key while,
+or after, the file's checked - that's why it's only ever the checked version that's kept.
+"""
+
+import io
+import json
+import logging
+import time
+from importlib import import_module
+from typing import Any, Iterable
+
+from apply_for_a_licence.forms.forms_documents import (
+    MAX_DOCUMENT_SIZE,
+    validate_document,
+)
+from botocore.exceptions import BotoCoreError, ClientError
+from core.document_storage import TemporaryDocumentStorage
+from core.utils import get_mime_type
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django_chunk_upload_handlers.clam_av import CHUNK_SIZE, ClamAVFileUploadHandler
+
+from .s3 import (
+    add_user_uploaded_file,
+    generate_presigned_upload,
+    get_s3_client_from_storage,
+    get_uploaded_files_cache_key,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentUploadStatus:
+    # the browser has been given a presigned POST, but hasn't told us it's uploaded the file yet
+    pending = "pending"
+    checking = "checking"
+    passed = "passed"
+    failed = "failed"
+
+
+def get_direct_upload_key(session_key: str, file_name: str) -> str:
+    """Returns the staging key the browser uploads a document to, which is outside the session's folder."""
+    return f"direct-uploads/{session_key}/{file_name}"
+
+
+def get_document_upload_status_cache_key(session_key: str) -> str:
+    return f"document_upload_status:{session_key}"
+
+
+def set_document_upload_status(session_key: str, file_name: str, status: str, error: str = "") -> None:
+    cache.hset(
+        get_document_upload_status_cache_key(session_key),
+        file_name,
+        json.dumps({"status": status, "error": error, "updated_at": time.time()}),
+        timeout=settings.SESSION_COOKIE_AGE,
+    )
+
+
+def is_document_upload_abandoned(upload_status: dict[str, Any]) -> bool:
+    """Returns True if a document has been pending or checking for so long that it never will finish, e.g. the browser
+    was closed before it uploaded it, or the process checking it died."""
+    timeouts = {
+        # the presigned POST can't be used after it's expired
+        DocumentUploadStatus.pending: settings.DIRECT_UPLOAD_URL_EXPIRY_SECONDS,
+        DocumentUploadStatus.checking: settings.DIRECT_UPLOAD_CHECK_TIMEOUT_SECONDS,
+    }
+    if (timeout := timeouts.get(upload_status["status"])) is None:
+        return False
+    return time.time() - upload_status.get("updated_at", 0) > timeout
+
+
+def get_document_upload_statuses(session_key: str) -> dict[str, dict[str, Any]]:
+    """Returns the status of each document the session has uploaded straight to S3, by its file name. Documents that
+    have been abandoned are returned as failed, so they're no longer counted or polled for."""
+    upload_statuses = {}
+    for file_name, status in cache.hgetall(get_document_upload_status_cache_key(session_key)).items():
+        upload_status = json.loads(status)
+        if is_document_upload_abandoned(upload_status):
+            upload_status = {
+                "status": DocumentUploadStatus.failed,
+                "error": f"{file_name} could not be uploaded, try again",
+                "updated_at": upload_status.get("updated_at", 0),
+            }
+        upload_statuses[file_name] = upload_status
+    return upload_statuses
+
+
+def remove_document_upload_status(session_key: str, file_name: str) -> None:
+    cache.hdel(get_document_upload_status_cache_key(session_key), file_name)
+
+
+def count_session_documents(session_key: str) -> int:
+    """Returns how many documents the session has uploaded, including the ones that are still being uploaded or checked."""
+    in_progress = [
+        file_name
+        for file_name, status in get_document_upload_statuses(session_key).items()
+        if status["status"] in (DocumentUploadStatus.pending, DocumentUploadStatus.checking)
+    ]
+    return len(cache.hgetall(get_uploaded_files_cache_key(session_key))) + len(in_progress)
+
+
+def start_document_upload(session_key: str, file_name: str, size: int) -> dict[str, Any]:
+    """Checks the document can be uploaded before the browser uploads it, raising a ValidationError if not, and returns
+    the presigned POST to upload it with. Its type can't be checked until it's been uploaded."""
+    validate_document(
+        file_name=file_name,
+        original_name=file_name,
+        mime_type=None,
+        size=size,
+        uploaded_documents=count_session_documents(session_key),
+    )
+    set_document_upload_status(session_key, file_name, DocumentUploadStatus.pending)
+    return generate_presigned_upload(TemporaryDocumentStorage(), get_direct_upload_key(session_key, file_name), MAX_DOCUMENT_SIZE)
+
+
+def scan_document_for_viruses(file_name: str, content_type: str, size: int, chunks: Iterable[bytes]) -> bool:
+    """Streams the document to ClamAV, in the same way ClamAVFileUploadHandler does for documents uploaded through this
+    server. Returns True if the document is clean."""
+    handler = ClamAVFileUploadHandler()
+    handler.new_file("document", file_name, content_type, size, content_type_extra={})
+    if handler.skip_av_check:
+        return True
+
+    uploaded = 0
+    for chunk in chunks:
+        handler.receive_data_chunk(chunk, uploaded)
+        uploaded += len(chunk)
+    handler.file_complete(uploaded)
+    return all(result["av_passed"] for result in handler.content_type_extra["clam_av_results"])
+
+
+def check_uploaded_document(session_key: str, file_name: str) -> None:
+    """Checks a document the browser has uploaded straight to S3. If it passes, the version that was checked is moved
+    into the session's folder and added to its uploaded files. Either way, the outcome is recorded for the browser to
+    pick up."""
+    storage = TemporaryDocumentStorage()
+    s3_client = get_s3_client_from_storage(storage)
+    staging_key = get_direct_upload_key(session_key, file_name)
+    set_document_upload_status(session_key, file_name, DocumentUploadStatus.checking)
+
+    try:
+        head = s3_client.head_object(Bucket=storage.bucket_name, Key=staging_key)
+        # every read is of this version, so if the file's replaced while it's being checked the read fails
+        etag = head["ETag"]
+        first_bytes = s3_client.get_object(Bucket=storage.bucket_name, Key=staging_key, IfMatch=etag, Range="bytes=0-2047")[
+            "Body"
+        ].read()
+        mime_type = get_mime_type(io.BytesIO(first_bytes))
+        validate_document(
+            file_name=file_name,
+            original_name=file_name,
+            mime_type=mime_type,
+            size=head["ContentLength"],
+            # this document has already been counted when the upload was started
+            uploaded_documents=count_session_documents(session_key) - 1,
+        )
+
+        body = s3_client.get_object(Bucket=storage.bucket_name, Key=staging_key, IfMatch=etag)["Body"]
+        if not scan_document_for_viruses(file_name, mime_type, head["ContentLength"], body.iter_chunks(CHUNK_SIZE)):
+            raise ValidationError("The selected file contains a virus", code="virus")
+
+        s3_client.copy_object(
+            Bucket=storage.bucket_name,
+            Key=f"{session_key}/{file_name}",
+            CopySource={"Bucket": storage.bucket_name, "Key": staging_key},
+            CopySourceIfMatch=etag,
+        )
+    except ValidationError as e:
+        error = e.messages[0]
+    except Exception:
+        # whatever goes wrong (S3, ClamAV, a response we can't parse...), the browser has to be told, or it would be
+        # left waiting for the document
+        logger.exception(f"Failed to check uploaded document {staging_key}")
+        error = f"{file_name} could not be uploaded, try again"
+    else:
+        error = None
+
+    try:
+        s3_client.delete_object(Bucket=storage.bucket_name, Key=staging_key)
+    except (BotoCoreError, ClientError):
+        logger.exception(f"Failed to delete uploaded document {staging_key}")
+
+    if error:
+        set_document_upload_status(session_key, file_name, DocumentUploadStatus.failed, error)
+        return
+
+    session_store: Any = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    add_user_uploaded_file(session_store, file_name)
+    set_document_upload_status(session_key, file_name, DocumentUploadStatus.passed)
@@ -1,14 +1,38 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from typing import Any
 
 import sentry_sdk
 from apply_for_a_licence.models import UserEmailVerification
+from core.models import OutboxEmail, OutboxEmailStatus
 from django.conf import settings
 from django.contrib.sessions.models import Session
+from django.db import models, transaction
 from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from notifications_python_client.errors import HTTPError
 from notifications_python_client.notifications import NotificationsAPIClient
 
+from .background import run_in_background
+
+logger = logging.getLogger(__name__)
+
+_notify_client: NotificationsAPIClient | None = None
+_notify_client_lock = threading.Lock()
+
+
+def get_notify_client() -> NotificationsAPIClient:
+    """Returns the Notify client shared by this process, creating it the first time it's needed."""
+    global _notify_client
+    with _notify_client_lock:
+        if _notify_client is None:
+            _notify_client = NotificationsAPIClient(settings.GOV_NOTIFY_API_KEY)
+        return _notify_client
+
 
 def verify_email(reporter_email_address: str, request: HttpRequest) -> None:
     verify_code = get_random_string(6, allowed_chars="0123456789")
@@ -28,7 +52,7 @@ def verify_email(reporter_email_address: str, request: HttpRequest) -> None:
 
 def send_email(email: str, context: dict[str, Any], template_id: str, reference: str | None = None) -> HttpResponse | bool:
     """Send an email using the GOV.UK Notify API."""
-    client = NotificationsAPIClient(settings.GOV_NOTIFY_API_KEY)
+    client = get_notify_client()
     try:
         send_report = client.send_email_notification(
             email_address=email,
@@ -43,6 +67,127 @@ def send_email(email: str, context: dict[str, Any], template_id: str, reference:
         return False
 
 
+def queue_email(email: str, context: dict[str, Any], template_id: str, reference: str | None = None) -> OutboxEmail:
+    """Adds an email to the outbox, to be sent through the GOV.UK Notify API once the current transaction (if any) is
+    committed. Unlike send_email, this doesn't wait for Notify, and the email is retried if it can't be sent."""
+    outbox_email = OutboxEmail.objects.create(
+        email=email, template_id=template_id, personalisation=get_context(context), reference=reference
+    )
+    # the worker will get to it anyway, this just means it's sent straight away
+    schedule_send_queued_emails()
+    return outbox_email
+
+
+def queue_emails(emails: list[str], context: dict[str, Any], template_id: str) -> list[OutboxEmail]:
+    """Adds the same email for each of the addresses to the outbox in one go, in the same way as queue_email."""
+    outbox_emails = OutboxEmail.objects.bulk_create(
+        OutboxEmail(email=email, template_id=template_id, personalisation=get_context(context)) for email in emails
+    )
+    if outbox_emails:
+        schedule_send_queued_emails()
+    return outbox_emails
+
+
+def _send_queued_emails_in_background() -> None:
+    run_in_background(send_queued_emails)
+
+
+def schedule_send_queued_emails() -> None:
+    """Sends the emails in the outbox once the current transaction (if any) is committed. However many emails are queued
+    in a transaction, they're all sent by the one batch, rather than each starting a batch of its own to compete over
+    them."""
+    connection = transaction.get_connection()
+    # the callbacks are dropped if the transaction (or the savepoint they were added in) is rolled back, so this is only
+    # ever skipped when there's a batch that will run
+    if not any(func is _send_queued_emails_in_background for _, func, *_ in connection.run_on_commit):
+        transaction.on_commit(_send_queued_emails_in_background)
+
+
+def send_queued_emails(batch_size: int | None = None) -> int:
+    """Sends a batch of the emails in the outbox that are due, returning how many were tried.
+
+    The emails are claimed in a short transaction, by marking them as sending, so they're not locked while Notify is
+    called and any number of workers can run at once without sending the same email twice. An email that's been
+    claimed for more than NOTIFY_OUTBOX_CLAIM_TIMEOUT_SECONDS, e.g. because the worker was killed, is claimed again.
+    An email that fails is retried with exponential backoff, unless Notify rejected it outright or it's been tried
+    NOTIFY_OUTBOX_MAX_ATTEMPTS times, in which case it's marked as dead and reported."""
+    outbox_emails = claim_queued_emails(batch_size or settings.NOTIFY_OUTBOX_BATCH_SIZE)
+    if not outbox_emails:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=settings.NOTIFY_OUTBOX_WORKERS, thread_name_prefix="notify-outbox") as executor:
+        errors = list(executor.map(send_outbox_email, outbox_emails))
+
+    for outbox_email, error in zip(outbox_emails, errors):
+        outbox_email.attempts += 1
+        outbox_email.claimed_at = None
+        if error is None:
+            outbox_email.status = OutboxEmailStatus.sent
+            outbox_email.sent_at = timezone.now()
+        elif outbox_email.attempts >= settings.NOTIFY_OUTBOX_MAX_ATTEMPTS or not is_retryable(error):
+            outbox_email.status = OutboxEmailStatus.dead
+            outbox_email.last_error = str(error)
+            logger.error(f"Giving up on sending outbox email {outbox_email.pk} after {outbox_email.attempts} attempts")
+            sentry_sdk.capture_exception(error)
+        else:
+            outbox_email.status = OutboxEmailStatus.pending
+            outbox_email.last_error = str(error)
+            outbox_email.next_attempt_at = timezone.now() + get_retry_delay(outbox_email.attempts)
+            logger.warning(f"Failed to send outbox email {outbox_email.pk}, retrying at {outbox_email.next_attempt_at}")
+
+    OutboxEmail.objects.bulk_update(
+        outbox_emails, ["status", "attempts", "next_attempt_at", "last_error", "claimed_at", "notification_id", "sent_at"]
+    )
+    return len(outbox_emails)
+
+
+def claim_queued_emails(batch_size: int) -> list[OutboxEmail]:
+    """Marks a batch of the emails that are due as being sent, and returns them. The lock is only held until they've
+    been marked, and emails another worker is claiming at the same time are skipped rather than waited for."""
+    now = timezone.now()
+    due = models.Q(status=OutboxEmailStatus.pending, next_attempt_at__lte=now) | models.Q(
+        status=OutboxEmailStatus.sending, claimed_at__lt=now - timedelta(seconds=settings.NOTIFY_OUTBOX_CLAIM_TIMEOUT_SECONDS)
+    )
+    with transaction.atomic():
+        outbox_emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True).filter(due).order_by("next_attempt_at")[:batch_size]
+        )
+        for outbox_email in outbox_emails:
+            outbox_email.status = OutboxEmailStatus.sending
+            outbox_email.claimed_at = now
+        OutboxEmail.objects.bulk_update(outbox_emails, ["status", "claimed_at"])
+    return outbox_emails
+
+
+def send_outbox_email(outbox_email: OutboxEmail) -> Exception | None:
+    """Sends an email from the outbox, returning the error if it couldn't be sent."""
+    try:
+        response = get_notify_client().send_email_notification(
+            email_address=outbox_email.email,
+            template_id=outbox_email.template_id,
+            personalisation=outbox_email.personalisation,
+            reference=outbox_email.reference,
+        )
+    except Exception as e:
+        return e
+    outbox_email.notification_id = response.get("id", "")
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Notify rejects an email with a 400 or 403 if it will never be sent (e.g. the template doesn't exist), otherwise
+    it's worth trying again."""
+    return not (isinstance(error, HTTPError) and error.status_code in (400, 403))
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    backoff = min(
+        settings.NOTIFY_OUTBOX_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.NOTIFY_OUTBOX_MAX_RETRY_BACKOFF_SECONDS
+    )
+    # jittered, so emails that failed together aren't all retried together
+    return timedelta(seconds=backoff * random.uniform(0.5, 1))
+
+
 def get_context(extra_context: dict | None = None) -> dict[str, Any]:
     extra_context = extra_context or {}
     footer = "Apply for a Licence service"
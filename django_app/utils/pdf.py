@@ -0,0 +1,449 @@
+import atexit
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterator
+
+import sentry_sdk
+from apply_for_a_licence.models import Licence
+from botocore.exceptions import BotoCoreError, ClientError
+from core.document_storage import PermanentDocumentStorage
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from playwright.sync_api import PdfMargins, sync_playwright
+
+from .background import run_in_background
+from .s3 import get_s3_client_from_storage
+
+logger = logging.getLogger(__name__)
+
+PDF_MARGINS = PdfMargins(left="1.25in", right="1.25in", top="1in", bottom="1in")
+
+# rendered PDFs are cached in the permanent bucket under this prefix
+PDF_CACHE_PREFIX = "pdf-cache"
+
+# how often a request checks whether the PDF it's waiting for has been generated in the background (in seconds)
+PDF_GENERATION_POLL_INTERVAL = 0.5
+
+
+class PDFGenerationStatus:
+    pending = "pending"
+    generating = "generating"
+    ready = "ready"
+    failed = "failed"
+
+
+class PhaseTimer:
+    """Records how long each phase of rendering a PDF took, as (start, end) wall-clock timestamps."""
+
+    def __init__(self) -> None:
+        self.phases: dict[str, tuple[float, float]] = {}
+        self.started: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def start(self, name: str) -> None:
+        self.started[name] = time.time()
+
+    def stop(self, name: str) -> None:
+        self.record(name, self.started.pop(name), time.time())
+
+    def record(self, name: str, start: float, end: float) -> None:
+        self.phases[name] = (start, end)
+
+    @property
+    def durations(self) -> dict[str, float]:
+        """The duration of each phase, in milliseconds."""
+        return {name: round((end - start) * 1000, 2) for name, (start, end) in self.phases.items()}
+
+    def server_timing(self) -> str:
+        """Formats the durations as the value of a Server-Timing header."""
+        return ", ".join(f"pdf-{name};dur={duration}" for name, duration in self.durations.items())
+
+
+@dataclass
+class RenderedPDF:
+    data: bytes
+    timer: PhaseTimer = field(default_factory=PhaseTimer)
+    # the JS heap used by the page that rendered the PDF, in bytes
+    browser_memory: int | None = None
+
+
+class PDFRenderingUnavailable(Exception):
+    """Exception raised when a PDF could not be rendered in time because all the browsers are busy."""
+
+    pass
+
+
+class BrowserWorker(threading.Thread):
+    """A thread that owns a single headless Chromium browser and uses it to render the jobs it takes off the queue.
+
+    Playwright's sync API binds its objects to the thread that created them, so each browser lives (and dies) inside
+    its own worker thread, and requests hand HTML over to it through the shared job queue."""
+
+    def __init__(self, jobs: queue.Queue, max_renders: int) -> None:
+        super().__init__(daemon=True, name="pdf-browser-worker")
+        self.jobs = jobs
+        self.max_renders = max_renders
+        self.browser = None
+        self.page = None
+        self.cdp_session = None
+        self.renders = 0
+
+    def run(self) -> None:
+        with sync_playwright() as playwright:
+            self.playwright = playwright
+            # launch the browser up front, so the first request doesn't have to pay for it
+            try:
+                self.launch_browser()
+            except Exception:
+                logger.exception("Failed to launch PDF browser, will try again on the next render")
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    # we've been asked to shut down
+                    break
+
+                html, future, timer = job
+                if not future.set_running_or_notify_cancel():
+                    # the request gave up waiting for this job
+                    continue
+                timer.stop("queue")
+
+                try:
+                    future.set_result(self.render(html, timer))
+                except Exception as err:
+                    future.set_exception(err)
+                    # we don't know what state the browser is in now, so throw it away
+                    self.close_browser()
+
+            self.close_browser()
+
+    def is_healthy(self) -> bool:
+        """Is the browser still connected, and do we have a usable page to render with?"""
+        return bool(self.browser and self.browser.is_connected() and self.page and not self.page.is_closed())
+
+    def launch_browser(self) -> None:
+        self.browser = self.playwright.chromium.launch(headless=True)
+        self.page = self.browser.new_page()
+        self.renders = 0
+        try:
+            self.cdp_session = self.page.context.new_cdp_session(self.page)
+            self.cdp_session.send("Performance.enable")
+        except Exception:
+            logger.warning("Failed to open a CDP session, browser memory won't be recorded", exc_info=True)
+            self.cdp_session = None
+
+    def get_browser_memory(self) -> int | None:
+        """Returns how much JS heap the page is using, in bytes."""
+        if not self.cdp_session:
+            return None
+        try:
+            metrics = self.cdp_session.send("Performance.getMetrics")["metrics"]
+        except Exception:
+            logger.warning("Failed to get browser memory metrics", exc_info=True)
+            return None
+        return next((int(metric["value"]) for metric in metrics if metric["name"] == "JSHeapUsedSize"), None)
+
+    def close_browser(self) -> None:
+        if self.browser:
+            try:
+                self.browser.close()
+            except Exception:
+                logger.exception("Failed to close PDF browser")
+        self.browser = None
+        self.page = None
+        self.cdp_session = None
+
+    def render(self, html: str, timer: PhaseTimer) -> RenderedPDF:
+        if self.renders >= self.max_renders or not self.is_healthy():
+            # recycle the browser, Chromium slowly leaks memory the longer it's kept alive
+            with timer.phase("launch"):
+                self.close_browser()
+                self.launch_browser()
+
+        with timer.phase("set_content"):
+            self.page.set_content(html)
+        with timer.phase("fonts"):
+            self.page.wait_for_function("document.fonts.ready.then(fonts => fonts.status === 'loaded')")
+        with timer.phase("pdf"):
+            pdf_data = self.page.pdf(format="A4", tagged=True, margin=PDF_MARGINS)
+        self.renders += 1
+        return RenderedPDF(data=pdf_data, timer=timer, browser_memory=self.get_browser_memory())
+
+
+class BrowserPool:
+    """A per-process pool of headless browsers that are reused across requests to render PDFs. The browsers are
+    launched when the pool is started, which gunicorn does as each worker boots (see start_browser_pool), otherwise
+    it's started by the first render.
+
+    Jobs wait in a bounded queue for a free browser; if the queue is full, or a job isn't picked up and rendered in
+    time, PDFRenderingUnavailable is raised rather than tying the request up indefinitely."""
+
+    def __init__(self, size: int, max_renders: int, queue_size: int) -> None:
+        self.size = size
+        self.max_renders = max_renders
+        self.jobs: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.workers: list[BrowserWorker] = []
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker threads, replacing any that have died."""
+        with self.lock:
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < self.size:
+                worker = BrowserWorker(self.jobs, max_renders=self.max_renders)
+                worker.start()
+                self.workers.append(worker)
+
+    def shutdown(self) -> None:
+        with self.lock:
+            for _ in self.workers:
+                try:
+                    self.jobs.put_nowait(None)
+                except queue.Full:
+                    break
+            self.workers = []
+
+    def render(self, html: str, timer: PhaseTimer | None = None) -> RenderedPDF:
+        self.start()
+
+        timer = timer or PhaseTimer()
+        future: Future = Future()
+        timer.start("queue")
+        try:
+            self.jobs.put((html, future, timer), timeout=settings.PDF_RENDER_QUEUE_TIMEOUT)
+        except queue.Full:
+            logger.warning("PDF render queue is full, rejecting the request")
+            raise PDFRenderingUnavailable()
+
+        try:
+            return future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning("Timed out waiting for a PDF to be rendered")
+            raise PDFRenderingUnavailable()
+
+
+def record_pdf_metrics(reference: str, timer: PhaseTimer, pdf_size: int, browser_memory: int | None = None) -> None:
+    """Reports how long each phase of producing a PDF took as a structured log, and as spans of the current Sentry
+    transaction. The browser phases ran in one of the pool's threads, so their spans are added after the fact."""
+    logger.info(
+        "Produced PDF for %s in %sms",
+        reference,
+        round(sum(timer.durations.values()), 2),
+        extra={
+            "pdf_reference": reference,
+            "pdf_timings_ms": timer.durations,
+            "pdf_size_bytes": pdf_size,
+            "pdf_browser_memory_bytes": browser_memory,
+        },
+    )
+
+    for name, (start, end) in timer.phases.items():
+        span = sentry_sdk.start_span(
+            op=f"pdf.{name}", name=f"PDF {name}", start_timestamp=datetime.fromtimestamp(start, tz=timezone.utc)
+        )
+        span.set_data("pdf.size_bytes", pdf_size)
+        if browser_memory is not None:
+            span.set_data("pdf.browser_memory_bytes", browser_memory)
+        span.finish(end_timestamp=datetime.fromtimestamp(end, tz=timezone.utc))
+
+
+_browser_pool: BrowserPool | None = None
+_browser_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Returns this process' browser pool, creating it the first time it's needed."""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool(
+                size=settings.PDF_BROWSER_POOL_SIZE,
+                max_renders=settings.PDF_BROWSER_MAX_RENDERS,
+                queue_size=settings.PDF_RENDER_QUEUE_SIZE,
+            )
+        return _browser_pool
+
+
+def start_browser_pool() -> None:
+    """Launches this process' browsers now, rather than when the first PDF is rendered. gunicorn calls this once a
+    worker has loaded the app, after it's been forked, as the browsers' threads wouldn't survive the fork."""
+    get_browser_pool().start()
+
+
+@atexit.register
+def shutdown_browser_pool() -> None:
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is not None:
+            _browser_pool.shutdown()
+            _browser_pool = None
+
+
+def render_pdf(html: str, timer: PhaseTimer | None = None) -> RenderedPDF:
+    """Render the given HTML as an A4 PDF using one of the pooled browsers, recording how long each phase took."""
+    return get_browser_pool().render(html, timer)
+
+
+def get_licence_pdf_cache_key(licence: Licence, template_name: str) -> str:
+    """Returns the key the PDF of this licence, rendered with this template, is cached under.
+
+    The key is derived from the licence's modified_at, so whenever the licence (or one of its organisations,
+    individuals or documents) changes, the cached PDF is no longer used. Bump PDF_TEMPLATE_VERSION to invalidate every
+    cached PDF when the templates change."""
+    digest = hashlib.sha256(
+        f"{licence.reference}:{licence.modified_at.isoformat()}:{template_name}:{settings.PDF_TEMPLATE_VERSION}".encode()
+    ).hexdigest()
+    return f"{PDF_CACHE_PREFIX}/{licence.reference}/{digest}.pdf"
+
+
+def get_cached_pdf(cache_key: str) -> bytes | None:
+    """Returns the cached PDF stored under this key, or None if there isn't one."""
+    if not settings.PDF_CACHE_ENABLED:
+        return None
+
+    storage = PermanentDocumentStorage()
+    s3_client = get_s3_client_from_storage(s3_storage=storage)
+    try:
+        response = s3_client.get_object(Bucket=storage.bucket_name, Key=cache_key)
+    except ClientError as err:
+        if err.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            logger.exception("Failed to retrieve cached PDF")
+        return None
+    except BotoCoreError:
+        logger.exception("Failed to retrieve cached PDF")
+        return None
+
+    return response["Body"].read()
+
+
+def cache_pdf(cache_key: str, pdf_data: bytes) -> bool:
+    """Stores a rendered PDF under this key, and removes any older versions of it. Returns whether it was stored."""
+    if not settings.PDF_CACHE_ENABLED:
+        return False
+
+    storage = PermanentDocumentStorage()
+    s3_client = get_s3_client_from_storage(s3_storage=storage)
+    try:
+        s3_client.put_object(Bucket=storage.bucket_name, Key=cache_key, Body=pdf_data, ContentType="application/pdf")
+        # the older versions can never be requested again, so don't keep them around
+        prefix = cache_key.rpartition("/")[0] + "/"
+        delete_cached_pdfs(prefix, exclude=cache_key)
+    except (BotoCoreError, ClientError):
+        # we can always render it again, failing to cache it shouldn't fail the request
+        logger.exception("Failed to cache PDF")
+        return False
+    return True
+
+
+def delete_cached_pdfs(prefix: str, exclude: str | None = None) -> None:
+    """Deletes all the cached PDFs whose key starts with the prefix."""
+    if not settings.PDF_CACHE_ENABLED:
+        return
+
+    storage = PermanentDocumentStorage()
+    s3_client = get_s3_client_from_storage(s3_storage=storage)
+    response = s3_client.list_objects_v2(Bucket=storage.bucket_name, Prefix=prefix)
+    delete_keys = [{"Key": content["Key"]} for content in response.get("Contents", []) if content["Key"] != exclude]
+    if delete_keys:
+        s3_client.delete_objects(Bucket=storage.bucket_name, Delete={"Objects": delete_keys})
+
+
+def get_pdf_generation_status(cache_key: str) -> str | None:
+    """Returns the status of the background generation of the PDF cached under this key, if there is one."""
+    return cache.get(f"pdf_generation_status:{cache_key}")
+
+
+def set_pdf_generation_status(cache_key: str, status: str) -> None:
+    cache.set(f"pdf_generation_status:{cache_key}", status, timeout=settings.PDF_GENERATION_STATUS_TIMEOUT)
+
+
+def wait_for_generated_pdf(cache_key: str) -> bool:
+    """If the PDF cached under this key is being generated in the background, wait a little while for it to finish.
+
+    Returns whether the PDF is now ready, if not the caller should fall back to rendering it itself."""
+    deadline = time.monotonic() + settings.PDF_GENERATION_WAIT
+    status = get_pdf_generation_status(cache_key)
+    while status in (PDFGenerationStatus.pending, PDFGenerationStatus.generating) and time.monotonic() < deadline:
+        time.sleep(PDF_GENERATION_POLL_INTERVAL)
+        status = get_pdf_generation_status(cache_key)
+    return status == PDFGenerationStatus.ready
+
+
+def render_licence_pdf(licence: Licence, template_name: str, header: str) -> bytes:
+    """Render the PDF of a licence with the given template, outside of a request."""
+    template_string = render_to_string(
+        template_name, context={"header": header, "reference": licence.reference, "licence": licence}
+    )
+    return render_pdf(mark_safe(template_string)).data
+
+
+def get_licence_pdf(licence: Licence, template_name: str, header: str) -> bytes:
+    """Returns the PDF of a licence from the cache, rendering and caching it if it isn't there yet."""
+    cache_key = get_licence_pdf_cache_key(licence, template_name)
+    if pdf_data := get_cached_pdf(cache_key):
+        return pdf_data
+
+    pdf_data = render_licence_pdf(licence, template_name, header)
+    cache_pdf(cache_key, pdf_data)
+    return pdf_data
+
+
+def schedule_licence_pdf_generation(reference: str, templates: dict[str, str]) -> None:
+    """Generate and cache the PDFs of a licence in the background, so they're ready by the time they're downloaded.
+
+    templates maps each template the licence should be rendered with to the header it's rendered with. This should be
+    called once the licence has been committed to the database, so the background thread can see it."""
+    if not settings.PDF_GENERATION_ENABLED or not settings.PDF_CACHE_ENABLED:
+        return
+
+    licence = Licence.objects.get(reference=reference)
+    for template_name in templates:
+        # mark them as pending straight away, so a download that comes in before the thread starts knows to wait
+        set_pdf_generation_status(get_licence_pdf_cache_key(licence, template_name), PDFGenerationStatus.pending)
+    run_in_background(generate_licence_pdfs, reference, templates)
+
+
+def generate_licence_pdfs(reference: str, templates: dict[str, str]) -> None:
+    """Renders and caches the PDFs of a licence, retrying each one with an exponential backoff if it fails."""
+    licence = Licence.objects.get(reference=reference)
+    for template_name, header in templates.items():
+        cache_key = get_licence_pdf_cache_key(licence, template_name)
+        set_pdf_generation_status(cache_key, PDFGenerationStatus.generating)
+
+        for attempt in range(1, settings.PDF_GENERATION_ATTEMPTS + 1):
+            try:
+                pdf_data = render_licence_pdf(licence, template_name, header)
+            except Exception:
+                logger.warning(
+                    "Attempt %s to generate the %s PDF for %s failed", attempt, template_name, reference, exc_info=True
+                )
+                if attempt < settings.PDF_GENERATION_ATTEMPTS:
+                    time.sleep(settings.PDF_GENERATION_RETRY_BACKOFF * 2 ** (attempt - 1))
+                continue
+
+            if cache_pdf(cache_key, pdf_data):
+                set_pdf_generation_status(cache_key, PDFGenerationStatus.ready)
+            else:
+                set_pdf_generation_status(cache_key, PDFGenerationStatus.failed)
+            break
+        else:
+            logger.error("Failed to generate the %s PDF for %s, it will be rendered when downloaded", template_name, reference)
+            set_pdf_generation_status(cache_key, PDFGenerationStatus.failed)
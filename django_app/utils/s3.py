@@ -1,3 +1,7 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Any, List
 
 from core.document_storage import PermanentDocumentStorage, TemporaryDocumentStorage
@@ -7,6 +11,8 @@ from django.core.cache import cache
 from django.urls import reverse
 from storages.backends.s3boto3 import S3Boto3Storage
 
+logger = logging.getLogger(__name__)
+
 
 def get_s3_client_from_storage(s3_storage: S3Boto3Storage) -> Any:
     """Get the S3 client object from the storage object."""
@@ -27,60 +33,185 @@ def generate_presigned_url(s3_storage: Any, s3_file_object: Any) -> str:
     return presigned_url
 
 
-def get_all_session_files(s3_storage: S3Boto3Storage, session: SessionBase) -> dict[str, dict[str, str]]:
-    """Gets all files that a user has uploaded in a session."""
+def generate_presigned_upload(s3_storage: S3Boto3Storage, object_key: str, max_size: int) -> dict[str, Any]:
+    """Generates a presigned POST, so the browser can upload a file straight to the bucket.
+
+    The file can only be uploaded to the given key, and S3 rejects it if it's larger than max_size bytes."""
     s3_client = get_s3_client_from_storage(s3_storage=s3_storage)
+    return s3_client.generate_presigned_post(
+        Bucket=s3_storage.bucket_name,
+        Key=object_key,
+        Fields={"Content-Disposition": "attachment"},
+        Conditions=[["content-length-range", 1, max_size], {"Content-Disposition": "attachment"}],
+        ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRY_SECONDS,
+    )
+
+
+def get_all_session_files(s3_storage: S3Boto3Storage, session: SessionBase, reconcile: bool = False) -> dict[str, dict[str, str]]:
+    """Gets all files that a user has uploaded in a session.
+
+    The files are read from the session's index of uploaded files. If reconcile is True, the index is first checked
+    against the files that are actually in S3, e.g. before the files are copied to the permanent bucket."""
     session_files = {}
     if not session.is_empty():
-        response = s3_client.list_objects_v2(Bucket=s3_storage.bucket.name, Prefix=session.session_key)
-
-        user_uploaded_files = get_user_uploaded_files(session)
-        for content in response.get("Contents", []):
-            key = content["Key"]
-            file_name = key.rpartition("/")[2]
+        if reconcile:
+            uploaded_files = reconcile_user_uploaded_files(s3_storage, session)
+        else:
+            uploaded_files = get_uploaded_files_index(s3_storage, session)
 
-            # checking that a file with this name was uploaded in the session
-            if file_name in user_uploaded_files:
-                session_files[key] = {
-                    "file_name": file_name,
-                    "url": reverse("download_document", kwargs={"file_name": file_name}),
-                }
+        for file_name, object_key in sorted(uploaded_files.items()):
+            session_files[object_key] = {
+                "file_name": file_name,
+                "url": reverse("download_document", kwargs={"file_name": file_name}),
+            }
 
     return session_files
 
 
 def delete_session_files(s3_storage: S3Boto3Storage, session: SessionBase) -> None:
+    """Deletes all the files uploaded in a session, along with its index of them."""
     s3_client = get_s3_client_from_storage(s3_storage=s3_storage)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    # a page has at most 1000 keys, the most that can be deleted in one request
+    for page in paginator.paginate(Bucket=s3_storage.bucket.name, Prefix=f"{session.session_key}/"):
+        if contents := page.get("Contents", []):
+            s3_client.delete_objects(
+                Bucket=s3_storage.bucket.name, Delete={"Objects": [{"Key": content["Key"]} for content in contents]}
+            )
+    cache.delete_many(
+        [get_uploaded_files_cache_key(session.session_key), get_uploaded_files_indexed_cache_key(session.session_key)]
+    )
+
+
+def get_uploaded_files_cache_key(session_key: str) -> str:
+    return f"uploaded_files:{session_key}"
 
-    response = s3_client.list_objects_v2(Bucket=s3_storage.bucket.name, Prefix=session.session_key)
-    delete_keys: dict[str, Any] = {"Objects": []}
-    delete_keys["Objects"] = [{"Key": k} for k in [obj["Key"] for obj in response.get("Contents", [])]]
-    s3_client.delete_objects(Bucket=s3_storage.bucket.name, Delete=delete_keys)
+
+def get_uploaded_files_indexed_cache_key(session_key: str) -> str:
+    return f"uploaded_files_indexed:{session_key}"
+
+
+def get_uploaded_files_index(s3_storage: S3Boto3Storage, session: SessionBase) -> dict[str, str]:
+    """Returns the session's index of uploaded files, of the file name to its object key in S3.
+
+    Sessions started before there was an index (or whose index has expired) have files in S3 that it doesn't know
+    about, so the first time a session's index is found to be empty it's rebuilt from the session's files in S3. It's
+    only rebuilt once, so a session without any files doesn't list the bucket on every request."""
+    uploaded_files = cache.hgetall(get_uploaded_files_cache_key(session.session_key))
+    if not uploaded_files and cache.add(get_uploaded_files_indexed_cache_key(session.session_key), True):
+        uploaded_files = reconcile_user_uploaded_files(s3_storage, session)
+    return uploaded_files
 
 
 def get_user_uploaded_files(session: SessionBase) -> List[str]:
     """Returns a list of file_names that a user has uploaded in a session.
 
-    Files are uploaded to the session's key in the cache, so we scan the entire redis cache for all keys that
-    start with the session key and return a list of the values."""
-    cache_keys = list(cache.iter_keys(f"{session.session_key}*"))
-    uploaded_files = [file_name for key, file_name in cache.get_many(cache_keys).items()]
-    return uploaded_files
+    Each session has an index of the files uploaded in it, a redis hash of the file name to its object key in S3,
+    so this is a single read of that one key."""
+    return list(get_uploaded_files_index(TemporaryDocumentStorage(), session))
+
+
+def add_user_uploaded_file(session: SessionBase, file_name: str) -> None:
+    """Adds a file to the session's index of uploaded files. The file is stored in S3 under the session's key, see
+    CustomFileUploadHandler."""
+    cache.hset(get_uploaded_files_cache_key(session.session_key), file_name, f"{session.session_key}/{file_name}")
 
 
-def store_document_in_permanent_bucket(object_key: str, licence_pk: str) -> str:
-    """Copy a specific document from the temporary storage to the permanent storage on s3."""
-    temporary_storage_bucket = TemporaryDocumentStorage()
-    permanent_storage_bucket = PermanentDocumentStorage()
+def remove_user_uploaded_file(session: SessionBase, file_name: str) -> None:
+    """Removes a file from the session's index of uploaded files."""
+    cache.hdel(get_uploaded_files_cache_key(session.session_key), file_name)
 
-    new_key = f"{licence_pk}/{object_key}"
-    permanent_storage_bucket.bucket.meta.client.copy(
+
+def reconcile_user_uploaded_files(s3_storage: S3Boto3Storage, session: SessionBase) -> dict[str, str]:
+    """Makes the session's index of uploaded files match the files that are actually in S3 under the session's key,
+    returning it. Files that are no longer in S3 are removed from the index, and files that are in S3 but not the index
+    (e.g. uploaded before there was an index) are added to it."""
+    s3_client = get_s3_client_from_storage(s3_storage=s3_storage)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    stored_files = {
+        file_name: content["Key"]
+        for page in paginator.paginate(Bucket=s3_storage.bucket.name, Prefix=f"{session.session_key}/")
+        for content in page.get("Contents", [])
+        if (file_name := content["Key"].rpartition("/")[2])
+    }
+
+    cache_key = get_uploaded_files_cache_key(session.session_key)
+    uploaded_files = cache.hgetall(cache_key)
+    if missing_files := [
+        file_name for file_name, object_key in uploaded_files.items() if stored_files.get(file_name) != object_key
+    ]:
+        logger.warning(f"Uploaded files are missing from S3 and have been removed from the session: {missing_files}")
+        cache.hdel(cache_key, *missing_files)
+    if unindexed_files := [file_name for file_name in stored_files if file_name not in uploaded_files]:
+        logger.info(f"Uploaded files in S3 have been added to the session's index: {unindexed_files}")
+        for file_name in unindexed_files:
+            cache.hset(cache_key, file_name, stored_files[file_name])
+
+    return stored_files
+
+
+def get_permanent_document_key(object_key: str, licence_pk: str) -> str:
+    """Returns the key a document from the temporary storage is stored under in the permanent storage."""
+    return f"{licence_pk}/{object_key}"
+
+
+def get_temporary_document_key(permanent_key: str, licence_pk: str) -> str:
+    """Returns the key a document in the permanent storage was uploaded to the temporary storage under."""
+    return permanent_key.removeprefix(f"{licence_pk}/")
+
+
+def store_document_in_permanent_bucket(object_key: str, licence_pk: str, s3_client: Any = None) -> str:
+    """Copy a specific document from the temporary storage to the permanent storage on s3.
+
+    The copy is done by S3 itself in a single request, so the document doesn't pass through this server. Documents are
+    at most 100MB, well within the 5GB limit of a single copy."""
+    if s3_client is None:
+        s3_client = get_s3_client_from_storage(PermanentDocumentStorage())
+
+    new_key = get_permanent_document_key(object_key, licence_pk)
+    s3_client.copy_object(
         CopySource={
             "Bucket": settings.TEMPORARY_S3_BUCKET_NAME,
             "Key": object_key,
         },
         Bucket=settings.PERMANENT_S3_BUCKET_NAME,
         Key=new_key,
-        SourceClient=temporary_storage_bucket.bucket.meta.client,
     )
     return new_key
+
+
+@dataclass
+class DocumentCopy:
+    """The outcome of copying a document to the permanent storage."""
+
+    object_key: str
+    new_key: str
+    duration: float  # in milliseconds
+    error: Exception | None = None
+
+
+def store_documents_in_permanent_bucket(object_keys: list[str], licence_pk: str) -> list[DocumentCopy]:
+    """Copy the documents from the temporary storage to the permanent storage on s3, a few at a time.
+
+    A failed copy doesn't stop the others, the outcome of each is returned so the caller can decide what to do."""
+    if not object_keys:
+        return []
+
+    # boto3 clients are thread-safe, so the copies can share one (and its connection pool)
+    s3_client = get_s3_client_from_storage(PermanentDocumentStorage())
+
+    def copy_document(object_key: str) -> DocumentCopy:
+        start = time.perf_counter()
+        new_key = get_permanent_document_key(object_key, licence_pk)
+        error = None
+        try:
+            store_document_in_permanent_bucket(object_key, licence_pk, s3_client)
+        except Exception as e:
+            # anything going wrong with one copy, not just an S3 error, leaves that document for store_pending_documents
+            # to try again rather than losing the others
+            error = e
+        return DocumentCopy(object_key, new_key, round((time.perf_counter() - start) * 1000, 2), error)
+
+    max_workers = min(settings.DOCUMENT_COPY_WORKERS, len(object_keys))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="document-copy") as executor:
+        return list(executor.map(copy_document, object_keys))
@@ -1,3 +1,5 @@
+import logging
+from datetime import timedelta
 from typing import Any
 
 from apply_for_a_licence import choices
@@ -13,8 +15,18 @@ from apply_for_a_licence.models import (
 from core.document_storage import TemporaryDocumentStorage
 from django.conf import settings
 from django.http import HttpRequest
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
 
-from .s3 import get_all_session_files, store_document_in_permanent_bucket
+from .s3 import (
+    DocumentCopy,
+    get_all_session_files,
+    get_permanent_document_key,
+    get_temporary_document_key,
+    store_documents_in_permanent_bucket,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class SaveToDB:
@@ -32,6 +44,8 @@ class SaveToDB:
         self.is_individual = is_individual
         self.is_third_party = is_third_party
         self.is_on_companies_house = is_on_companies_house
+        # the documents saved with the application, by their key in the temporary bucket
+        self.documents: dict[str, Document] = {}
 
     def _get_user_verification(self) -> UserEmailVerification:
         user_email_verification = UserEmailVerification.objects.filter(user_session=self.request.session.session_key).latest(
@@ -84,8 +98,8 @@ class SaveToDB:
         return licence
 
     def save_individuals(self) -> None:
-        for _, individual in self.request.session.get("individuals", {}).items():
-            Individual.objects.create(
+        individuals = [
+            Individual(
                 licence=self.licence_object,
                 first_name=individual["name_data"]["cleaned_data"]["first_name"],
                 last_name=individual["name_data"]["cleaned_data"]["last_name"],
@@ -98,91 +112,207 @@ class SaveToDB:
                 country=individual["address_data"]["cleaned_data"]["country"],
                 town_or_city=individual["address_data"]["cleaned_data"]["town_or_city"],
             )
+            for _, individual in self.request.session.get("individuals", {}).items()
+        ]
 
         if self.data["start"]["who_do_you_want_the_licence_to_cover"] == choices.WhoDoYouWantTheLicenceToCoverChoices.myself:
             # creating the additional individual (for the applicant)
-            Individual.objects.create(
-                licence=self.licence_object,
-                first_name=self.data["add_yourself"]["first_name"],
-                last_name=self.data["add_yourself"]["last_name"],
-                nationality_and_location=self.data["add_yourself"]["nationality_and_location"],
-                address_line_1=self.data["add_yourself_address"]["address_line_1"],
-                address_line_2=self.data["add_yourself_address"].get("address_line_2"),
-                address_line_3=self.data["add_yourself_address"].get("address_line_3"),
-                address_line_4=self.data["add_yourself_address"].get("address_line_4"),
-                postcode=self.data["add_yourself_address"].get("postcode"),
-                country=self.data["add_yourself_address"]["country"],
-                town_or_city=self.data["add_yourself_address"].get("town_or_city"),
+            individuals.append(
+                Individual(
+                    licence=self.licence_object,
+                    first_name=self.data["add_yourself"]["first_name"],
+                    last_name=self.data["add_yourself"]["last_name"],
+                    nationality_and_location=self.data["add_yourself"]["nationality_and_location"],
+                    address_line_1=self.data["add_yourself_address"]["address_line_1"],
+                    address_line_2=self.data["add_yourself_address"].get("address_line_2"),
+                    address_line_3=self.data["add_yourself_address"].get("address_line_3"),
+                    address_line_4=self.data["add_yourself_address"].get("address_line_4"),
+                    postcode=self.data["add_yourself_address"].get("postcode"),
+                    country=self.data["add_yourself_address"]["country"],
+                    town_or_city=self.data["add_yourself_address"].get("town_or_city"),
+                )
             )
 
+        self._bulk_create(individuals, Individual)
+
     def save_business(self) -> None:
         # named individuals employment details
         if self.is_individual:
-            Organisation.objects.create(
-                licence=self.licence_object,
-                name=self.data["business_employing_individual"]["name"],
-                do_you_know_the_registered_company_number="No",
-                address_line_1=self.data["business_employing_individual"]["address_line_1"],
-                address_line_2=self.data["business_employing_individual"].get("address_line_2"),
-                address_line_3=self.data["business_employing_individual"].get("address_line_3"),
-                address_line_4=self.data["business_employing_individual"].get("address_line_4"),
-                town_or_city=self.data["business_employing_individual"]["town_or_city"],
-                country=self.data["business_employing_individual"]["country"],
-                type_of_relationship=TypeOfRelationshipChoices.named_individuals,
-            )
+            organisations = [
+                Organisation(
+                    licence=self.licence_object,
+                    name=self.data["business_employing_individual"]["name"],
+                    do_you_know_the_registered_company_number="No",
+                    address_line_1=self.data["business_employing_individual"]["address_line_1"],
+                    address_line_2=self.data["business_employing_individual"].get("address_line_2"),
+                    address_line_3=self.data["business_employing_individual"].get("address_line_3"),
+                    address_line_4=self.data["business_employing_individual"].get("address_line_4"),
+                    town_or_city=self.data["business_employing_individual"]["town_or_city"],
+                    country=self.data["business_employing_individual"]["country"],
+                    type_of_relationship=TypeOfRelationshipChoices.named_individuals,
+                )
+            ]
 
         # business journey company details
         else:
+            organisations = []
             for _, business in self.request.session["businesses"].items():
                 if business["cleaned_data"].get("companies_house"):
-                    Organisation.objects.create(
-                        licence=self.licence_object,
-                        name=business["cleaned_data"]["name"],
-                        do_you_know_the_registered_company_number=choices.YesNoChoices.yes,
-                        registered_company_number=business["cleaned_data"]["company_number"],
-                        registered_office_address=business["cleaned_data"]["readable_address"],
-                        type_of_relationship=TypeOfRelationshipChoices.business,
+                    organisations.append(
+                        Organisation(
+                            licence=self.licence_object,
+                            name=business["cleaned_data"]["name"],
+                            do_you_know_the_registered_company_number=choices.YesNoChoices.yes,
+                            registered_company_number=business["cleaned_data"]["company_number"],
+                            registered_office_address=business["cleaned_data"]["readable_address"],
+                            type_of_relationship=TypeOfRelationshipChoices.business,
+                        )
                     )
                 else:
-                    Organisation.objects.create(
-                        licence=self.licence_object,
-                        do_you_know_the_registered_company_number=choices.YesNoChoices.no,
-                        name=business["cleaned_data"]["name"],
-                        address_line_1=business["cleaned_data"]["address_line_1"],
-                        address_line_2=business["cleaned_data"].get("address_line_2"),
-                        address_line_3=business["cleaned_data"].get("address_line_3"),
-                        address_line_4=business["cleaned_data"].get("address_line_4"),
-                        town_or_city=business["cleaned_data"]["town_or_city"],
-                        country=business["cleaned_data"]["country"],
-                        type_of_relationship=choices.TypeOfRelationshipChoices.business,
+                    organisations.append(
+                        Organisation(
+                            licence=self.licence_object,
+                            do_you_know_the_registered_company_number=choices.YesNoChoices.no,
+                            name=business["cleaned_data"]["name"],
+                            address_line_1=business["cleaned_data"]["address_line_1"],
+                            address_line_2=business["cleaned_data"].get("address_line_2"),
+                            address_line_3=business["cleaned_data"].get("address_line_3"),
+                            address_line_4=business["cleaned_data"].get("address_line_4"),
+                            town_or_city=business["cleaned_data"]["town_or_city"],
+                            country=business["cleaned_data"]["country"],
+                            type_of_relationship=choices.TypeOfRelationshipChoices.business,
+                        )
                     )
 
+        self._bulk_create(organisations, Organisation)
+
     def save_recipient(self) -> None:
+        recipients = []
         for _, recipient in self.request.session["recipients"].items():
             cl = recipient["cleaned_data"]
-            Organisation.objects.create(
-                licence=self.licence_object,
-                name=cl["name"],
-                website=cl.get("website"),
-                email=cl.get("email"),
-                additional_contact_details=cl.get("additional_contact_details"),
-                address_line_1=cl["address_line_1"],
-                address_line_2=cl.get("address_line_2"),
-                address_line_3=cl.get("address_line_3"),
-                address_line_4=cl.get("address_line_4"),
-                postcode=cl.get("postcode"),
-                country=cl["country"],
-                town_or_city=cl.get("town_or_city"),
-                type_of_relationship=TypeOfRelationshipChoices.recipient,
-                relationship_provider=recipient["relationship"],
+            recipients.append(
+                Organisation(
+                    licence=self.licence_object,
+                    name=cl["name"],
+                    website=cl.get("website"),
+                    email=cl.get("email"),
+                    additional_contact_details=cl.get("additional_contact_details"),
+                    address_line_1=cl["address_line_1"],
+                    address_line_2=cl.get("address_line_2"),
+                    address_line_3=cl.get("address_line_3"),
+                    address_line_4=cl.get("address_line_4"),
+                    postcode=cl.get("postcode"),
+                    country=cl["country"],
+                    town_or_city=cl.get("town_or_city"),
+                    type_of_relationship=TypeOfRelationshipChoices.recipient,
+                    relationship_provider=recipient["relationship"],
+                )
             )
 
+        self._bulk_create(recipients, Organisation)
+
     def save_documents(self) -> None:
-        documents = get_all_session_files(TemporaryDocumentStorage(), self.request.session)
-        for key, _ in documents.items():
-            new_key = store_document_in_permanent_bucket(object_key=key, licence_pk=self.licence_object.pk)
+        """Adds the uploaded documents to the application. The files themselves are copied to the permanent bucket by
+        promote_documents, once the application has been committed."""
+        documents = get_all_session_files(TemporaryDocumentStorage(), self.request.session, reconcile=True)
+        self.documents = dict(
+            zip(
+                documents,
+                self._bulk_create(
+                    [
+                        Document(
+                            licence=self.licence_object,
+                            file=get_permanent_document_key(object_key=key, licence_pk=self.licence_object.pk),
+                            storage_status=choices.DocumentStorageStatusChoices.pending,
+                        )
+                        for key in documents
+                    ],
+                    Document,
+                ),
+            )
+        )
 
-            Document.objects.create(
-                licence=self.licence_object,
-                file=new_key,
+    @staticmethod
+    def _bulk_create(objects: list[Any], model: Any) -> list[Any]:
+        """Creates the objects, along with their historical records, in one INSERT for each, rather than one for every
+        object. No post_save signals are sent, so touch_licence doesn't update the licence's search vector, and the
+        caller needs to call update_search_vector() once everything has been saved."""
+        if not objects:
+            return []
+        return bulk_create_with_history(objects, model)
+
+    def promote_documents(self) -> None:
+        """Copies the uploaded documents to the permanent bucket.
+
+        This is done outside the transaction the application is saved in, so the database connection isn't held while
+        S3 copies the files. A document that can't be copied is left pending, for the store_pending_documents command
+        to try again."""
+        if not self.documents:
+            return
+
+        copies = store_documents_in_permanent_bucket(list(self.documents), self.licence_object.pk)
+        logger.info(
+            "Copied %s documents of application %s to permanent storage",
+            len(copies),
+            self.licence_object.reference,
+            extra={"document_copy_timings_ms": {copy.new_key: copy.duration for copy in copies}},
+        )
+        record_document_copies({copy.object_key: self.documents[copy.object_key] for copy in copies}, copies)
+
+
+def store_pending_documents(batch_size: int = 50) -> int:
+    """Tries again to copy the documents that haven't been copied to the permanent bucket, returning how many were
+    tried. A document is only retried once it's been waiting DOCUMENT_COPY_RETRY_DELAY_SECONDS, so the copy made when
+    the application was submitted has had time to finish. Copying a document is idempotent, so it doesn't matter if two
+    workers try the same one."""
+    documents = list(
+        Document.objects.filter(
+            storage_status=choices.DocumentStorageStatusChoices.pending,
+            created_at__lte=timezone.now() - timedelta(seconds=settings.DOCUMENT_COPY_RETRY_DELAY_SECONDS),
+        )
+        .select_related("licence")
+        .order_by("created_at", "pk")[:batch_size]
+    )
+    documents_by_licence: dict[Any, list[Document]] = {}
+    for document in documents:
+        documents_by_licence.setdefault(document.licence, []).append(document)
+
+    for licence, licence_documents in documents_by_licence.items():
+        documents_by_key = {
+            get_temporary_document_key(document.file.name, licence.pk): document for document in licence_documents
+        }
+        copies = store_documents_in_permanent_bucket(list(documents_by_key), licence.pk)
+        record_document_copies(documents_by_key, copies)
+    return len(documents)
+
+
+def record_document_copies(documents: dict[str, Document], copies: list[DocumentCopy]) -> None:
+    """Records the outcome of copying each of the documents, by their key in the temporary storage. A document that
+    couldn't be copied is left pending to be tried again, unless it's been tried DOCUMENT_COPY_MAX_ATTEMPTS times, in
+    which case it's marked as failed, so caseworkers can see it's missing."""
+    for copy in copies:
+        document = documents[copy.object_key]
+        document.copy_attempts += 1
+        if copy.error is None:
+            document.storage_status = choices.DocumentStorageStatusChoices.stored
+            document.last_copy_error = ""
+            continue
+
+        document.last_copy_error = str(copy.error)
+        if document.copy_attempts >= settings.DOCUMENT_COPY_MAX_ATTEMPTS:
+            document.storage_status = choices.DocumentStorageStatusChoices.failed
+            logger.error(
+                f"Giving up on copying document {copy.object_key} of application {document.licence.reference} to "
+                f"permanent storage after {document.copy_attempts} attempts",
+                exc_info=copy.error,
+            )
+        else:
+            logger.warning(
+                f"Failed to copy document {copy.object_key} of application {document.licence.reference} to permanent "
+                f"storage, it will be tried again",
+                exc_info=copy.error,
             )
+    # post_save isn't sent, so the licence isn't touched and no historical records are made
+    Document.objects.bulk_update(
+        [documents[copy.object_key] for copy in copies], ["storage_status", "copy_attempts", "last_copy_error"]
+    )
@@ -0,0 +1,55 @@
+import logging
+import zipfile
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# added to the archive next to a file that couldn't be read in full, so it's clear the file is incomplete
+FAILED_FILE_CONTENT = b"This file could not be read in full, so the copy of it in this archive is incomplete."
+
+
+class ZipStreamBuffer:
+    """A write-only, unseekable file that ZipFile writes into, and that the written bytes are popped off as they're
+    produced. As it can't be seeked, ZipFile writes the sizes and checksums after each file instead of going back."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files: Iterable[tuple[str, Iterable[bytes]]]) -> Iterator[bytes]:
+    """Writes the given (name, chunks) files to a ZIP archive, yielding the archive's bytes as they're written so it
+    never has to be held in memory as a whole.
+
+    The start of a file has already been sent by the time it fails to be read (e.g. S3 goes away part way through
+    it), so it can't be taken back out. Instead, the file is ended there and a note that it's incomplete is added,
+    and the rest of the archive is written as normal so it can still be opened."""
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, chunks in files:
+            failed = False
+            # we don't know how big the file is up front, so always allow for it being over 2GB
+            with zip_file.open(name, mode="w", force_zip64=True) as zip_entry:
+                try:
+                    for chunk in chunks:
+                        zip_entry.write(chunk)
+                        if data := buffer.pop():
+                            yield data
+                except Exception:
+                    logger.exception("Failed to read %s while adding it to a ZIP", name)
+                    failed = True
+            if failed:
+                zip_file.writestr(f"{name}.failed.txt", FAILED_FILE_CONTENT)
+            yield buffer.pop()
+    yield buffer.pop()
@@ -2,31 +2,42 @@ from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, reverse
-from utils.notifier import send_email
+from utils.notifier import queue_emails
 from view_a_licence.utils import craft_view_a_licence_url
 
 
+def get_pending_user_alert_cache_key(user_pk: int) -> str:
+    return f"pending_user_alert:{user_pk}"
+
+
 class ActiveUserRequiredMixin:
     def dispatch(self, request: HttpRequest, **kwargs: object) -> HttpResponse:
         if not request.user.is_active:
-            admin_url = craft_view_a_licence_url(reverse("view_a_licence:manage_users") + "#pending")
-            user_login_datetime = f"{datetime.now():%Y-%m-%d %H:%M:%S%z}"
-            for user in User.objects.filter(is_staff=True):
-                send_email(
-                    email=user.email,
-                    template_id=settings.NEW_OTSI_USER_TEMPLATE_ID,
-                    context={
-                        "user_email": request.user.email,
-                        "user_login_datetime": user_login_datetime,
-                        "admin_url": admin_url,
-                    },
-                )
+            self.alert_staff(request.user)
             return render(request, "view_a_licence/unauthorised.html", status=401)
 
         return super().dispatch(request, **kwargs)  # type: ignore[misc]
 
+    def alert_staff(self, user: User) -> None:
+        """Lets the staff know the user is waiting to be accepted. They're only told once every
+        PENDING_USER_ALERT_INTERVAL_SECONDS, however many times the user tries, and the emails are sent from the outbox
+        rather than while the user waits."""
+        if not cache.add(get_pending_user_alert_cache_key(user.pk), True, timeout=settings.PENDING_USER_ALERT_INTERVAL_SECONDS):
+            return
+
+        queue_emails(
+            list(User.objects.filter(is_staff=True).values_list("email", flat=True)),
+            template_id=settings.NEW_OTSI_USER_TEMPLATE_ID,
+            context={
+                "user_email": user.email,
+                "user_login_datetime": f"{datetime.now():%Y-%m-%d %H:%M:%S%z}",
+                "admin_url": craft_view_a_licence_url(reverse("view_a_licence:manage_users") + "#pending"),
+            },
+        )
+
 
 class StaffUserOnlyMixin(ActiveUserRequiredMixin):
     def dispatch(self, request: HttpRequest, **kwargs: object) -> HttpResponse:
@@ -0,0 +1,165 @@
+import dataclasses
+import hashlib
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from apply_for_a_licence import choices
+from apply_for_a_licence.models import Licence
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, Func, QuerySet
+from django.http import HttpRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+# the fields the list of applications can be filtered on, and what they're labelled as
+FACETS = {
+    "regimes": "Sanctions regime",
+    "type_of_service": "Services being provided",
+    "who_do_you_want_the_licence_to_cover": "Who the licence covers",
+}
+
+FACET_COUNTS_CACHE_KEY_PREFIX = "licence_facet_counts"
+
+# the labels of the values of the facets that have choices, by facet
+FACET_CHOICES = {
+    "type_of_service": dict(choices.TypeOfServicesChoices.choices),
+    "who_do_you_want_the_licence_to_cover": dict(choices.WhoDoYouWantTheLicenceToCoverChoices.choices),
+}
+
+
+def get_start_of_day(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_created_between(queryset: QuerySet, date_min: date | None, date_max: date | None) -> QuerySet:
+    """Returns the objects in the queryset created on or between the days. The days are turned into a range of times,
+    rather than comparing the day each object was created on, so the index on created_at can be used."""
+    if date_min:
+        queryset = queryset.filter(created_at__gte=get_start_of_day(date_min))
+    if date_max:
+        queryset = queryset.filter(created_at__lt=get_start_of_day(date_max + timedelta(days=1)))
+    return queryset
+
+
+@dataclasses.dataclass
+class FacetOption:
+    value: str
+    label: str
+    count: int
+    selected: bool
+
+
+@dataclasses.dataclass
+class Facet:
+    name: str
+    label: str
+    options: list[FacetOption]
+
+
+@dataclasses.dataclass
+class LicenceSearch:
+    """What a caseworker is searching the list of applications for: the text to search for, the values of each facet
+    to filter on, and the dates they were submitted between."""
+
+    query: str = ""
+    filters: dict[str, list[str]] = dataclasses.field(default_factory=dict)
+    date_min: date | None = None
+    date_max: date | None = None
+
+    @classmethod
+    def from_request(cls, request: HttpRequest) -> "LicenceSearch":
+        def get_date(name: str) -> date | None:
+            try:
+                return parse_date(request.GET.get(name, ""))
+            except ValueError:
+                return None
+
+        return cls(
+            query=request.GET.get("q", "").strip(),
+            filters={name: values for name in FACETS if (values := request.GET.getlist(name))},
+            date_min=get_date("date_min"),
+            date_max=get_date("date_max"),
+        )
+
+    def filter(self, queryset: "QuerySet[Licence]", exclude_facet: str | None = None) -> "QuerySet[Licence]":
+        """Returns the licences that match the search. The filter on exclude_facet isn't applied, so the number of
+        licences with each of its values can be counted."""
+        if self.query:
+            # names and references are indexed as they're written, everything else is stemmed
+            queryset = queryset.filter(
+                search_vector=SearchQuery(self.query, config="simple", search_type="websearch")
+                | SearchQuery(self.query, config="english", search_type="websearch")
+            )
+        for name, values in self.filters.items():
+            if name == exclude_facet:
+                continue
+            if name == "regimes":
+                queryset = queryset.filter(regimes__overlap=values)
+            else:
+                queryset = queryset.filter(**{f"{name}__in": values})
+        return filter_created_between(queryset, self.date_min, self.date_max)
+
+    def get_facets(self) -> list[Facet]:
+        """Returns the values of each facet that the licences matching the rest of the search have, with how many of
+        them have each value."""
+        facets = []
+        for name, label in FACETS.items():
+            counts = self.get_facet_counts(name)
+            selected = self.filters.get(name, [])
+            facets.append(
+                Facet(
+                    name=name,
+                    label=label,
+                    options=[
+                        FacetOption(
+                            value=value,
+                            label=FACET_CHOICES.get(name, {}).get(value, value),
+                            count=counts.get(value, 0),
+                            selected=value in selected,
+                        )
+                        # the selected values are kept, even if nothing matches them, so they can be deselected
+                        for value in sorted(set(counts) | set(selected))
+                    ],
+                )
+            )
+        return facets
+
+    def filters_other_than(self, facet: str) -> bool:
+        """Does the search filter the licences by anything other than the facet?"""
+        return bool(self.query or self.date_min or self.date_max or any(name != facet for name in self.filters))
+
+    def get_facet_counts(self, facet: str) -> dict[Any, int]:
+        """Returns how many of the licences matching the rest of the search have each value of the facet.
+
+        Counting them means grouping every matching licence, so the counts are cached for a short while, by what's
+        being searched for. If nothing else is being searched for, the counts are those of all the licences, which are
+        shared by every search that only filters on this facet (including no search at all)."""
+        search = self if self.filters_other_than(facet) else LicenceSearch()
+        cache_key = search.get_facet_counts_cache_key(facet)
+        counts = cache.get(cache_key)
+        if counts is None:
+            counts = search.count_facet(facet)
+            cache.set(cache_key, counts, timeout=settings.LICENCE_FACETS_CACHE_SECONDS)
+        return counts
+
+    def get_facet_counts_cache_key(self, facet: str) -> str:
+        search = {
+            "query": self.query,
+            "filters": {name: sorted(values) for name, values in self.filters.items() if name != facet},
+            "date_min": self.date_min.isoformat() if self.date_min else None,
+            "date_max": self.date_max.isoformat() if self.date_max else None,
+        }
+        search_hash = hashlib.sha256(json.dumps(search, sort_keys=True).encode()).hexdigest()
+        return f"{FACET_COUNTS_CACHE_KEY_PREFIX}:{facet}:{search_hash}"
+
+    def count_facet(self, facet: str) -> dict[Any, int]:
+        licences = self.filter(Licence.objects.all(), exclude_facet=facet).order_by()
+        if facet == "regimes":
+            # a licence can be for more than one regime, so it's counted under each of them
+            licences = licences.annotate(value=Func(F("regimes"), function="unnest", output_field=CharField()))
+        else:
+            licences = licences.annotate(value=F(facet))
+        return {row["value"]: row["count"] for row in licences.values("value").annotate(count=Count("pk")) if row["value"]}
@@ -12,4 +12,5 @@ urlpatterns = [
     path("view-all-feedback/", views.ViewAllFeedbackView.as_view(), name="view_all_feedback"),
     path("view-feedback/<int:pk>", views.ViewFeedbackView.as_view(), name="view_feedback"),
     path("download-application/", views.DownloadPDFView.as_view(), name="download_application"),
+    path("download-applications/", views.BulkExportView.as_view(), name="bulk_export"),
 ]
@@ -1,4 +1,24 @@
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Iterable, Iterator
+
+from apply_for_a_licence.models import Licence
+from core.document_storage import PermanentDocumentStorage
 from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from utils.background import closing_db_connections
+from utils.pdf import get_licence_pdf
+from utils.s3 import get_s3_client_from_storage
+
+logger = logging.getLogger(__name__)
+
+# documents are streamed into a bulk export in chunks of this many bytes
+BULK_EXPORT_CHUNK_SIZE = 1024 * 1024
 
 
 def craft_view_a_licence_url(path: str) -> str:
@@ -8,3 +28,114 @@ def craft_view_a_licence_url(path: str) -> str:
 
 def get_view_a_licence_application_url(reference: str) -> str:
     return craft_view_a_licence_url(f"/view/view-application/{reference}/")
+
+
+def encode_licence_cursor(licence: Licence) -> str:
+    """Returns a cursor pointing at the licence, for paging through a list of licences."""
+    return urlsafe_base64_encode(f"{licence.created_at.isoformat()}|{licence.pk}".encode())
+
+
+def decode_licence_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """Returns the created_at and pk of the licence a cursor points at, or None if the cursor isn't valid."""
+    if not cursor:
+        return None
+    try:
+        created_at, pk = force_str(urlsafe_base64_decode(cursor)).split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_licences_page(
+    queryset: "QuerySet[Licence]",
+    page_size: int,
+    newest_first: bool = True,
+    after: str | None = None,
+    before: str | None = None,
+) -> tuple[list[Licence], str | None, str | None]:
+    """Returns a page of the licences, in the order they were created, along with the cursors of the previous and next
+    pages (or None if there isn't one).
+
+    The page is found by filtering on the created_at and pk of the licence next to it, rather than by an offset, so it
+    costs the same to fetch any page, and pages don't shift as new licences come in."""
+    ordering = ["-created_at", "-pk"] if newest_first else ["created_at", "pk"]
+
+    def follows(cursor: tuple[datetime, int], descending: bool) -> Q:
+        created_at, pk = cursor
+        if descending:
+            return Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        return Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+
+    if before_cursor := decode_licence_cursor(before):
+        # read backwards from the cursor, then put the page back in order
+        reversed_ordering = [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+        queryset = queryset.filter(follows(before_cursor, descending=not newest_first)).order_by(*reversed_ordering)
+        licences = list(queryset[: page_size + 1])
+        has_previous_page = len(licences) > page_size
+        licences = licences[:page_size][::-1]
+        has_next_page = bool(licences)
+    else:
+        if after_cursor := decode_licence_cursor(after):
+            queryset = queryset.filter(follows(after_cursor, descending=newest_first))
+        licences = list(queryset.order_by(*ordering)[: page_size + 1])
+        has_next_page = len(licences) > page_size
+        licences = licences[:page_size]
+        has_previous_page = bool(after_cursor and licences)
+
+    previous_cursor = encode_licence_cursor(licences[0]) if has_previous_page else None
+    next_cursor = encode_licence_cursor(licences[-1]) if has_next_page else None
+    return licences, previous_cursor, next_cursor
+
+
+def get_bulk_export_files(licences: Iterable[Licence], template_name: str, header: str) -> Iterator[tuple[str, Iterable[bytes]]]:
+    """Yields the name and content of every file in a bulk export of the licences: the PDF of each application and
+    the documents uploaded with it.
+
+    The files are rendered or fetched by a pool of threads, at most BULK_EXPORT_WORKERS of them at a time and in the
+    order they're yielded, so only a bounded number of files are in memory at once. Documents are streamed from S3."""
+    storage = PermanentDocumentStorage()
+
+    def get_files() -> Iterator[tuple[str, Callable[[], Iterable[bytes]]]]:
+        for licence in licences:
+            yield f"{licence.reference}/application-{licence.reference}.pdf", partial(
+                get_licence_pdf_chunks, licence, template_name, header
+            )
+            for document in licence.documents.all():
+                # it's not in the permanent bucket (yet)
+                if not document.is_stored:
+                    continue
+                yield f"{licence.reference}/documents/{document.file_name()}", partial(
+                    get_document_chunks, storage, document.file.name
+                )
+
+    executor = ThreadPoolExecutor(max_workers=settings.BULK_EXPORT_WORKERS, thread_name_prefix="bulk-export")
+    pending: deque[tuple[str, Future]] = deque()
+    try:
+        for name, fetch_file in get_files():
+            pending.append((name, executor.submit(closing_db_connections(fetch_file))))
+            if len(pending) >= settings.BULK_EXPORT_WORKERS:
+                yield get_export_file(*pending.popleft())
+        while pending:
+            yield get_export_file(*pending.popleft())
+    finally:
+        # if the download was cancelled, don't carry on fetching files that nobody wants
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_export_file(name: str, future: Future) -> tuple[str, Iterable[bytes]]:
+    try:
+        return name, future.result()
+    except Exception:
+        # one file failing shouldn't lose the caseworker the whole export, tell them which one is missing instead
+        logger.exception("Failed to export %s", name)
+        return f"{name}.failed.txt", [b"This file could not be exported, please download it from the application."]
+
+
+def get_licence_pdf_chunks(licence: Licence, template_name: str, header: str) -> list[bytes]:
+    return [get_licence_pdf(licence, template_name, header)]
+
+
+def get_document_chunks(storage: PermanentDocumentStorage, key: str) -> Iterator[bytes]:
+    s3_client = get_s3_client_from_storage(s3_storage=storage)
+    response = s3_client.get_object(Bucket=storage.bucket_name, Key=key)
+    return response["Body"].iter_chunks(chunk_size=BULK_EXPORT_CHUNK_SIZE)
@@ -9,16 +9,32 @@ from apply_for_a_licence.models import Licence
 from authentication.mixins import LoginRequiredMixin
 from core.sites import require_view_a_licence
 from core.views.base_views import BaseDownloadPDFView
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.shortcuts import reverse
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
-from django.views.generic import DetailView, ListView, RedirectView, TemplateView
+from django.utils.functional import cached_property
+from django.views.generic import DetailView, ListView, RedirectView, TemplateView, View
 from feedback.models import FeedbackItem
+from utils.background import iterate_in_thread
+from utils.pdf import get_licence_pdf_cache_key
+from utils.zip import stream_zip
 
 from .mixins import ActiveUserRequiredMixin, StaffUserOnlyMixin
+from .search import LicenceSearch, filter_created_between
+from .utils import get_bulk_export_files, get_licences_page
 
 logger = logging.getLogger(__name__)
 
@@ -40,22 +56,41 @@ class ApplicationListView(LoginRequiredMixin, ActiveUserRequiredMixin, ListView)
     template_name = "view_a_licence/application_list.html"
     success_url = reverse_lazy("view_a_licence:application_list")
     model = Licence
-    ordering = ["-created_at"]
+    context_object_name = "licence_list"
+    page_size = 50
 
     def get(self, request: HttpRequest, **kwargs) -> HttpResponse:
         self.request.session["sort"] = request.GET.get("sort_by", "newest")
+        self.search = LicenceSearch.from_request(request)
         return super().get(request, **kwargs)
 
     def get_queryset(self) -> "QuerySet[Licence]":
-        queryset = super().get_queryset()
-        sort = self.request.session.get("sort", "newest")
-        if sort == "oldest":
-            queryset = reversed(queryset)
-        return queryset
+        queryset = self.search.filter(super().get_queryset())
+        # everything the list shows for each licence is fetched for the whole page at once
+        return queryset.prefetch_related("organisations", "individuals", "documents")
 
     def get_context_data(self, **kwargs: object) -> dict[str, Any]:
-        context = super().get_context_data(**kwargs)
-        context["selected_sort"] = self.request.session.pop("sort", "newest")
+        sort = self.request.session.pop("sort", "newest")
+        licences, previous_cursor, next_cursor = get_licences_page(
+            self.object_list,
+            self.page_size,
+            newest_first=sort != "oldest",
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+        )
+        context = super().get_context_data(object_list=licences, **kwargs)
+        context["selected_sort"] = sort
+        context["previous_cursor"] = previous_cursor
+        context["next_cursor"] = next_cursor
+        context["search"] = self.search
+        context["facets"] = self.search.get_facets()
+
+        # the pages before and after this one are of the same search
+        search_parameters = self.request.GET.copy()
+        for parameter in ("after", "before", "csrfmiddlewaretoken"):
+            search_parameters.pop(parameter, None)
+        search_parameters["sort_by"] = sort
+        context["search_parameters"] = search_parameters.urlencode()
         return context
 
 
@@ -137,8 +172,62 @@ class DownloadPDFView(LoginRequiredMixin, ActiveUserRequiredMixin, BaseDownloadP
     template_name = "view_a_licence/view_application_pdf.html"
     header = "Apply for a licence to provide sanctioned trade services: application submitted "
 
+    @cached_property
+    def licence(self) -> Licence:
+        return Licence.objects.get(reference=self.reference)
+
+    def get_pdf_cache_key(self) -> str:
+        return get_licence_pdf_cache_key(self.licence, self.template_name)
+
     def get_context_data(self, **kwargs: object) -> dict[str, Any]:
         context = super().get_context_data(**kwargs)
         self.reference = self.request.GET.get("reference", "")
-        context["licence"] = Licence.objects.get(reference=self.reference)
+        context["licence"] = self.licence
         return context
+
+
+@method_decorator(require_view_a_licence(), name="dispatch")
+class BulkExportView(LoginRequiredMixin, ActiveUserRequiredMixin, View):
+    """Streams back a ZIP of the PDF and uploaded documents of the selected applications, or of the applications
+    submitted in a date range."""
+
+    def get(self, request: HttpRequest, **kwargs: object) -> HttpResponse:
+        references = request.GET.getlist("references")
+        date_min = request.GET.get("date_min")
+        date_max = request.GET.get("date_max")
+        if not references and not date_min and not date_max:
+            return HttpResponseBadRequest("Select the applications, or the dates they were submitted between, to download")
+
+        queryset = Licence.objects.order_by("created_at").prefetch_related("documents")
+        if references:
+            queryset = queryset.filter(reference__in=references)
+        dates = []
+        for date_string in (date_min, date_max):
+            date = None
+            if date_string:
+                try:
+                    date = parse_date(date_string)
+                except ValueError:
+                    pass
+                if not date:
+                    return HttpResponseBadRequest("Enter the dates in the format YYYY-MM-DD")
+            dates.append(date)
+        queryset = filter_created_between(queryset, *dates)
+
+        licences = list(queryset[: settings.BULK_EXPORT_MAX_APPLICATIONS + 1])
+        if not licences:
+            return HttpResponseBadRequest("There are no applications to download")
+        if len(licences) > settings.BULK_EXPORT_MAX_APPLICATIONS:
+            return HttpResponseBadRequest(
+                f"You can only download up to {settings.BULK_EXPORT_MAX_APPLICATIONS} applications at a time"
+            )
+
+        logger.info(f"{self.request.user} exported {len(licences)} licence applications")
+        export_files = get_bulk_export_files(licences, DownloadPDFView.template_name, DownloadPDFView.header)
+        zip_stream = stream_zip(export_files)
+        if isinstance(request, ASGIRequest):
+            # otherwise Django would build the whole ZIP in memory before sending it
+            zip_stream = iterate_in_thread(zip_stream)
+        response = StreamingHttpResponse(zip_stream, content_type="application/zip")
+        response["Content-Disposition"] = f"attachment; filename=applications-{timezone.now():%Y%m%d-%H%M%S}.zip"
+        return response
@@ -4,7 +4,10 @@ from apply_for_a_licence.choices import (
     LicensingGroundsChoices,
     TypeOfRelationshipChoices,
 )
+from apply_for_a_licence.utils import get_licence_reference
+from django.db import connection
 from django.forms import model_to_dict
+from django.test.utils import CaptureQueriesContext
 from utils.companies_house import get_formatted_address
 
 from tests.factories import IndividualFactory, LicenceFactory, OrganisationFactory
@@ -22,6 +25,32 @@ class TestLicenceModel:
         if not licence.reference.isdigit():
             assert licence.reference.isupper()
 
+    def test_assign_reference_is_unique(self):
+        references = set()
+        for _ in range(20):
+            licence = LicenceFactory()
+            references.add(licence.assign_reference())
+            licence.save()
+        assert len(references) == 20
+
+    def test_assign_reference_number_of_queries(self):
+        LicenceFactory.create_batch(10)
+        licence = LicenceFactory()
+        with CaptureQueriesContext(connection) as queries:
+            licence.assign_reference()
+        # the next number in the sequence, and checking it wasn't assigned before the sequence was used
+        assert len(queries) == 2
+
+    def test_assign_reference_skips_references_already_taken(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT last_value, is_called FROM licence_reference_seq")
+            last_value, is_called = cursor.fetchone()
+        next_number = last_value + 1 if is_called else last_value
+        LicenceFactory(reference=get_licence_reference(next_number))
+
+        licence = LicenceFactory()
+        assert licence.assign_reference() == get_licence_reference(next_number + 1)
+
     def test_recipients(self):
         licence = LicenceFactory()
         assert licence.recipients.count() == 0
@@ -0,0 +1,41 @@
+from unittest.mock import patch
+
+import pytest
+from apply_for_a_licence.choices import TypeOfRelationshipChoices
+from apply_for_a_licence.models import Licence
+
+from tests.factories import IndividualFactory, LicenceFactory, OrganisationFactory
+
+
+@pytest.mark.django_db
+class TestTouchLicence:
+    def test_saving_organisation_bumps_modified_at(self):
+        licence = LicenceFactory()
+        original_modified_at = licence.modified_at
+
+        OrganisationFactory(licence=licence, type_of_relationship=TypeOfRelationshipChoices.recipient)
+        licence.refresh_from_db()
+        assert licence.modified_at > original_modified_at
+
+    def test_deleting_individual_bumps_modified_at(self):
+        licence = LicenceFactory()
+        individual = IndividualFactory(licence=licence)
+        licence.refresh_from_db()
+        original_modified_at = licence.modified_at
+
+        individual.delete()
+        licence.refresh_from_db()
+        assert licence.modified_at > original_modified_at
+
+    def test_no_historical_record_created(self):
+        licence = LicenceFactory()
+        OrganisationFactory(licence=licence, type_of_relationship=TypeOfRelationshipChoices.recipient)
+        assert Licence.history.filter(id=licence.id).count() == 1
+
+
+@pytest.mark.django_db
+@patch("apply_for_a_licence.signals.delete_cached_pdfs")
+def test_deleting_licence_deletes_cached_pdfs(mock_delete_cached_pdfs):
+    licence = LicenceFactory(reference="ABC123")
+    licence.delete()
+    mock_delete_cached_pdfs.assert_called_once_with("pdf-cache/ABC123/")
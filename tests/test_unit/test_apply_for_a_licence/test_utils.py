@@ -1,7 +1,15 @@
 import builtins
 from builtins import __import__ as builtin_import
+from unittest.mock import patch
 
-from apply_for_a_licence.utils import get_active_regimes
+import pytest
+from apply_for_a_licence.utils import (
+    VALIDATED_STEPS_SESSION_KEY,
+    get_active_regimes,
+    get_cleaned_data_for_step,
+    get_form,
+    get_licence_reference,
+)
 
 
 def test_get_active_regimes_normal():
@@ -27,3 +35,83 @@ def test_get_active_regimes_import_error(monkeypatch):
     assert isinstance(regimes, list)
     assert len(regimes) == 0
     assert regimes == []
+
+
+def new_request(request_object):
+    """The validated forms are remembered for the rest of the request, so forget them to simulate a new request."""
+    request_object.__dict__.pop("_validated_forms", None)
+    return request_object
+
+
+@patch("apply_for_a_licence.forms.forms_business.get_details_from_companies_house")
+class TestValidatedStepCache:
+    step_name = "do_you_know_the_registered_company_number"
+    company_details = {
+        "company_number": "12345678",
+        "company_name": "Test Company",
+        "registered_office_address": {"address_line_1": "1 Test Street"},
+    }
+
+    def test_step_only_validated_once(self, mocked_companies_house, request_object):
+        mocked_companies_house.return_value = self.company_details
+        request_object.session[self.step_name] = {
+            "do_you_know_the_registered_company_number": "yes",
+            "registered_company_number": "12345678",
+        }
+
+        cleaned_data = get_cleaned_data_for_step(request_object, self.step_name)
+        assert cleaned_data["registered_company_name"] == "Test Company"
+        assert get_form(new_request(request_object), self.step_name).cleaned_data == cleaned_data
+        assert get_cleaned_data_for_step(new_request(request_object), self.step_name) == cleaned_data
+        assert mocked_companies_house.call_count == 1
+
+    def test_step_revalidated_when_changed(self, mocked_companies_house, request_object):
+        mocked_companies_house.return_value = self.company_details
+        request_object.session[self.step_name] = {
+            "do_you_know_the_registered_company_number": "yes",
+            "registered_company_number": "12345678",
+        }
+        get_cleaned_data_for_step(request_object, self.step_name)
+
+        request_object.session[self.step_name] = {"do_you_know_the_registered_company_number": "no"}
+        cleaned_data = get_cleaned_data_for_step(new_request(request_object), self.step_name)
+        assert cleaned_data["do_you_know_the_registered_company_number"] == "no"
+        assert mocked_companies_house.call_count == 1
+
+    def test_invalid_step_cached(self, mocked_companies_house, request_object):
+        request_object.session[self.step_name] = {}
+        assert get_cleaned_data_for_step(request_object, self.step_name) == {}
+        assert get_form(new_request(request_object), self.step_name) == {}
+        assert request_object.session[VALIDATED_STEPS_SESSION_KEY][self.step_name]["cleaned_data"] is None
+
+
+def test_model_form_instance_restored(request_object):
+    request_object.session["type_of_service"] = {"type_of_service": "professional_and_business"}
+    get_form(request_object, "type_of_service")
+
+    form = get_form(new_request(request_object), "type_of_service")
+    assert form.is_valid()
+    assert form.instance.get_type_of_service_display() == "Professional and business services (Russia)"
+
+
+def test_not_revalidated_on_done(request_object):
+    # the verification code has been used (and would now be rejected), but the step was validated when it was entered
+    request_object.session["email_verify"] = {"email_verification_code": "012345"}
+    request_object.session[VALIDATED_STEPS_SESSION_KEY] = {
+        "email_verify": {"hash": "old hash", "cleaned_data": {"email_verification_code": "012345"}}
+    }
+    assert get_cleaned_data_for_step(request_object, "email_verify") == {"email_verification_code": "012345"}
+
+
+def test_get_licence_reference():
+    assert get_licence_reference(1) != get_licence_reference(2)
+    assert len(get_licence_reference(0xFFFFFF)) == 6
+    # every number gives a different reference
+    references = {get_licence_reference(number) for number in range(2**16)}
+    assert len(references) == 2**16
+    assert all(len(reference) == 6 and reference == reference.upper() for reference in references)
+
+
+def test_get_licence_reference_out_of_range():
+    with pytest.raises(ValueError):
+        get_licence_reference(2**24)
@@ -1,3 +1,6 @@
+from unittest.mock import patch
+
+from apply_for_a_licence.exceptions import CompaniesHouseException
 from django.test import RequestFactory
 from django.urls import reverse
 
@@ -42,6 +45,52 @@ class TestDoYouKnowTheRegisteredCompanyNumber:
     def test_get_context_data(self, authenticated_al_client):
         response = authenticated_al_client.get(reverse("do_you_know_the_registered_company_number"))
         assert response.context["page_title"] == "Registered Company Number"
+        assert response.context["company_details_url"] == reverse("company_details", kwargs={"company_number": "00000000"})
+
+
+class TestCompanyDetailsView:
+    @patch("apply_for_a_licence.views.views_business.get_details_from_companies_house")
+    def test_get(self, mocked_get_details_from_companies_house, authenticated_al_client):
+        mocked_get_details_from_companies_house.return_value = {
+            "company_number": "12345678",
+            "company_name": "Test Company",
+            "registered_office_address": {"address_line_1": "1 Test Street", "locality": "London", "postal_code": "AA1 1AA"},
+        }
+
+        response = authenticated_al_client.get(reverse("company_details", kwargs={"company_number": "12345678"}))
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "success": True,
+            "company_number": "12345678",
+            "company_name": "Test Company",
+            "registered_office_address": "1 Test Street,\n London \n AA1 1AA",
+        }
+        mocked_get_details_from_companies_house.assert_called_once_with("12345678")
+
+    @patch("apply_for_a_licence.views.views_business.get_details_from_companies_house")
+    def test_invalid_company_number(self, mocked_get_details_from_companies_house, authenticated_al_client):
+        response = authenticated_al_client.get(reverse("company_details", kwargs={"company_number": "1234"}))
+
+        assert response.status_code == 400
+        assert not mocked_get_details_from_companies_house.called
+
+    @patch("apply_for_a_licence.views.views_business.get_details_from_companies_house")
+    def test_company_not_found(self, mocked_get_details_from_companies_house, authenticated_al_client):
+        mocked_get_details_from_companies_house.side_effect = CompaniesHouseException
+
+        response = authenticated_al_client.get(reverse("company_details", kwargs={"company_number": "12345678"}))
+
+        assert response.status_code == 404
+        assert response.json() == {"success": False}
+
+    @patch("apply_for_a_licence.views.views_business.is_ratelimited", return_value=True)
+    @patch("apply_for_a_licence.views.views_business.get_details_from_companies_house")
+    def test_ratelimit(self, mocked_get_details_from_companies_house, mocked_is_ratelimited, authenticated_al_client):
+        response = authenticated_al_client.get(reverse("company_details", kwargs={"company_number": "12345678"}))
+
+        assert response.status_code == 429
+        assert not mocked_get_details_from_companies_house.called
 
 
 class TestBusinessAddedView:
@@ -134,6 +183,11 @@ class TestCheckCompanyDetailsView:
         assert response.url == "/apply/add-business"
         assert len(businesses) == 4
         assert "companieshouse1" in businesses.keys()
+        # the business isn't kept in the session twice
+        assert "companieshouse1" not in authenticated_al_client.session["companies_house_businesses"]
+
+        response = authenticated_al_client.get(reverse("check_company_details", kwargs={"business_uuid": "companieshouse1"}))
+        assert response.context["company_details"]["company_number"] == "1234567"
 
     def test_get_context_data(self, request_object, authenticated_al_client):
         request_object.session = authenticated_al_client.session
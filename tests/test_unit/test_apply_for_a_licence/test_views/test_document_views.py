@@ -1,10 +1,17 @@
 import logging
 from unittest.mock import patch
 
+import pytest
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
-from utils.s3 import get_user_uploaded_files
+from utils.document_uploads import (
+    DocumentUploadStatus,
+    check_uploaded_document,
+    get_document_upload_statuses,
+    set_document_upload_status,
+)
+from utils.s3 import add_user_uploaded_file, get_user_uploaded_files
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +91,16 @@ class TestDeleteDocumentsView:
         args, kwargs = mocked_temporary_document_storage.call_args
         assert f"{authenticated_al_client.session.session_key}/test.png" in args
 
+    def test_file_name_removed_from_cache(self, mocked_temporary_document_storage, authenticated_al_client):
+        add_user_uploaded_file(authenticated_al_client.session, "test.png")
+        add_user_uploaded_file(authenticated_al_client.session, "other.png")
+
+        authenticated_al_client.post(
+            reverse("delete_documents") + "?file_name=test.png",
+            headers={"x-requested-with": "XMLHttpRequest"},
+        )
+        assert get_user_uploaded_files(authenticated_al_client.session) == ["other.png"]
+
     def test_unsuccessful_post(self, mocked_temporary_document_storage, authenticated_al_client):
         response = authenticated_al_client.post(
             reverse("delete_documents"),
@@ -109,3 +126,62 @@ class TestDownloadDocumentMiddleman:
     def test_download_document_middleman_not_in_cache(self, mocked_uploaded_files, authenticated_al_client):
         response = authenticated_al_client.get(reverse("download_document", kwargs={"file_name": "test.png"}))
         assert response.status_code == 404
+
+
+class TestDirectUploadViews:
+    @pytest.fixture(autouse=True)
+    def direct_uploads_enabled(self, settings):
+        settings.DIRECT_UPLOADS_ENABLED = True
+
+    def test_disabled(self, authenticated_al_client, settings):
+        settings.DIRECT_UPLOADS_ENABLED = False
+        response = authenticated_al_client.post(reverse("start_direct_upload"), data={"file_name": "test.png", "size": 100})
+        assert response.status_code == 404
+
+    @patch("utils.document_uploads.generate_presigned_upload", return_value={"url": "https://s3", "fields": {"key": "x"}})
+    def test_start_upload(self, mocked_generate_presigned_upload, authenticated_al_client):
+        cache.clear()
+        response = authenticated_al_client.post(reverse("start_direct_upload"), data={"file_name": "../test.png", "size": 100})
+        assert response.json() == {"success": True, "file_name": "test.png", "url": "https://s3", "fields": {"key": "x"}}
+        session_key = authenticated_al_client.session.session_key
+        mocked_generate_presigned_upload.assert_called_once()
+        assert mocked_generate_presigned_upload.call_args.args[1] == f"direct-uploads/{session_key}/test.png"
+        assert get_document_upload_statuses(session_key)["test.png"]["status"] == DocumentUploadStatus.pending
+
+    @patch("utils.document_uploads.generate_presigned_upload")
+    def test_start_upload_invalid(self, mocked_generate_presigned_upload, authenticated_al_client):
+        response = authenticated_al_client.post(reverse("start_direct_upload"), data={"file_name": "test.png", "size": 104857601})
+        assert response.json() == {
+            "success": False,
+            "error": "The selected file must be smaller than 100 MB",
+            "file_name": "test.png",
+        }
+        assert not mocked_generate_presigned_upload.called
+
+    @patch("apply_for_a_licence.views.views_documents.run_in_background")
+    def test_complete_upload(self, mocked_run_in_background, authenticated_al_client):
+        session_key = authenticated_al_client.session.session_key
+        set_document_upload_status(session_key, "test.png", DocumentUploadStatus.pending)
+
+        response = authenticated_al_client.post(reverse("complete_direct_upload"), data={"file_name": "test.png"})
+        assert response.status_code == 202
+        mocked_run_in_background.assert_called_once_with(check_uploaded_document, session_key, "test.png")
+
+        # the upload can't be completed twice
+        response = authenticated_al_client.post(reverse("complete_direct_upload"), data={"file_name": "test.png"})
+        assert response.status_code == 400
+
+    def test_upload_status(self, authenticated_al_client):
+        session_key = authenticated_al_client.session.session_key
+        set_document_upload_status(session_key, "test.png", DocumentUploadStatus.failed, "The selected file contains a virus")
+
+        response = authenticated_al_client.get(reverse("direct_upload_status") + "?file_name=test.png")
+        assert response.json() == {
+            "success": False,
+            "status": "failed",
+            "error": "The selected file contains a virus",
+            "file_name": "test.png",
+        }
+
+        response = authenticated_al_client.get(reverse("direct_upload_status") + "?file_name=other.png")
+        assert response.status_code == 404
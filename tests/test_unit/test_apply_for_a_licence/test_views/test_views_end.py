@@ -1,16 +1,19 @@
 from unittest.mock import MagicMock, patch
 
 import pytest
+from apply_for_a_licence.models import Licence, Session, UserEmailVerification
 from django.test import RequestFactory
 from django.urls import reverse
+from view_a_licence.search import LicenceSearch
 
 from django_app.apply_for_a_licence.views.views_end import DownloadPDFView
 from tests.conftest import LicenceFactory
+from tests.test_unit.test_utils import data
 
 
 @pytest.mark.django_db
 @patch("apply_for_a_licence.views.views_end.SaveToDB", return_value=MagicMock())
-@patch("apply_for_a_licence.views.views_end.send_email", new=MagicMock())
+@patch("apply_for_a_licence.views.views_end.queue_email", new=MagicMock())
 class TestDeclarationView:
     """We're just testing the view logic here, not the chunky save_to_db stuff"""
 
@@ -75,6 +78,77 @@ class TestDeclarationView:
         assert kwargs.get("is_individual") is False
         assert kwargs.get("is_third_party") is True
 
+    @patch("apply_for_a_licence.views.views_end.schedule_licence_pdf_generation")
+    @patch("apply_for_a_licence.views.views_end.get_all_cleaned_data")
+    def test_pdfs_generated_on_commit(
+        self,
+        patched_clean_data,
+        patched_schedule_pdf_generation,
+        patched_save_to_db,
+        authenticated_al_client,
+        licence_request_object,
+        django_capture_on_commit_callbacks,
+    ):
+        licence_request_object.session["start"]["who_do_you_want_the_licence_to_cover"] = "business"
+        licence_request_object.session.save()
+        patched_clean_data.return_value = licence_request_object.session
+        patched_save_to_db.return_value.save_licence.return_value = LicenceFactory(reference="DE1234")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            authenticated_al_client.post(reverse("declaration"), data={"declaration": "on"})
+
+        patched_schedule_pdf_generation.assert_called_once()
+        reference, templates = patched_schedule_pdf_generation.call_args.args
+        assert reference == "DE1234"
+        assert set(templates) == {
+            "apply_for_a_licence/download_application_pdf.html",
+            "view_a_licence/view_application_pdf.html",
+        }
+
+    @patch("apply_for_a_licence.views.views_end.get_all_cleaned_data")
+    def test_emails_queued(
+        self, patched_clean_data, patched_save_to_db, authenticated_al_client, licence_request_object, settings
+    ):
+        settings.NEW_APPLICATION_ALERT_RECIPIENTS = ["staff1@example.com", "staff2@example.com"]
+        licence_request_object.session["start"]["who_do_you_want_the_licence_to_cover"] = "business"
+        licence_request_object.session.save()
+        patched_clean_data.return_value = licence_request_object.session
+        patched_save_to_db.return_value.save_licence.return_value = LicenceFactory(
+            reference="DE1234", applicant_user_email_address="applicant@example.com"
+        )
+
+        with patch("apply_for_a_licence.views.views_end.queue_email") as patched_queue_email:
+            authenticated_al_client.post(reverse("declaration"), data={"declaration": "on"})
+
+        assert [call.kwargs["email"] for call in patched_queue_email.call_args_list] == [
+            "applicant@example.com",
+            "staff1@example.com",
+            "staff2@example.com",
+        ]
+
+
+@pytest.mark.django_db
+@patch("apply_for_a_licence.views.views_end.queue_email", new=MagicMock())
+@patch("utils.save_to_db.get_all_session_files", new=MagicMock(return_value={}))
+@patch("apply_for_a_licence.views.views_end.get_all_cleaned_data")
+def test_submitted_application_can_be_searched(patched_clean_data, authenticated_al_client):
+    session = authenticated_al_client.session
+    session["businesses"] = data.businesses
+    session["recipients"] = data.recipients
+    session.save()
+    UserEmailVerification.objects.create(
+        user_session=Session.objects.get(session_key=session.session_key), email_verification_code="012345", verified=True
+    )
+    patched_clean_data.return_value = data.cleaned_data
+
+    authenticated_al_client.post(reverse("declaration"), data={"declaration": "on"})
+
+    licence = Licence.objects.get()
+    # the recipients and businesses are bulk created after the licence, so aren't in its search vector unless it's
+    # updated again
+    for query in ("Recipient 1", "Companies House Business", "12345678"):
+        assert list(LicenceSearch(query=query).filter(Licence.objects.all())) == [licence], query
+
 
 class TestDownloadPDFView:
     @patch("apply_for_a_licence.models.Licence.objects.get", return_value=MagicMock())
@@ -3,6 +3,7 @@ from apply_for_a_licence.choices import (
     ProfessionalOrBusinessServicesChoices,
     TypeOfServicesChoices,
 )
+from apply_for_a_licence.utils import VALIDATED_STEPS_SESSION_KEY
 from django.urls import reverse
 
 
@@ -70,3 +71,14 @@ class TestTypeOfServiceView:
 
         assert authenticated_al_client.session["service_activities"] == {}
         assert authenticated_al_client.session["purpose_of_provision"] == {}
+
+
+@pytest.mark.django_db
+def test_validated_step_cached_on_post(authenticated_al_client):
+    authenticated_al_client.post(
+        reverse("type_of_service"), data={"type_of_service": TypeOfServicesChoices.professional_and_business.value}
+    )
+    validated_steps = authenticated_al_client.session[VALIDATED_STEPS_SESSION_KEY]
+    assert validated_steps["type_of_service"]["cleaned_data"] == {
+        "type_of_service": TypeOfServicesChoices.professional_and_business.value
+    }
@@ -1,9 +1,19 @@
 from unittest import mock
 
-from authentication.backends import AdminBackend, OneLoginBackend, StaffSSOBackend
+import pytest
+from authentication.backends import (
+    AdminBackend,
+    OneLoginBackend,
+    StaffSSOBackend,
+    get_user_cache_key,
+)
 from authentication.types import UserInfo
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from freezegun import freeze_time
 
 
@@ -109,3 +119,55 @@ class TestAdminBackend:
 
         user = AdminBackend().authenticate(request_object, username="staff", password="password")
         assert user is None
+
+
+@pytest.mark.django_db
+class TestCachedUser:
+    @pytest.fixture(autouse=True)
+    def user_cache_enabled(self, settings):
+        settings.USER_CACHE_ENABLED = True
+
+    @pytest.fixture
+    def user(self):
+        user = User.objects.create(username="caseworker", email="caseworker@example.com", is_active=True, is_staff=True)
+        cache.delete(get_user_cache_key(user.pk))
+        return user
+
+    @pytest.mark.parametrize("backend_class", [OneLoginBackend, StaffSSOBackend])
+    def test_get_user_cached(self, backend_class, user):
+        assert backend_class().get_user(user.pk) == user
+        with CaptureQueriesContext(connection) as queries:
+            assert backend_class().get_user(user.pk) == user
+        assert len(queries) == 0
+
+    def test_get_user_not_cached_when_disabled(self, settings, user):
+        settings.USER_CACHE_ENABLED = False
+        OneLoginBackend().get_user(user.pk)
+        assert cache.get(get_user_cache_key(user.pk)) is None
+
+    def test_missing_user_not_cached(self):
+        assert OneLoginBackend().get_user(0) is None
+        assert cache.get(get_user_cache_key(0)) is None
+
+    def test_saving_user_clears_cache(self, user, django_capture_on_commit_callbacks):
+        OneLoginBackend().get_user(user.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_active = False
+            user.save()
+        assert OneLoginBackend().get_user(user.pk).is_active is False
+
+    def test_deleting_user_clears_cache(self, user, django_capture_on_commit_callbacks):
+        user_id = user.pk
+        OneLoginBackend().get_user(user_id)
+        with django_capture_on_commit_callbacks(execute=True):
+            user.delete()
+        assert OneLoginBackend().get_user(user_id) is None
+
+    def test_logged_in_request_skips_user_query(self, user, vl_client):
+        vl_client.force_login(user, backend="authentication.backends.StaffSSOBackend")
+        vl_client.get(reverse("view_a_licence:application_list"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = vl_client.get(reverse("view_a_licence:application_list"))
+        assert response.status_code == 200
+        assert not [query for query in queries if 'FROM "auth_user"' in query["sql"]]
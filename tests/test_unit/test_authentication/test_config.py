@@ -0,0 +1,128 @@
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from authentication.config import LocalOneLoginConfig, OneLoginConfig
+from authentication.utils import TOKEN_SESSION_KEY, validate_token
+from authlib.jose import JsonWebKey, jwt
+from django.core.cache import cache
+from django.test import RequestFactory
+
+OPENID_CONFIG = {
+    "issuer": "http://localhost:28081/",
+    "jwks_uri": "http://localhost:28081/.well-known/jwks.json",
+    "token_endpoint": "http://localhost:28081/token",
+}
+
+
+def get_signing_key(kid: str):
+    return JsonWebKey.generate_key("RSA", 2048, options={"kid": kid}, is_private=True)
+
+
+def mock_response(data: dict) -> MagicMock:
+    response = MagicMock()
+    response.json.return_value = data
+    return response
+
+
+@pytest.fixture(autouse=True)
+def clear_one_login_cache():
+    OneLoginConfig._local_cache.clear()
+    OneLoginConfig._jwks_refreshed_at.clear()
+    for key in (LocalOneLoginConfig.CACHE_KEY, LocalOneLoginConfig.JWKS_CACHE_KEY):
+        cache.delete(key)
+    yield
+    OneLoginConfig._local_cache.clear()
+    OneLoginConfig._jwks_refreshed_at.clear()
+
+
+@pytest.fixture
+def signing_key():
+    return get_signing_key("key-1")
+
+
+@pytest.fixture
+def mock_requests(signing_key):
+    jwks = {"keys": [signing_key.as_dict()]}
+    with patch("authentication.config.requests.get") as mock_get:
+        mock_get.side_effect = lambda url: mock_response(OPENID_CONFIG if url.endswith("openid-configuration") else jwks)
+        mock_get.jwks = jwks
+        yield mock_get
+
+
+def test_openid_config_shared_between_instances(mock_requests):
+    assert LocalOneLoginConfig().issuer == OPENID_CONFIG["issuer"]
+    assert LocalOneLoginConfig().token_url == OPENID_CONFIG["token_endpoint"]
+    mock_requests.assert_called_once_with(LocalOneLoginConfig.CONFIGURATION_ENDPOINT)
+
+    # another process picks it up from the redis store
+    OneLoginConfig._local_cache.clear()
+    assert LocalOneLoginConfig().issuer == OPENID_CONFIG["issuer"]
+    mock_requests.assert_called_once()
+
+
+def test_openid_config_expires(mock_requests):
+    LocalOneLoginConfig().openid_config
+    cache.delete(LocalOneLoginConfig.CACHE_KEY)
+    with patch("authentication.config.time.monotonic", return_value=time.monotonic() + OneLoginConfig.CACHE_EXPIRY + 1):
+        LocalOneLoginConfig().openid_config
+    assert mock_requests.call_count == 2
+
+
+def test_openid_config_expires_with_redis_value(mock_requests):
+    # another process fetched it most of an hour ago
+    fetched_at = time.time() - OneLoginConfig.CACHE_EXPIRY + 10
+    cache.set(LocalOneLoginConfig.CACHE_KEY, json.dumps({"fetched_at": fetched_at, "value": OPENID_CONFIG}))
+    LocalOneLoginConfig().openid_config
+    assert not mock_requests.called
+
+    # our copy expires with the redis one, not an hour after we loaded it
+    cache.delete(LocalOneLoginConfig.CACHE_KEY)
+    with patch("authentication.config.time.monotonic", return_value=time.monotonic() + 11):
+        LocalOneLoginConfig().openid_config
+    mock_requests.assert_called_once()
+
+
+def test_public_key_cached(mock_requests, signing_key):
+    for _ in range(3):
+        assert LocalOneLoginConfig().get_public_key("key-1").kid == "key-1"
+    # the metadata, then the keys
+    assert mock_requests.call_count == 2
+
+
+def test_public_key_refreshed_for_unknown_kid(mock_requests):
+    LocalOneLoginConfig().get_public_key("key-1")
+
+    # One Login rotates its keys
+    mock_requests.jwks["keys"].append(get_signing_key("key-2").as_dict())
+    assert LocalOneLoginConfig().get_public_key("key-2").kid == "key-2"
+    assert mock_requests.call_count == 3
+
+
+def test_public_key_refresh_throttled(mock_requests):
+    LocalOneLoginConfig().get_public_key("key-1")
+
+    with pytest.raises(ValueError):
+        LocalOneLoginConfig().get_public_key("made-up")
+    with pytest.raises(ValueError):
+        LocalOneLoginConfig().get_public_key("also-made-up")
+    # the keys are only fetched again for the first unknown kid
+    assert mock_requests.call_count == 3
+
+
+@patch("authentication.utils.settings.GOV_UK_ONE_LOGIN_CLIENT_ID", "my-client")
+def test_validate_token(mock_requests, signing_key):
+    request = RequestFactory().get("/")
+    request.session = {f"{TOKEN_SESSION_KEY}_oauth_nonce": "nonce"}
+    now = int(time.time())
+    id_token = jwt.encode(
+        {"alg": "RS256", "kid": "key-1"},
+        {"iss": OPENID_CONFIG["issuer"], "aud": "my-client", "sub": "1234", "nonce": "nonce", "iat": now, "exp": now + 60},
+        signing_key,
+    )
+
+    validate_token(request, {"id_token": id_token})
+    validate_token(request, {"id_token": id_token})
+    # the metadata and keys are only fetched for the first login
+    assert mock_requests.call_count == 2
@@ -0,0 +1,43 @@
+from authentication.utils import (
+    TOKEN_SESSION_KEY,
+    get_client,
+    get_client_auth_method,
+    get_http_adapter,
+)
+from django.test import RequestFactory
+
+
+def get_request(token: dict | None = None):
+    request = RequestFactory().get("/")
+    request.session = {TOKEN_SESSION_KEY: token} if token else {}
+    return request
+
+
+def test_get_client_shares_connections(settings):
+    first_client = get_client(get_request({"access_token": "first", "token_type": "Bearer"}))
+    second_client = get_client(get_request({"access_token": "second", "token_type": "Bearer"}))
+
+    assert first_client.get_adapter("https://oidc.account.gov.uk/token") is get_http_adapter()
+    assert second_client.get_adapter("https://oidc.account.gov.uk/userinfo") is get_http_adapter()
+    assert first_client.default_timeout == settings.GOV_UK_ONE_LOGIN_TIMEOUT
+
+    # but each client has its own request's token
+    assert first_client.token["access_token"] == "first"
+    assert second_client.token["access_token"] == "second"
+
+
+def test_get_client_without_token():
+    assert not get_client(get_request()).token
+
+
+def test_token_requests_not_retried():
+    retries = get_http_adapter().max_retries
+    assert retries.is_retry("GET", 503)
+    # an auth code can only be used once
+    assert not retries.is_retry("POST", 503)
+
+
+def test_get_client_auth_method_reused():
+    assert get_client_auth_method("https://oidc.account.gov.uk/token") is get_client_auth_method(
+        "https://oidc.account.gov.uk/token"
+    )
@@ -0,0 +1,35 @@
+from io import StringIO
+from unittest.mock import patch
+
+from apply_for_a_licence.models import Licence
+from core.management.commands.benchmark_pdf_rendering import get_percentiles
+from django.core.management import call_command
+from utils.pdf import RenderedPDF
+
+
+def fake_render_pdf(html, timer):
+    timer.record("pdf", 10.0, 10.1)
+    # the synthetic application is rendered in full
+    assert "Recipient 2" in html and "Individual 1" in html
+    return RenderedPDF(data=b"pdf", timer=timer, browser_memory=1024)
+
+
+@patch("core.management.commands.benchmark_pdf_rendering.shutdown_browser_pool")
+@patch("core.management.commands.benchmark_pdf_rendering.render_pdf", side_effect=fake_render_pdf)
+def test_benchmark(mocked_render_pdf, mocked_shutdown, db):
+    out = StringIO()
+    call_command("benchmark_pdf_rendering", iterations=2, recipients=3, individuals=2, documents=1, stdout=out)
+
+    assert mocked_render_pdf.call_count == 2
+    output = out.getvalue()
+    assert "template" in output
+    assert "pdf              2     100.00     100.00" in output
+    # the synthetic application isn't kept
+    assert not Licence.objects.exists()
+    mocked_shutdown.assert_called_once()
+
+
+def test_get_percentiles():
+    durations = [float(duration) for duration in range(1, 101)]
+    assert get_percentiles(durations) == (50.5, 95.05)
+    assert get_percentiles([10.0]) == (10.0, 10.0)
@@ -0,0 +1,26 @@
+from io import StringIO
+
+import pytest
+from apply_for_a_licence.models import Licence
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+
+def test_benchmark(db):
+    out = StringIO()
+    call_command("benchmark_reference_allocation", rows=1000, allocations=5, confirm_benchmark_database=True, stdout=out)
+
+    output = out.getvalue()
+    assert "Inserted 1000 licences" in output
+    assert "allocations" in output
+    assert "Index" in output
+    # the synthetic licences aren't kept
+    assert not Licence.objects.exists()
+
+
+def test_benchmark_needs_confirming(db, settings):
+    settings.DEBUG = False
+
+    with pytest.raises(CommandError):
+        call_command("benchmark_reference_allocation", rows=1000, allocations=5, stdout=StringIO())
+    assert not Licence.objects.exists()
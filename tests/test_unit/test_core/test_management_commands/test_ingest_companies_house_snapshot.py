@@ -0,0 +1,59 @@
+import zipfile
+from datetime import date
+
+import pytest
+from apply_for_a_licence.models import CompaniesHouseCompany
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+SNAPSHOT = (
+    "CompanyName, CompanyNumber,RegAddress.CareOf,RegAddress.POBox,RegAddress.AddressLine1, RegAddress.AddressLine2,"
+    "RegAddress.PostTown,RegAddress.County,RegAddress.Country,RegAddress.PostCode\n"
+    '"COMPANY ONE LTD","12345678","","","1 HIGH STREET","","LONDON","","ENGLAND","SW1A 1AA"\n'
+    '"COMPANY TWO LTD","SC123456","","","2 HIGH STREET","FLOOR 2","EDINBURGH","","SCOTLAND","EH1 1AA"\n'
+    '"OVERSEAS LTD","FC123456","","","3 MAIN STREET","","PARIS","","FRANCE","75001"\n'
+)
+
+
+def test_ingest_csv(db, tmp_path):
+    CompaniesHouseCompany.objects.create(company_number="00000001", company_name="Old", snapshot_date=date(2024, 1, 1))
+    snapshot_path = tmp_path / "snapshot.csv"
+    snapshot_path.write_text(SNAPSHOT)
+
+    call_command("ingest_companies_house_snapshot", str(snapshot_path), snapshot_date=date(2024, 2, 1))
+
+    assert set(CompaniesHouseCompany.objects.values_list("company_number", flat=True)) == {"12345678", "SC123456"}
+    company = CompaniesHouseCompany.objects.get(company_number="SC123456")
+    assert company.get_company_details() == {
+        "company_number": "SC123456",
+        "company_name": "COMPANY TWO LTD",
+        "registered_office_address": {
+            "address_line_1": "2 HIGH STREET",
+            "address_line_2": "FLOOR 2",
+            "locality": "EDINBURGH",
+            "postal_code": "EH1 1AA",
+            "country": "Scotland",
+        },
+    }
+    assert company.snapshot_date == date(2024, 2, 1)
+
+
+def test_ingest_zip_updates_companies(db, tmp_path):
+    CompaniesHouseCompany.objects.create(company_number="12345678", company_name="Old name", snapshot_date=date(2024, 1, 1))
+    snapshot_path = tmp_path / "snapshot.zip"
+    with zipfile.ZipFile(snapshot_path, "w") as snapshot_zip:
+        snapshot_zip.writestr("BasicCompanyData-part1.csv", SNAPSHOT)
+
+    call_command("ingest_companies_house_snapshot", str(snapshot_path), batch_size=1)
+
+    assert CompaniesHouseCompany.objects.get(company_number="12345678").company_name == "COMPANY ONE LTD"
+
+
+def test_empty_snapshot_keeps_companies(db, tmp_path):
+    CompaniesHouseCompany.objects.create(company_number="12345678", company_name="Company", snapshot_date=date(2024, 1, 1))
+    snapshot_path = tmp_path / "snapshot.csv"
+    snapshot_path.write_text(SNAPSHOT.splitlines()[0])
+
+    with pytest.raises(CommandError):
+        call_command("ingest_companies_house_snapshot", str(snapshot_path))
+    assert CompaniesHouseCompany.objects.filter(company_number="12345678").exists()
@@ -0,0 +1,13 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+
+
+@patch("core.management.commands.send_queued_emails.send_queued_emails", side_effect=[2, 0])
+def test_send_queued_emails_once(mocked_send_queued_emails, db):
+    out = StringIO()
+    call_command("send_queued_emails", once=True, stdout=out)
+
+    assert mocked_send_queued_emails.call_count == 2
+    assert "Tried to send 2 emails" in out.getvalue()
@@ -0,0 +1,50 @@
+import pytest
+from core.middleware import CurrentSiteMiddleware
+from core.sites import SiteName, get_site_for_host
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.fixture
+def middleware():
+    return CurrentSiteMiddleware(lambda request: HttpResponse())
+
+
+def test_site_set_from_memory(db, middleware):
+    get_site_for_host(settings.APPLY_FOR_A_LICENCE_DOMAIN)
+
+    request = RequestFactory(SERVER_NAME=settings.VIEW_A_LICENCE_DOMAIN).get("/")
+    with CaptureQueriesContext(connection) as queries:
+        middleware(request)
+    assert request.site.name == SiteName.view_a_licence
+    assert len(queries) == 0
+
+
+def test_host_with_port(db):
+    Site.objects.filter(name=SiteName.apply_for_a_licence).update(domain="apply.example.com")
+    assert get_site_for_host("APPLY.example.com:443").name == SiteName.apply_for_a_licence
+
+
+def test_unknown_host(db):
+    with pytest.raises(Site.DoesNotExist):
+        get_site_for_host("unknown.example.com")
+
+
+def test_site_changes_picked_up(db):
+    site = get_site_for_host(settings.APPLY_FOR_A_LICENCE_DOMAIN)
+    site.domain = "apply.example.com"
+    site.save()
+
+    assert get_site_for_host("apply.example.com").pk == site.pk
+    with pytest.raises(Site.DoesNotExist):
+        get_site_for_host(settings.APPLY_FOR_A_LICENCE_DOMAIN)
+
+
+def test_healthcheck_exempt(db, middleware):
+    request = RequestFactory(SERVER_NAME="internal-host").get("/healthcheck/")
+    middleware(request)
+    assert not hasattr(request, "site")
@@ -0,0 +1,154 @@
+import zlib
+
+import pytest
+from core.session_backend import (
+    SCHEMA_VERSION_KEY,
+    SESSION_SCHEMA_VERSION,
+    SessionStore,
+    migrate_session_data,
+)
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import override_settings
+from freezegun import freeze_time
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestMigrateSessionData:
+    def test_unversioned_session_is_compacted(self):
+        session_data = {
+            "businesses": {
+                "business-1": {
+                    "dirty_data": {"name": "Business", "csrfmiddlewaretoken": "token", "encoding": "utf-8"},
+                },
+            },
+            "companies_house_businesses": {
+                "business-1": {"dirty_data": {"name": "Business"}},
+                "business-2": {"dirty_data": {"name": "Another business"}},
+            },
+            "individuals": {
+                "individual-1": {
+                    "name_data": {"dirty_data": {"first_name": "John", "csrfmiddlewaretoken": "token"}},
+                    "address_data": {"dirty_data": {"town_or_city": "London", "encoding": "utf-8"}},
+                },
+            },
+            "your_address": {"dirty_data": {"country": "GB", "csrfmiddlewaretoken": "token"}},
+        }
+
+        migrated = migrate_session_data(session_data)
+
+        assert migrated["businesses"]["business-1"]["dirty_data"] == {"name": "Business"}
+        assert list(migrated["companies_house_businesses"]) == ["business-2"]
+        assert migrated["individuals"]["individual-1"]["name_data"]["dirty_data"] == {"first_name": "John"}
+        assert migrated["individuals"]["individual-1"]["address_data"]["dirty_data"] == {"town_or_city": "London"}
+        assert migrated["your_address"]["dirty_data"] == {"country": "GB"}
+
+    def test_current_version_is_unchanged(self):
+        session_data = {SCHEMA_VERSION_KEY: SESSION_SCHEMA_VERSION, "your_address": {"dirty_data": {"encoding": "x"}}}
+
+        assert migrate_session_data(session_data) == {"your_address": {"dirty_data": {"encoding": "x"}}}
+
+
+@pytest.mark.django_db
+class TestSessionStore:
+    def test_session_is_stored_compressed_in_the_cache(self):
+        session = SessionStore()
+        session["start"] = {"dirty_data": {"who_do_you_want_the_licence_to_cover": "business"}}
+        session.save()
+
+        cached_data = cache.get(session.cache_key)
+        assert isinstance(cached_data, bytes)
+        assert SCHEMA_VERSION_KEY.encode() in zlib.decompress(cached_data)
+
+        loaded_session = SessionStore(session.session_key)
+        assert loaded_session["start"] == {"dirty_data": {"who_do_you_want_the_licence_to_cover": "business"}}
+        assert SCHEMA_VERSION_KEY not in loaded_session
+
+    def test_database_row_is_only_created(self):
+        session = SessionStore()
+        session["step"] = "first"
+        session.save()
+
+        assert Session.objects.get(session_key=session.session_key).get_decoded() == {"step": "first"}
+
+        session["step"] = "second"
+        session.save()
+
+        assert Session.objects.get(session_key=session.session_key).get_decoded() == {"step": "first"}
+        assert SessionStore(session.session_key)["step"] == "second"
+
+    def test_database_row_is_refreshed(self):
+        with freeze_time("2024-01-01 12:00:00"):
+            session = SessionStore()
+            session["step"] = "first"
+            session.save()
+        created_expire_date = Session.objects.get(session_key=session.session_key).expire_date
+
+        # the refresh interval has passed
+        cache.delete(session.db_refreshed_cache_key)
+        with freeze_time("2024-01-01 12:30:00"):
+            session["step"] = "second"
+            session.save()
+
+        db_session = Session.objects.get(session_key=session.session_key)
+        assert db_session.get_decoded() == {"step": "second"}
+        # so clearsessions won't delete the session while it's still being used
+        assert db_session.expire_date > created_expire_date
+
+    def test_cache_miss_after_cycle_key(self):
+        session = SessionStore()
+        session["step"] = "first"
+        session.save()
+
+        # e.g. when the user logs in
+        session.cycle_key()
+        session["_auth_user_id"] = "1"
+        session.save()
+
+        cache.clear()
+        loaded_session = SessionStore(session.session_key)
+        assert loaded_session["step"] == "first"
+        assert loaded_session["_auth_user_id"] == "1"
+
+    @override_settings(SESSION_DB_WRITE_THROUGH=True)
+    def test_database_write_through(self):
+        session = SessionStore()
+        session["step"] = "first"
+        session.save()
+        session["step"] = "second"
+        session.save()
+
+        assert Session.objects.get(session_key=session.session_key).get_decoded() == {"step": "second"}
+
+    def test_legacy_database_session_is_migrated(self):
+        legacy_session = DBStore()
+        legacy_session["companies_house_businesses"] = {"business-1": {"dirty_data": {"name": "Business"}}}
+        legacy_session["businesses"] = {
+            "business-1": {"dirty_data": {"name": "Business", "csrfmiddlewaretoken": "token"}},
+        }
+        legacy_session.save()
+
+        session = SessionStore(legacy_session.session_key)
+
+        assert session["businesses"] == {"business-1": {"dirty_data": {"name": "Business"}}}
+        assert session["companies_house_businesses"] == {}
+        # the migrated session is cached, so the database isn't read again
+        assert cache.get(session.cache_key) is not None
+
+    def test_delete(self):
+        session = SessionStore()
+        session["step"] = "first"
+        session.save()
+        session_key = session.session_key
+
+        session.delete()
+
+        assert cache.get(SessionStore(session_key).cache_key) is None
+        assert not Session.objects.filter(session_key=session_key).exists()
@@ -0,0 +1,125 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from core.telemetry import (
+    TelemetryCategory,
+    collect_telemetry,
+    get_latency_cache_key,
+    get_latency_metrics,
+    record_view_latency,
+    timed,
+    timer,
+)
+from django.core.cache import cache
+from django.urls import reverse
+
+
+@pytest.fixture(autouse=True)
+def clear_latency_histogram():
+    for cache_key in list(cache.iter_keys(get_latency_cache_key("*"))):
+        cache.delete(cache_key)
+
+
+def test_timer_only_counts_inside_request():
+    with timer(TelemetryCategory.cache):
+        pass
+
+    with collect_telemetry() as telemetry:
+        with timer(TelemetryCategory.cache):
+            pass
+    assert telemetry.totals[TelemetryCategory.cache].count == 1
+
+
+def test_nested_operations_counted_once():
+    @timed(TelemetryCategory.http)
+    def urlopen(retries: int) -> None:
+        if retries:
+            urlopen(retries - 1)
+
+    with collect_telemetry() as telemetry:
+        urlopen(retries=2)
+    assert telemetry.totals[TelemetryCategory.http].count == 1
+
+
+def test_latency_metrics():
+    record_view_latency("view_a_licence:application_list", 0.03)
+    record_view_latency("view_a_licence:application_list", 0.2)
+    record_view_latency("view_a_licence:application_list", 30)
+
+    metrics = get_latency_metrics()
+    assert 'django_view_duration_seconds_bucket{view="view_a_licence:application_list",le="0.025"} 0' in metrics
+    assert 'django_view_duration_seconds_bucket{view="view_a_licence:application_list",le="0.05"} 1' in metrics
+    assert 'django_view_duration_seconds_bucket{view="view_a_licence:application_list",le="10"} 2' in metrics
+    assert 'django_view_duration_seconds_bucket{view="view_a_licence:application_list",le="+Inf"} 3' in metrics
+    assert 'django_view_duration_seconds_count{view="view_a_licence:application_list"} 3' in metrics
+    assert 'django_view_duration_seconds_sum{view="view_a_licence:application_list"} 30.23' in metrics
+
+
+class TestTelemetryMiddleware:
+    def test_server_timing_for_staff(self, vl_client_logged_in):
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+        server_timing = response.headers["Server-Timing"]
+        assert server_timing.startswith("db;dur=")
+        assert "queries" in server_timing
+        assert "total;dur=" in server_timing
+
+    @patch("core.views.base_views.get_cached_pdf", return_value=b"pdf")
+    def test_server_timing_added_to_views(self, mocked_get_cached_pdf, vl_client_logged_in, licence):
+        licence.assign_reference()
+        licence.save()
+        response = vl_client_logged_in.get(reverse("view_a_licence:download_application"), data={"reference": licence.reference})
+        server_timing = response.headers["Server-Timing"]
+        # the PDF's phases are kept, alongside the request's
+        assert "pdf-cache;dur=" in server_timing
+        assert "total;dur=" in server_timing
+
+    @patch("core.views.base_views.get_cached_pdf", return_value=b"pdf")
+    def test_no_pdf_timings_for_applicants(self, mocked_get_cached_pdf, authenticated_al_client, licence):
+        licence.assign_reference()
+        licence.save()
+        response = authenticated_al_client.get(reverse("download_application"), data={"reference": licence.reference})
+        assert response.status_code == 200
+        assert "Server-Timing" not in response.headers
+
+    def test_no_server_timing_for_public(self, al_client):
+        response = al_client.get(reverse("privacy_notice"))
+        assert "Server-Timing" not in response.headers
+
+    def test_request_logged_and_recorded(self, vl_client_logged_in):
+        with patch("core.middleware.telemetry_logger") as mock_logger:
+            vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+
+        log = json.loads(mock_logger.info.call_args.args[0])
+        assert log["view"] == "view_a_licence:application_list"
+        assert log["status"] == 200
+        assert log["db_count"] > 0
+        assert 'view="view_a_licence:application_list"' in get_latency_metrics()
+
+    def test_disabled(self, settings, vl_client_logged_in):
+        settings.TELEMETRY_ENABLED = False
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+        assert "Server-Timing" not in response.headers
+        assert "view_a_licence" not in get_latency_metrics()
+
+
+class TestMetricsView:
+    def test_not_found_without_token(self, settings, al_client):
+        settings.TELEMETRY_METRICS_TOKEN = ""
+        response = al_client.get(reverse("telemetry_metrics"), HTTP_AUTHORIZATION="Bearer ")
+        assert response.status_code == 404
+
+    def test_wrong_token(self, settings, al_client):
+        settings.TELEMETRY_METRICS_TOKEN = "secret"
+        response = al_client.get(reverse("telemetry_metrics"), HTTP_AUTHORIZATION="Bearer wrong")
+        assert response.status_code == 403
+
+    def test_metrics(self, settings, client):
+        settings.TELEMETRY_METRICS_TOKEN = "secret"
+        record_view_latency("privacy_notice", 0.01)
+
+        # the metrics are scraped from an internal host name, that isn't one of the sites
+        response = client.get(reverse("telemetry_metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain")
+        assert 'django_view_duration_seconds_count{view="privacy_notice"} 1' in response.content.decode()
@@ -1,13 +1,16 @@
 from unittest.mock import MagicMock
 
 import pytest
+from core.telemetry import collect_telemetry
 from core.views.base_views import BaseDownloadPDFView
 from django.http import HttpResponse
 from django.test import RequestFactory
+from utils.pdf import PDFRenderingUnavailable, shutdown_browser_pool
 
 
 @pytest.fixture(autouse=True)
-def patched_playwright(monkeypatch):
+def patched_playwright(monkeypatch, settings):
+    settings.PDF_BROWSER_POOL_SIZE = 1
     mock_sync_playwright = MagicMock()
     mock_browser = MagicMock()
     mock_page = MagicMock()
@@ -15,13 +18,17 @@ def patched_playwright(monkeypatch):
     mock_sync_playwright.return_value.__enter__.return_value = mock_sync_playwright
     mock_sync_playwright.chromium.launch.return_value = mock_browser
     mock_browser.new_page.return_value = mock_page
+    mock_browser.is_connected.return_value = True
 
-    mock_page.pdf.return_value = None
+    mock_page.pdf.return_value = b"pdf"
+    mock_page.is_closed.return_value = False
     mock_browser.close.return_value = None
 
-    monkeypatch.setattr("core.views.base_views.sync_playwright", mock_sync_playwright)
+    monkeypatch.setattr("utils.pdf.sync_playwright", mock_sync_playwright)
 
-    return mock_sync_playwright, mock_browser, mock_page
+    yield mock_sync_playwright, mock_browser, mock_page
+
+    shutdown_browser_pool()
 
 
 class TestDownloadPDFView:
@@ -32,16 +39,92 @@ class TestDownloadPDFView:
 
         view = BaseDownloadPDFView()
         view.setup(request, reference=test_reference)
-        response = view.get(request, reference=test_reference)
+        with collect_telemetry() as telemetry:
+            response = view.get(request, reference=test_reference)
 
         expected_response = HttpResponse(status=200, content_type="application/pdf")
         assert response.status_code == expected_response.status_code
         assert response["content-type"] == expected_response["content-type"]
         assert response.headers["Content-Disposition"] == "inline; filename=" + f"application-{test_reference}.pdf"
+        assert response.content == b"pdf"
+        # the phases are added to the request's telemetry, which only sends them to staff
+        assert "Server-Timing" not in response.headers
+        server_timing = ", ".join(telemetry.server_timings)
+        for phase in ("cache", "template", "queue", "set_content", "fonts", "pdf"):
+            assert f"pdf-{phase};dur=" in server_timing
 
         mock_sync_playwright.chromium.launch.assert_called_once_with(headless=True)
         mock_browser.new_page.assert_called_once()
         mock_page.pdf.assert_called_once_with(
             format="A4", tagged=True, margin={"left": "1.25in", "right": "1.25in", "top": "1in", "bottom": "1in"}
         )
-        mock_browser.close.assert_called_once()
+        # the browser is kept open, so it can be reused by the next request
+        mock_browser.close.assert_not_called()
+
+    def test_browser_reused_between_requests(self, patched_playwright):
+        mock_sync_playwright, mock_browser, mock_page = patched_playwright
+        request = RequestFactory().get("?reference=DE1234")
+
+        for _ in range(3):
+            view = BaseDownloadPDFView()
+            view.setup(request)
+            assert view.get(request).status_code == 200
+
+        mock_sync_playwright.chromium.launch.assert_called_once_with(headless=True)
+        assert mock_page.pdf.call_count == 3
+
+    def test_rendering_unavailable(self, monkeypatch):
+        def raise_unavailable(*args, **kwargs):
+            raise PDFRenderingUnavailable()
+
+        monkeypatch.setattr("core.views.base_views.render_pdf", raise_unavailable)
+        request = RequestFactory().get("?reference=DE1234")
+
+        view = BaseDownloadPDFView()
+        view.setup(request)
+        response = view.get(request)
+        assert response.status_code == 503
+
+    def test_cached_pdf_served(self, patched_playwright, monkeypatch):
+        mock_sync_playwright, mock_browser, mock_page = patched_playwright
+        monkeypatch.setattr(BaseDownloadPDFView, "get_pdf_cache_key", lambda self: "pdf-cache/DE1234/key.pdf")
+        monkeypatch.setattr("core.views.base_views.get_cached_pdf", lambda cache_key: b"cached pdf")
+        request = RequestFactory().get("?reference=DE1234")
+
+        view = BaseDownloadPDFView()
+        view.setup(request)
+        response = view.get(request)
+
+        assert response.status_code == 200
+        assert response.content == b"cached pdf"
+        mock_page.pdf.assert_not_called()
+
+    def test_rendered_pdf_cached(self, patched_playwright, monkeypatch):
+        mock_cache_pdf = MagicMock()
+        monkeypatch.setattr(BaseDownloadPDFView, "get_pdf_cache_key", lambda self: "pdf-cache/DE1234/key.pdf")
+        monkeypatch.setattr("core.views.base_views.get_cached_pdf", lambda cache_key: None)
+        monkeypatch.setattr("core.views.base_views.wait_for_generated_pdf", lambda cache_key: False)
+        monkeypatch.setattr("core.views.base_views.cache_pdf", mock_cache_pdf)
+        request = RequestFactory().get("?reference=DE1234")
+
+        view = BaseDownloadPDFView()
+        view.setup(request)
+        response = view.get(request)
+
+        assert response.content == b"pdf"
+        mock_cache_pdf.assert_called_once_with("pdf-cache/DE1234/key.pdf", b"pdf")
+
+    def test_generated_pdf_served(self, patched_playwright, monkeypatch):
+        mock_sync_playwright, mock_browser, mock_page = patched_playwright
+        cached_pdfs = iter([None, b"generated pdf"])
+        monkeypatch.setattr(BaseDownloadPDFView, "get_pdf_cache_key", lambda self: "pdf-cache/DE1234/key.pdf")
+        monkeypatch.setattr("core.views.base_views.get_cached_pdf", lambda cache_key: next(cached_pdfs))
+        monkeypatch.setattr("core.views.base_views.wait_for_generated_pdf", lambda cache_key: True)
+        request = RequestFactory().get("?reference=DE1234")
+
+        view = BaseDownloadPDFView()
+        view.setup(request)
+        response = view.get(request)
+
+        assert response.content == b"generated pdf"
+        mock_page.pdf.assert_not_called()
@@ -0,0 +1,20 @@
+import threading
+
+import pytest
+from utils.background import run_in_background
+
+
+def test_run_in_background():
+    future = run_in_background(lambda value: (value, threading.current_thread().name), "test")
+    value, thread_name = future.result(timeout=5)
+    assert value == "test"
+    assert thread_name.startswith("background-task")
+
+
+def test_run_in_background_exception():
+    def failing_task():
+        raise ValueError("failed")
+
+    future = run_in_background(failing_task)
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from apply_for_a_licence.exceptions import (
+    CompaniesHouse500Error,
+    CompaniesHouseException,
+)
+from apply_for_a_licence.models import CompaniesHouseCompany
+from django.core.cache import cache
+from requests import ConnectTimeout
+from utils.companies_house import (
+    CircuitBreaker,
+    companies_house_circuit_breaker,
+    get_companies_house_cache_key,
+    get_details_from_companies_house,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    companies_house_circuit_breaker.record_success()
+    yield
+    cache.clear()
+    companies_house_circuit_breaker.record_success()
+
+
+def get_response(status_code: int, json: dict | None = None) -> MagicMock:
+    response = MagicMock(status_code=status_code)
+    response.json.return_value = json
+    return response
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_company_details_are_cached(mocked_get):
+    mocked_get.return_value.get.return_value = get_response(200, {"company_number": "12345678", "company_name": "Company"})
+
+    assert get_details_from_companies_house("12345678")["company_name"] == "Company"
+    assert get_details_from_companies_house("12345678")["company_name"] == "Company"
+    assert mocked_get.return_value.get.call_count == 1
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_unknown_company_is_cached(mocked_get):
+    mocked_get.return_value.get.return_value = get_response(404)
+
+    for _ in range(2):
+        with pytest.raises(CompaniesHouseException):
+            get_details_from_companies_house("12345678")
+    assert mocked_get.return_value.get.call_count == 1
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_server_error_is_not_cached(mocked_get):
+    mocked_get.return_value.get.return_value = get_response(500)
+
+    for _ in range(2):
+        with pytest.raises(CompaniesHouse500Error):
+            get_details_from_companies_house("12345678")
+    assert mocked_get.return_value.get.call_count == 2
+    # the lock is released, so the next lookup doesn't wait
+    assert cache.get(f"{get_companies_house_cache_key('12345678')}:lock") is None
+
+
+@pytest.mark.parametrize("status_code", [401, 403, 429])
+@patch("utils.companies_house.get_companies_house_session")
+def test_api_key_error_is_not_cached(mocked_get, status_code, settings):
+    mocked_get.return_value.get.return_value = get_response(status_code)
+
+    for _ in range(settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD):
+        with pytest.raises(CompaniesHouse500Error):
+            get_details_from_companies_house("12345678")
+    assert mocked_get.return_value.get.call_count == settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD
+    # each error counts towards the circuit breaker, which is now open
+    assert not companies_house_circuit_breaker.allow_request()
+
+
+@patch("utils.companies_house.time.sleep")
+@patch("utils.companies_house.get_companies_house_session")
+def test_waits_for_concurrent_lookup(mocked_get, mocked_sleep):
+    cache_key = get_companies_house_cache_key("12345678")
+    # another request is looking up the same number, and caches its result while we wait
+    cache.add(f"{cache_key}:lock", True)
+    mocked_sleep.side_effect = lambda seconds: cache.set(cache_key, {"company_details": {"company_name": "Company"}})
+
+    assert get_details_from_companies_house("12345678") == {"company_name": "Company"}
+    assert not mocked_get.return_value.get.called
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_circuit_breaker_opens(mocked_get, settings):
+    mocked_get.return_value.get.side_effect = ConnectTimeout
+
+    for number in range(settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD):
+        with pytest.raises(CompaniesHouse500Error):
+            get_details_from_companies_house(f"1234567{number}")
+    assert mocked_get.return_value.get.call_count == settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD
+
+    # the breaker is open, so Companies House isn't called
+    with pytest.raises(CompaniesHouse500Error):
+        get_details_from_companies_house("87654321")
+    assert mocked_get.return_value.get.call_count == settings.COMPANIES_HOUSE_CIRCUIT_BREAKER_THRESHOLD
+
+
+@patch("utils.companies_house.time.monotonic")
+def test_circuit_breaker_half_open(mocked_monotonic):
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    mocked_monotonic.return_value = 100
+    circuit_breaker.record_failure()
+    assert circuit_breaker.allow_request()
+    circuit_breaker.record_failure()
+    assert not circuit_breaker.allow_request()
+
+    # after the reset timeout, one request is let through to test the service
+    mocked_monotonic.return_value = 131
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+
+    circuit_breaker.record_success()
+    assert circuit_breaker.allow_request()
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_company_in_snapshot(mocked_get):
+    CompaniesHouseCompany.objects.create(company_number="12345678", company_name="Company", snapshot_date=date.today())
+
+    assert get_details_from_companies_house("12345678")["company_name"] == "Company"
+    assert not mocked_get.return_value.get.called
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_out_of_date_company_in_snapshot(mocked_get, settings):
+    snapshot_date = date.today() - timedelta(days=settings.COMPANIES_HOUSE_SNAPSHOT_MAX_AGE_DAYS + 1)
+    CompaniesHouseCompany.objects.create(company_number="12345678", company_name="Old name", snapshot_date=snapshot_date)
+    mocked_get.return_value.get.return_value = get_response(200, {"company_number": "12345678", "company_name": "New name"})
+
+    assert get_details_from_companies_house("12345678")["company_name"] == "New name"
+
+
+@patch("utils.companies_house.get_companies_house_session")
+def test_out_of_date_company_in_snapshot_when_companies_house_is_down(mocked_get, settings):
+    snapshot_date = date.today() - timedelta(days=settings.COMPANIES_HOUSE_SNAPSHOT_MAX_AGE_DAYS + 1)
+    CompaniesHouseCompany.objects.create(company_number="12345678", company_name="Old name", snapshot_date=snapshot_date)
+    mocked_get.return_value.get.side_effect = ConnectTimeout
+
+    assert get_details_from_companies_house("12345678")["company_name"] == "Old name"
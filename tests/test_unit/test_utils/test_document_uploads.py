@@ -0,0 +1,134 @@
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+from django.core.cache import cache
+from freezegun import freeze_time
+from utils.document_uploads import (
+    DocumentUploadStatus,
+    check_uploaded_document,
+    count_session_documents,
+    get_document_upload_statuses,
+    set_document_upload_status,
+)
+from utils.s3 import get_user_uploaded_files
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89"
+
+
+def get_mocked_s3_client(content: bytes) -> MagicMock:
+    s3_client = MagicMock()
+    s3_client.head_object.return_value = {"ContentLength": len(content), "ETag": '"checked-version"'}
+    s3_client.get_object.return_value = {"Body": MagicMock()}
+    s3_client.get_object.return_value["Body"].read.return_value = content
+    s3_client.get_object.return_value["Body"].iter_chunks.return_value = [content]
+    return s3_client
+
+
+@patch("utils.document_uploads.scan_document_for_viruses", return_value=True)
+@patch("utils.document_uploads.get_s3_client_from_storage")
+def test_check_uploaded_document_passed(mocked_get_s3_client, mocked_scan_document_for_viruses, request_object):
+    cache.clear()
+    mocked_get_s3_client.return_value = get_mocked_s3_client(PNG_HEADER)
+    set_document_upload_status(request_object.session.session_key, "test.png", DocumentUploadStatus.pending)
+
+    check_uploaded_document(request_object.session.session_key, "test.png")
+
+    session_key = request_object.session.session_key
+    assert get_document_upload_statuses(session_key)["test.png"]["status"] == "passed"
+    assert get_user_uploaded_files(request_object.session) == ["test.png"]
+    # only the version that was checked is kept, somewhere the browser can't upload to
+    mocked_get_s3_client.return_value.copy_object.assert_called_once_with(
+        Bucket="temporary-document-bucket",
+        Key=f"{session_key}/test.png",
+        CopySource={"Bucket": "temporary-document-bucket", "Key": f"direct-uploads/{session_key}/test.png"},
+        CopySourceIfMatch='"checked-version"',
+    )
+    mocked_get_s3_client.return_value.delete_object.assert_called_once_with(
+        Bucket="temporary-document-bucket", Key=f"direct-uploads/{session_key}/test.png"
+    )
+
+
+@patch("utils.document_uploads.scan_document_for_viruses", return_value=True)
+@patch("utils.document_uploads.get_s3_client_from_storage")
+def test_check_uploaded_document_replaced(mocked_get_s3_client, mocked_scan_document_for_viruses, request_object):
+    cache.clear()
+    mocked_get_s3_client.return_value = get_mocked_s3_client(PNG_HEADER)
+    # the browser uploaded something else to the staging key while the document was being checked
+    mocked_get_s3_client.return_value.copy_object.side_effect = ClientError(
+        {"Error": {"Code": "PreconditionFailed"}}, "CopyObject"
+    )
+
+    check_uploaded_document(request_object.session.session_key, "test.png")
+
+    assert get_document_upload_statuses(request_object.session.session_key)["test.png"]["status"] == "failed"
+    assert get_user_uploaded_files(request_object.session) == []
+    mocked_get_s3_client.return_value.delete_object.assert_called_once()
+
+
+@patch("utils.document_uploads.scan_document_for_viruses", return_value=False)
+@patch("utils.document_uploads.get_s3_client_from_storage")
+def test_check_uploaded_document_virus(mocked_get_s3_client, mocked_scan_document_for_viruses, request_object):
+    cache.clear()
+    mocked_get_s3_client.return_value = get_mocked_s3_client(PNG_HEADER)
+
+    check_uploaded_document(request_object.session.session_key, "test.png")
+
+    upload_status = get_document_upload_statuses(request_object.session.session_key)["test.png"]
+    assert upload_status["status"] == "failed"
+    assert upload_status["error"] == "The selected file contains a virus"
+    assert get_user_uploaded_files(request_object.session) == []
+    mocked_get_s3_client.return_value.delete_object.assert_called_once()
+
+
+@patch("utils.document_uploads.scan_document_for_viruses")
+@patch("utils.document_uploads.get_s3_client_from_storage")
+def test_check_uploaded_document_invalid_type(mocked_get_s3_client, mocked_scan_document_for_viruses, request_object):
+    cache.clear()
+    # a GIF, renamed to look like a PNG
+    mocked_get_s3_client.return_value = get_mocked_s3_client(b"GIF89a\x01\x00\x01\x00")
+
+    check_uploaded_document(request_object.session.session_key, "test.png")
+
+    upload_status = get_document_upload_statuses(request_object.session.session_key)["test.png"]
+    assert upload_status["status"] == "failed"
+    assert "test.png cannot be uploaded" in upload_status["error"]
+    # the virus scan isn't needed
+    assert not mocked_scan_document_for_viruses.called
+    mocked_get_s3_client.return_value.delete_object.assert_called_once()
+
+
+@patch("utils.document_uploads.scan_document_for_viruses", side_effect=ConnectionResetError)
+@patch("utils.document_uploads.get_s3_client_from_storage")
+def test_check_uploaded_document_unexpected_error(mocked_get_s3_client, mocked_scan_document_for_viruses, request_object):
+    cache.clear()
+    mocked_get_s3_client.return_value = get_mocked_s3_client(PNG_HEADER)
+
+    check_uploaded_document(request_object.session.session_key, "test.png")
+
+    # the browser isn't left waiting for it
+    upload_status = get_document_upload_statuses(request_object.session.session_key)["test.png"]
+    assert upload_status["status"] == "failed"
+    assert upload_status["error"] == "test.png could not be uploaded, try again"
+    mocked_get_s3_client.return_value.delete_object.assert_called_once()
+
+
+def test_abandoned_uploads_not_counted(request_object, settings):
+    cache.clear()
+    session_key = request_object.session.session_key
+    with freeze_time("2024-01-01 12:00:00"):
+        set_document_upload_status(session_key, "abandoned.png", DocumentUploadStatus.pending)
+        set_document_upload_status(session_key, "stuck.png", DocumentUploadStatus.checking)
+    with freeze_time("2024-01-01 12:04:00"):
+        set_document_upload_status(session_key, "uploading.png", DocumentUploadStatus.pending)
+
+    with freeze_time("2024-01-01 12:06:00"):
+        upload_statuses = get_document_upload_statuses(session_key)
+        assert upload_statuses["abandoned.png"]["status"] == "pending"
+        assert upload_statuses["stuck.png"]["status"] == "failed"
+        assert count_session_documents(session_key) == 2
+
+    with freeze_time("2024-01-01 12:16:00"):
+        upload_statuses = get_document_upload_statuses(session_key)
+        assert upload_statuses["abandoned.png"]["status"] == "failed"
+        assert upload_statuses["uploading.png"]["status"] == "pending"
+        assert count_session_documents(session_key) == 1
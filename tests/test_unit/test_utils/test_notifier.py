@@ -1,8 +1,27 @@
-from unittest.mock import patch
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
 
+import pytest
+from core.models import OutboxEmail, OutboxEmailStatus
+from django.db import transaction
 from django.test import override_settings
+from django.utils import timezone
 from notifications_python_client.errors import HTTPError
-from utils.notifier import send_email
+from utils import notifier
+from utils.notifier import (
+    claim_queued_emails,
+    queue_email,
+    queue_emails,
+    send_email,
+    send_queued_emails,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_notify_client():
+    notifier._notify_client = None
+    yield
+    notifier._notify_client = None
 
 
 @patch("utils.notifier.NotificationsAPIClient", autospec=True)
@@ -34,3 +53,135 @@ def test_failure_to_send_email():
             )
             assert response is False
             assert patched_sentry_sdk.capture_exception.call_count == 1
+
+
+def get_http_error(status_code: int) -> HTTPError:
+    return HTTPError(response=MagicMock(status_code=status_code))
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    @patch("utils.notifier.run_in_background")
+    def test_queue_email(self, mocked_run_in_background, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            outbox_email = queue_email(email="test@example.com", context={"name": "John"}, template_id="123456")
+
+        assert outbox_email.status == OutboxEmailStatus.pending
+        assert outbox_email.personalisation == {"name": "John", "footer": "Apply for a Licence service"}
+        # the emails are sent straight away once the transaction has been committed
+        mocked_run_in_background.assert_called_once_with(send_queued_emails)
+
+    @patch("utils.notifier.run_in_background")
+    def test_one_batch_is_sent_per_transaction(self, mocked_run_in_background, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                queue_email(email="first@example.com", context={}, template_id="123456")
+                queue_email(email="second@example.com", context={}, template_id="123456")
+                queue_emails(["third@example.com", "fourth@example.com"], context={}, template_id="123456")
+
+        mocked_run_in_background.assert_called_once_with(send_queued_emails)
+
+    @patch("utils.notifier.run_in_background")
+    def test_batch_is_sent_after_rolled_back_savepoint(self, mocked_run_in_background, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        queue_email(email="first@example.com", context={}, template_id="123456")
+                        raise ValueError
+                except ValueError:
+                    pass
+                queue_email(email="second@example.com", context={}, template_id="123456")
+
+        mocked_run_in_background.assert_called_once_with(send_queued_emails)
+
+    @patch("utils.notifier.NotificationsAPIClient", autospec=True)
+    def test_send_queued_emails(self, patched_api_client):
+        patched_api_client.return_value.send_email_notification.return_value = {"id": "notification-id"}
+        outbox_email = OutboxEmail.objects.create(email="test@example.com", template_id="123456", reference="reference")
+        OutboxEmail.objects.create(
+            email="later@example.com", template_id="123456", next_attempt_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        assert send_queued_emails() == 1
+
+        patched_api_client.return_value.send_email_notification.assert_called_once_with(
+            email_address="test@example.com", template_id="123456", personalisation={}, reference="reference"
+        )
+        outbox_email.refresh_from_db()
+        assert outbox_email.status == OutboxEmailStatus.sent
+        assert outbox_email.notification_id == "notification-id"
+        assert outbox_email.sent_at
+        assert outbox_email.claimed_at is None
+
+    def test_emails_are_claimed_before_sending(self):
+        outbox_email = OutboxEmail.objects.create(email="test@example.com", template_id="123456")
+
+        assert claim_queued_emails(batch_size=10) == [outbox_email]
+
+        outbox_email.refresh_from_db()
+        assert outbox_email.status == OutboxEmailStatus.sending
+        assert outbox_email.claimed_at
+        # another worker skips it while it's being sent, without having to wait for the first to finish
+        assert send_queued_emails() == 0
+
+    @patch("utils.notifier.NotificationsAPIClient", autospec=True)
+    def test_abandoned_claim_is_sent(self, patched_api_client, settings):
+        settings.NOTIFY_OUTBOX_CLAIM_TIMEOUT_SECONDS = 60
+        patched_api_client.return_value.send_email_notification.return_value = {"id": "notification-id"}
+        abandoned = OutboxEmail.objects.create(
+            email="abandoned@example.com",
+            template_id="123456",
+            status=OutboxEmailStatus.sending,
+            claimed_at=timezone.now() - timedelta(seconds=61),
+        )
+        OutboxEmail.objects.create(
+            email="sending@example.com", template_id="123456", status=OutboxEmailStatus.sending, claimed_at=timezone.now()
+        )
+
+        assert send_queued_emails() == 1
+
+        abandoned.refresh_from_db()
+        assert abandoned.status == OutboxEmailStatus.sent
+
+    @patch("utils.notifier.NotificationsAPIClient", autospec=True)
+    def test_failed_email_is_retried(self, patched_api_client, settings):
+        settings.NOTIFY_OUTBOX_RETRY_BACKOFF_SECONDS = 60
+        patched_api_client.return_value.send_email_notification.side_effect = get_http_error(500)
+        outbox_email = OutboxEmail.objects.create(email="test@example.com", template_id="123456")
+
+        send_queued_emails()
+
+        outbox_email.refresh_from_db()
+        assert outbox_email.status == OutboxEmailStatus.pending
+        assert outbox_email.attempts == 1
+        assert "500" in outbox_email.last_error
+        assert timezone.now() + timedelta(seconds=25) < outbox_email.next_attempt_at < timezone.now() + timedelta(seconds=61)
+        # it's not due yet
+        assert send_queued_emails() == 0
+
+    @patch("utils.notifier.sentry_sdk", autospec=True)
+    @patch("utils.notifier.NotificationsAPIClient", autospec=True)
+    def test_email_is_dead_lettered_after_max_attempts(self, patched_api_client, patched_sentry_sdk, settings):
+        settings.NOTIFY_OUTBOX_MAX_ATTEMPTS = 2
+        patched_api_client.return_value.send_email_notification.side_effect = get_http_error(503)
+        outbox_email = OutboxEmail.objects.create(email="test@example.com", template_id="123456", attempts=1)
+
+        send_queued_emails()
+
+        outbox_email.refresh_from_db()
+        assert outbox_email.status == OutboxEmailStatus.dead
+        assert outbox_email.attempts == 2
+        patched_sentry_sdk.capture_exception.assert_called_once()
+
+    @patch("utils.notifier.sentry_sdk", autospec=True)
+    @patch("utils.notifier.NotificationsAPIClient", autospec=True)
+    def test_rejected_email_is_not_retried(self, patched_api_client, patched_sentry_sdk):
+        patched_api_client.return_value.send_email_notification.side_effect = get_http_error(400)
+        outbox_email = OutboxEmail.objects.create(email="test@example.com", template_id="123456")
+
+        send_queued_emails()
+
+        outbox_email.refresh_from_db()
+        assert outbox_email.status == OutboxEmailStatus.dead
+        assert outbox_email.attempts == 1
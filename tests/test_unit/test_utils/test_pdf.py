@@ -0,0 +1,311 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from io import BytesIO
+from unittest.mock import ANY, MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+from utils.pdf import (
+    BrowserPool,
+    BrowserWorker,
+    PDFGenerationStatus,
+    PDFRenderingUnavailable,
+    PhaseTimer,
+    RenderedPDF,
+    cache_pdf,
+    generate_licence_pdfs,
+    get_cached_pdf,
+    get_licence_pdf_cache_key,
+    get_pdf_generation_status,
+    record_pdf_metrics,
+    schedule_licence_pdf_generation,
+    set_pdf_generation_status,
+    shutdown_browser_pool,
+    start_browser_pool,
+    wait_for_generated_pdf,
+)
+
+from tests.factories import LicenceFactory
+
+
+@pytest.fixture()
+def mock_playwright(monkeypatch):
+    mock_sync_playwright = MagicMock()
+    mock_sync_playwright.return_value.__enter__.return_value = mock_sync_playwright
+
+    def new_browser(*args, **kwargs):
+        browser = MagicMock()
+        browser.is_connected.return_value = True
+        browser.new_page.return_value.is_closed.return_value = False
+        browser.new_page.return_value.pdf.return_value = b"pdf"
+        browser.new_page.return_value.context.new_cdp_session.return_value.send.return_value = {
+            "metrics": [{"name": "JSHeapUsedSize", "value": 1024}]
+        }
+        return browser
+
+    mock_sync_playwright.chromium.launch.side_effect = new_browser
+    monkeypatch.setattr("utils.pdf.sync_playwright", mock_sync_playwright)
+    return mock_sync_playwright
+
+
+@pytest.fixture()
+def browser_pool():
+    pool = BrowserPool(size=1, max_renders=2, queue_size=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_browser_recycled_after_max_renders(mock_playwright, browser_pool):
+    for _ in range(5):
+        assert browser_pool.render("<html></html>").data == b"pdf"
+
+    # one browser launched up front, then recycled after every 2 renders
+    assert mock_playwright.chromium.launch.call_count == 3
+
+
+def test_start_browser_pool_launches_browsers(mock_playwright, settings):
+    settings.PDF_BROWSER_POOL_SIZE = 2
+    try:
+        start_browser_pool()
+
+        # the browsers are launched by the worker threads, without waiting for a render
+        for _ in range(100):
+            if mock_playwright.chromium.launch.call_count == 2:
+                break
+            time.sleep(0.01)
+        assert mock_playwright.chromium.launch.call_count == 2
+    finally:
+        shutdown_browser_pool()
+
+
+def test_unhealthy_browser_replaced(mock_playwright, browser_pool):
+    assert browser_pool.render("<html></html>").data == b"pdf"
+    browser = browser_pool.workers[0].browser
+    browser.is_connected.return_value = False
+
+    assert browser_pool.render("<html></html>").data == b"pdf"
+    browser.close.assert_called_once()
+    assert mock_playwright.chromium.launch.call_count == 2
+
+
+def test_render_error_is_raised_and_browser_discarded(mock_playwright, browser_pool):
+    assert browser_pool.render("<html></html>").data == b"pdf"
+    browser = browser_pool.workers[0].browser
+    browser.new_page.return_value.pdf.side_effect = Exception("Chromium crashed")
+
+    with pytest.raises(Exception, match="Chromium crashed"):
+        browser_pool.render("<html></html>")
+
+    browser.close.assert_called_once()
+    assert browser_pool.render("<html></html>").data == b"pdf"
+
+
+def test_full_queue_raises_unavailable(settings):
+    settings.PDF_RENDER_QUEUE_TIMEOUT = 0
+    pool = BrowserPool(size=0, max_renders=2, queue_size=1)
+    pool.jobs.put(("<html></html>", Future(), PhaseTimer()))
+
+    with pytest.raises(PDFRenderingUnavailable):
+        pool.render("<html></html>")
+
+
+def test_render_timeout_raises_unavailable(settings):
+    settings.PDF_RENDER_TIMEOUT = 0
+    # no workers, so nothing will ever pick the job up
+    pool = BrowserPool(size=0, max_renders=2, queue_size=1)
+
+    with pytest.raises(PDFRenderingUnavailable):
+        pool.render("<html></html>")
+
+    # the job was cancelled, so a worker won't waste time rendering it
+    _, future, _ = pool.jobs.get_nowait()
+    assert future.cancelled()
+
+
+def test_render_phases_timed(mock_playwright, browser_pool):
+    rendered_pdf = browser_pool.render("<html></html>")
+    assert set(rendered_pdf.timer.phases) == {"queue", "set_content", "fonts", "pdf"}
+    assert rendered_pdf.browser_memory == 1024
+
+    # the browser was launched up front, until it's recycled
+    browser_pool.render("<html></html>")
+    rendered_pdf = browser_pool.render("<html></html>")
+    assert "launch" in rendered_pdf.timer.phases
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    timer.record("template", 10.0, 10.0125)
+    timer.record("pdf", 10.0125, 10.5)
+
+    assert timer.durations == {"template": 12.5, "pdf": 487.5}
+    assert timer.server_timing() == "pdf-template;dur=12.5, pdf-pdf;dur=487.5"
+
+
+@patch("utils.pdf.sentry_sdk.start_span")
+def test_record_pdf_metrics(mocked_start_span, caplog):
+    timer = PhaseTimer()
+    timer.record("template", 10.0, 10.5)
+
+    with caplog.at_level("INFO", logger="utils.pdf"):
+        record_pdf_metrics("ABC123", timer, pdf_size=2048, browser_memory=1024)
+
+    assert caplog.records[0].pdf_timings_ms == {"template": 500.0}
+    assert caplog.records[0].pdf_size_bytes == 2048
+    assert mocked_start_span.call_args.kwargs["op"] == "pdf.template"
+    mocked_start_span.return_value.finish.assert_called_once()
+
+
+def test_worker_skips_cancelled_jobs(mock_playwright):
+    jobs = queue.Queue()
+    cancelled_future = Future()
+    cancelled_future.cancel()
+    future = Future()
+    timer = PhaseTimer()
+    timer.start("queue")
+    jobs.put(("<html>cancelled</html>", cancelled_future, PhaseTimer()))
+    jobs.put(("<html></html>", future, timer))
+    jobs.put(None)
+
+    worker = BrowserWorker(jobs, max_renders=10)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert future.result().data == b"pdf"
+    # only the job that was still wanted was rendered
+    assert worker.renders == 1
+    assert worker.browser is None
+
+
+@pytest.mark.django_db
+class TestPDFCache:
+    def test_cache_key_changes_when_licence_modified(self):
+        licence = LicenceFactory(reference="ABC123")
+        cache_key = get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html")
+        assert cache_key.startswith("pdf-cache/ABC123/")
+
+        licence.save()
+        assert get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html") != cache_key
+
+    def test_cache_key_depends_on_template(self, settings):
+        licence = LicenceFactory()
+        cache_key = get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html")
+        assert get_licence_pdf_cache_key(licence, "apply_for_a_licence/download_application_pdf.html") != cache_key
+
+        settings.PDF_TEMPLATE_VERSION = "new"
+        assert get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html") != cache_key
+
+    @patch("utils.pdf.get_s3_client_from_storage")
+    def test_get_cached_pdf(self, mocked_get_s3_client):
+        mocked_get_s3_client.return_value.get_object.return_value = {"Body": BytesIO(b"pdf")}
+        assert get_cached_pdf("pdf-cache/ABC123/key.pdf") == b"pdf"
+
+    @patch("utils.pdf.get_s3_client_from_storage")
+    def test_get_cached_pdf_missing(self, mocked_get_s3_client):
+        mocked_get_s3_client.return_value.get_object.side_effect = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        assert get_cached_pdf("pdf-cache/ABC123/key.pdf") is None
+
+    @patch("utils.pdf.get_s3_client_from_storage")
+    def test_get_cached_pdf_disabled(self, mocked_get_s3_client, settings):
+        settings.PDF_CACHE_ENABLED = False
+        assert get_cached_pdf("pdf-cache/ABC123/key.pdf") is None
+        mocked_get_s3_client.assert_not_called()
+
+    @patch("utils.pdf.get_s3_client_from_storage")
+    def test_cache_pdf_removes_old_versions(self, mocked_get_s3_client):
+        s3_client = mocked_get_s3_client.return_value
+        s3_client.list_objects_v2.return_value = {
+            "Contents": [{"Key": "pdf-cache/ABC123/old.pdf"}, {"Key": "pdf-cache/ABC123/new.pdf"}]
+        }
+
+        cache_pdf("pdf-cache/ABC123/new.pdf", b"pdf")
+
+        assert s3_client.put_object.call_args.kwargs["Key"] == "pdf-cache/ABC123/new.pdf"
+        assert s3_client.put_object.call_args.kwargs["Body"] == b"pdf"
+        s3_client.delete_objects.assert_called_once_with(Bucket=ANY, Delete={"Objects": [{"Key": "pdf-cache/ABC123/old.pdf"}]})
+
+
+@pytest.mark.django_db
+class TestPDFGeneration:
+    templates = {"view_a_licence/view_application_pdf.html": "header"}
+
+    @patch("utils.pdf.run_in_background")
+    def test_schedule_marks_pdfs_as_pending(self, mocked_run_in_background):
+        licence = LicenceFactory(reference="ABC123")
+        schedule_licence_pdf_generation("ABC123", self.templates)
+
+        cache_key = get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html")
+        assert get_pdf_generation_status(cache_key) == PDFGenerationStatus.pending
+        mocked_run_in_background.assert_called_once_with(generate_licence_pdfs, "ABC123", self.templates)
+
+    @patch("utils.pdf.run_in_background")
+    def test_schedule_disabled(self, mocked_run_in_background, settings):
+        settings.PDF_GENERATION_ENABLED = False
+        LicenceFactory(reference="ABC123")
+        schedule_licence_pdf_generation("ABC123", self.templates)
+        mocked_run_in_background.assert_not_called()
+
+    @patch("utils.pdf.cache_pdf", return_value=True)
+    @patch("utils.pdf.render_pdf", return_value=RenderedPDF(data=b"pdf"))
+    def test_generate(self, mocked_render_pdf, mocked_cache_pdf):
+        licence = LicenceFactory(reference="ABC123")
+        generate_licence_pdfs("ABC123", self.templates)
+
+        cache_key = get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html")
+        mocked_cache_pdf.assert_called_once_with(cache_key, b"pdf")
+        assert get_pdf_generation_status(cache_key) == PDFGenerationStatus.ready
+        assert "ABC123" in mocked_render_pdf.call_args.args[0]
+
+    @patch("utils.pdf.time.sleep")
+    @patch("utils.pdf.cache_pdf", return_value=True)
+    @patch("utils.pdf.render_pdf")
+    def test_generate_retries(self, mocked_render_pdf, mocked_cache_pdf, mocked_sleep, settings):
+        settings.PDF_GENERATION_ATTEMPTS = 3
+        settings.PDF_GENERATION_RETRY_BACKOFF = 2
+        mocked_render_pdf.side_effect = [PDFRenderingUnavailable(), PDFRenderingUnavailable(), RenderedPDF(data=b"pdf")]
+        licence = LicenceFactory(reference="ABC123")
+        generate_licence_pdfs("ABC123", self.templates)
+
+        assert [sleep_call.args[0] for sleep_call in mocked_sleep.call_args_list] == [2, 4]
+        cache_key = get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html")
+        assert get_pdf_generation_status(cache_key) == PDFGenerationStatus.ready
+
+    @patch("utils.pdf.time.sleep")
+    @patch("utils.pdf.cache_pdf")
+    @patch("utils.pdf.render_pdf", side_effect=PDFRenderingUnavailable())
+    def test_generate_fails(self, mocked_render_pdf, mocked_cache_pdf, mocked_sleep, settings):
+        settings.PDF_GENERATION_ATTEMPTS = 3
+        licence = LicenceFactory(reference="ABC123")
+        generate_licence_pdfs("ABC123", self.templates)
+
+        assert mocked_render_pdf.call_count == 3
+        mocked_cache_pdf.assert_not_called()
+        cache_key = get_licence_pdf_cache_key(licence, "view_a_licence/view_application_pdf.html")
+        assert get_pdf_generation_status(cache_key) == PDFGenerationStatus.failed
+
+
+class TestWaitForGeneratedPDF:
+    def test_not_being_generated(self):
+        assert wait_for_generated_pdf("pdf-cache/ABC123/unknown.pdf") is False
+
+    def test_ready(self):
+        set_pdf_generation_status("pdf-cache/ABC123/ready.pdf", PDFGenerationStatus.ready)
+        assert wait_for_generated_pdf("pdf-cache/ABC123/ready.pdf") is True
+
+    @patch("utils.pdf.time.sleep")
+    def test_waits_until_ready(self, mocked_sleep):
+        cache_key = "pdf-cache/ABC123/generating.pdf"
+        set_pdf_generation_status(cache_key, PDFGenerationStatus.generating)
+        mocked_sleep.side_effect = lambda seconds: set_pdf_generation_status(cache_key, PDFGenerationStatus.ready)
+
+        assert wait_for_generated_pdf(cache_key) is True
+        assert mocked_sleep.call_count == 1
+
+    @patch("utils.pdf.time.sleep")
+    def test_gives_up(self, mocked_sleep, settings):
+        settings.PDF_GENERATION_WAIT = 0
+        set_pdf_generation_status("pdf-cache/ABC123/pending.pdf", PDFGenerationStatus.pending)
+        assert wait_for_generated_pdf("pdf-cache/ABC123/pending.pdf") is False
@@ -1,39 +1,136 @@
 from unittest.mock import MagicMock, Mock, patch
 
+from botocore.exceptions import ClientError
 from django.core.cache import cache
-from utils.s3 import get_all_session_files
+from utils.s3 import (
+    add_user_uploaded_file,
+    delete_session_files,
+    get_all_session_files,
+    get_uploaded_files_cache_key,
+    store_documents_in_permanent_bucket,
+)
 
 
-@patch("utils.s3.get_s3_client_from_storage")
-def test_get_all_session_files(mocked_get_s3_client):
-    mocked_get_s3_client.return_value = MagicMock()
-    mocked_get_s3_client.return_value.list_objects_v2 = MagicMock(return_value={"Contents": [{"Key": "test.png"}]})
-
+def get_session_object(is_empty: bool = False) -> MagicMock:
     session_object = MagicMock()
-    session_object.is_empty = MagicMock(return_value=False)
-    session_object.get = MagicMock(return_value=["test.png"])
-
+    session_object.is_empty = MagicMock(return_value=is_empty)
     session_object.session_key = "test_session_key"
-    redis_cache_key = f"{session_object.session_key}"
-    cache.set(redis_cache_key, "test.png")
+    return session_object
+
+
+def test_get_all_session_files():
+    cache.clear()
+    session_object = get_session_object()
+    add_user_uploaded_file(session_object, "test.png")
 
     session_files = get_all_session_files(Mock(), session_object)
     assert len(session_files) == 1
-    assert "test.png" in session_files
+    assert session_files["test_session_key/test.png"]["file_name"] == "test.png"
+
+
+def test_no_session_returns_empty_session_files():
+    cache.clear()
+    session_object = get_session_object(is_empty=True)
+    add_user_uploaded_file(session_object, "test.png")
+
+    session_files = get_all_session_files(Mock(), session_object)
+    assert len(session_files) == 0
 
 
 @patch("utils.s3.get_s3_client_from_storage")
-def test_no_session_returns_empty_session_files(mocked_get_s3_client):
-    mocked_get_s3_client.return_value = MagicMock()
-    mocked_get_s3_client.return_value.list_objects_v2 = MagicMock(return_value={"Contents": [{"Key": "test.png"}]})
+def test_get_all_session_files_reconciled_with_s3(mocked_get_s3_client):
+    cache.clear()
+    mocked_get_s3_client.return_value.get_paginator.return_value.paginate.return_value = [
+        {"Contents": [{"Key": "test_session_key/test.png"}]},
+        {"Contents": [{"Key": "test_session_key/another.png"}]},
+    ]
+    session_object = get_session_object()
+    add_user_uploaded_file(session_object, "test.png")
+    add_user_uploaded_file(session_object, "another.png")
+    add_user_uploaded_file(session_object, "expired.png")
 
-    session_object = MagicMock()
-    session_object.is_empty = MagicMock(return_value=True)
-    session_object.get = MagicMock(return_value=["test.png"])
+    session_files = get_all_session_files(Mock(), session_object, reconcile=True)
+    assert list(session_files) == ["test_session_key/another.png", "test_session_key/test.png"]
+    # the missing file is removed from the index, so it isn't listed again
+    assert set(cache.hgetall(get_uploaded_files_cache_key("test_session_key"))) == {"test.png", "another.png"}
 
-    session_object.session_key = "test_session_key"
-    redis_cache_key = f"{session_object.session_key}"
-    cache.set(redis_cache_key, "test.png")
+
+@patch("utils.s3.get_s3_client_from_storage")
+def test_index_rebuilt_from_s3(mocked_get_s3_client):
+    cache.clear()
+    paginate = mocked_get_s3_client.return_value.get_paginator.return_value.paginate
+    # uploaded before there was an index
+    paginate.return_value = [{"Contents": [{"Key": "test_session_key/old.png"}]}]
+    session_object = get_session_object()
 
     session_files = get_all_session_files(Mock(), session_object)
-    assert len(session_files) == 0
+    assert list(session_files) == ["test_session_key/old.png"]
+    assert cache.hgetall(get_uploaded_files_cache_key("test_session_key")) == {"old.png": "test_session_key/old.png"}
+
+    # it's only rebuilt once, so a session without any files doesn't list the bucket every time
+    cache.delete(get_uploaded_files_cache_key("test_session_key"))
+    assert get_all_session_files(Mock(), session_object) == {}
+    assert paginate.call_count == 1
+
+
+@patch("utils.s3.get_s3_client_from_storage")
+def test_reconcile_adds_unindexed_files(mocked_get_s3_client):
+    cache.clear()
+    mocked_get_s3_client.return_value.get_paginator.return_value.paginate.return_value = [
+        {"Contents": [{"Key": "test_session_key/test.png"}, {"Key": "test_session_key/old.png"}]},
+    ]
+    session_object = get_session_object()
+    add_user_uploaded_file(session_object, "test.png")
+
+    session_files = get_all_session_files(Mock(), session_object, reconcile=True)
+    assert list(session_files) == ["test_session_key/old.png", "test_session_key/test.png"]
+    assert set(cache.hgetall(get_uploaded_files_cache_key("test_session_key"))) == {"test.png", "old.png"}
+
+
+@patch("utils.s3.get_s3_client_from_storage")
+def test_delete_session_files(mocked_get_s3_client):
+    cache.clear()
+    s3_client = mocked_get_s3_client.return_value
+    s3_client.get_paginator.return_value.paginate.return_value = [
+        {"Contents": [{"Key": f"test_session_key/{i}.png"} for i in range(1000)]},
+        {"Contents": [{"Key": "test_session_key/last.png"}]},
+    ]
+    session_object = get_session_object()
+    add_user_uploaded_file(session_object, "last.png")
+
+    delete_session_files(Mock(), session_object)
+
+    # every page is deleted, not just the first
+    assert [len(call.kwargs["Delete"]["Objects"]) for call in s3_client.delete_objects.call_args_list] == [1000, 1]
+    assert cache.hgetall(get_uploaded_files_cache_key("test_session_key")) == {}
+
+
+@patch("utils.s3.get_s3_client_from_storage")
+def test_store_documents_in_permanent_bucket(mocked_get_s3_client):
+    def copy_object(CopySource, Bucket, Key):
+        if CopySource["Key"] == "session/broken.pdf":
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "CopyObject")
+
+    mocked_get_s3_client.return_value.copy_object.side_effect = copy_object
+
+    copies = store_documents_in_permanent_bucket(["session/file.pdf", "session/broken.pdf"], "licence")
+
+    assert [copy.new_key for copy in copies] == ["licence/session/file.pdf", "licence/session/broken.pdf"]
+    assert copies[0].error is None
+    assert isinstance(copies[1].error, ClientError)
+    assert mocked_get_s3_client.return_value.copy_object.call_count == 2
+
+
+@patch("utils.s3.get_s3_client_from_storage")
+def test_store_documents_in_permanent_bucket_unexpected_error(mocked_get_s3_client):
+    def copy_object(CopySource, Bucket, Key):
+        if CopySource["Key"] == "session/broken.pdf":
+            raise ValueError("Unexpected error")
+
+    mocked_get_s3_client.return_value.copy_object.side_effect = copy_object
+
+    copies = store_documents_in_permanent_bucket(["session/file.pdf", "session/broken.pdf"], "licence")
+
+    # the error is kept with the copy it came from, rather than stopping the other copies
+    assert copies[0].error is None
+    assert isinstance(copies[1].error, ValueError)
@@ -1,7 +1,11 @@
+from datetime import timedelta
 from unittest.mock import patch
 
 import pytest
-from apply_for_a_licence.choices import TypeOfRelationshipChoices
+from apply_for_a_licence.choices import (
+    DocumentStorageStatusChoices,
+    TypeOfRelationshipChoices,
+)
 from apply_for_a_licence.models import (
     Document,
     Individual,
@@ -9,8 +13,15 @@ from apply_for_a_licence.models import (
     Session,
     UserEmailVerification,
 )
-from utils.save_to_db import SaveToDB
+from botocore.exceptions import ClientError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from freezegun import freeze_time
+from utils.s3 import DocumentCopy
+from utils.save_to_db import SaveToDB, store_pending_documents
 
+from tests.factories import LicenceFactory
 from tests.test_unit.test_utils import data
 
 
@@ -112,6 +123,25 @@ def test_save_recipients(request_object):
     assert licence_recipients[0].relationship_provider == "friends"
     assert licence_recipients[1].name == "Recipient 2"
     assert licence_recipients[1].relationship_provider == "suppliers"
+    # the historical records are created along with them
+    assert Organisation.history.filter(licence_id=save_object.licence_object.id, history_type="+").count() == 2
+
+
+@pytest.mark.django_db
+def test_save_recipients_number_of_queries(request_object):
+    def count_queries(recipients: dict) -> int:
+        request_object.session["recipients"] = recipients
+        save_object = save_a_licence(request_object, is_individual=False, is_on_companies_house=False, is_third_party=False)
+        save_object.save_licence()
+        with CaptureQueriesContext(connection) as queries:
+            save_object.save_recipient()
+        return len(queries)
+
+    many_recipients = {
+        f"recipient{index}": {**recipient, "cleaned_data": {**recipient["cleaned_data"], "name": f"Recipient {index}"}}
+        for index, recipient in enumerate(list(data.recipients.values()) * 10)
+    }
+    assert count_queries(many_recipients) == count_queries(data.recipients)
 
 
 @pytest.mark.django_db
@@ -162,26 +192,90 @@ def test_save_business_employing_individual(request_object):
     assert licence_business[0].country == "AU"
 
 
-@patch("utils.save_to_db.store_document_in_permanent_bucket")
 @patch("utils.save_to_db.get_all_session_files")
 @pytest.mark.django_db
-def test_save_document(mocked_get_all_session_files, mocked_store_document_in_permanent_bucket, request_object):
-    user_session = Session.objects.get(session_key=request_object.session.session_key)
+def test_save_document(mocked_get_all_session_files, request_object):
     save_object = save_a_licence(request_object, is_individual=True, is_on_companies_house=False, is_third_party=False)
 
     save_object.save_licence()
     mocked_get_all_session_files.return_value = {
-        user_session: {
+        "session/file.pdf": {
             "file_name": "file.pdf",
             "url": "file_url",
         }
     }
-    mocked_store_document_in_permanent_bucket.return_value = "file.pdf"
     save_object.save_documents()
     documents = Document.objects.filter(
         licence=save_object.licence_object.id,
     )
 
     assert len(documents) == 1
-    assert documents[0].file.name == "file.pdf"
+    assert documents[0].file.name == f"{save_object.licence_object.pk}/session/file.pdf"
     assert "file.pdf" in documents[0].file.url
+
+
+@patch("utils.save_to_db.store_documents_in_permanent_bucket")
+@patch("utils.save_to_db.get_all_session_files")
+@pytest.mark.django_db
+def test_promote_documents(mocked_get_all_session_files, mocked_store_documents_in_permanent_bucket, request_object):
+    save_object = save_a_licence(request_object, is_individual=True, is_on_companies_house=False, is_third_party=False)
+    save_object.save_licence()
+    mocked_get_all_session_files.return_value = {
+        "session/file.pdf": {"file_name": "file.pdf", "url": "file_url"},
+        "session/broken.pdf": {"file_name": "broken.pdf", "url": "file_url"},
+    }
+    save_object.save_documents()
+    licence_pk = save_object.licence_object.pk
+    mocked_store_documents_in_permanent_bucket.return_value = [
+        DocumentCopy("session/file.pdf", f"{licence_pk}/session/file.pdf", 10.0),
+        DocumentCopy("session/broken.pdf", f"{licence_pk}/session/broken.pdf", 5.0, ClientError({}, "CopyObject")),
+    ]
+
+    save_object.promote_documents()
+
+    mocked_store_documents_in_permanent_bucket.assert_called_once_with(
+        ["session/file.pdf", "session/broken.pdf"], save_object.licence_object.pk
+    )
+    stored = Document.objects.get(file=f"{licence_pk}/session/file.pdf")
+    assert stored.storage_status == DocumentStorageStatusChoices.stored
+    # the document that couldn't be copied is kept, to be tried again
+    broken = Document.objects.get(file=f"{licence_pk}/session/broken.pdf")
+    assert broken.storage_status == DocumentStorageStatusChoices.pending
+    assert broken.copy_attempts == 1
+    assert "CopyObject" in broken.last_copy_error
+
+
+@patch("utils.save_to_db.store_documents_in_permanent_bucket")
+@pytest.mark.django_db
+def test_store_pending_documents(mocked_store_documents_in_permanent_bucket, settings):
+    settings.DOCUMENT_COPY_RETRY_DELAY_SECONDS = 60
+    settings.DOCUMENT_COPY_MAX_ATTEMPTS = 3
+    licence = LicenceFactory()
+    with freeze_time(timezone.now() - timedelta(seconds=61)):
+        retried = Document.objects.create(
+            licence=licence, file=f"{licence.pk}/session/file.pdf", storage_status=DocumentStorageStatusChoices.pending
+        )
+        given_up = Document.objects.create(
+            licence=licence,
+            file=f"{licence.pk}/session/broken.pdf",
+            storage_status=DocumentStorageStatusChoices.pending,
+            copy_attempts=2,
+        )
+    # the copy made when it was submitted may still be going
+    Document.objects.create(
+        licence=licence, file=f"{licence.pk}/session/new.pdf", storage_status=DocumentStorageStatusChoices.pending
+    )
+    mocked_store_documents_in_permanent_bucket.return_value = [
+        DocumentCopy("session/file.pdf", f"{licence.pk}/session/file.pdf", 10.0),
+        DocumentCopy("session/broken.pdf", f"{licence.pk}/session/broken.pdf", 5.0, ClientError({}, "CopyObject")),
+    ]
+
+    assert store_pending_documents() == 2
+
+    mocked_store_documents_in_permanent_bucket.assert_called_once_with(["session/file.pdf", "session/broken.pdf"], licence.pk)
+    retried.refresh_from_db()
+    assert retried.storage_status == DocumentStorageStatusChoices.stored
+    # it's kept, and marked as failed so caseworkers can see it's missing
+    given_up.refresh_from_db()
+    assert given_up.storage_status == DocumentStorageStatusChoices.failed
+    assert given_up.copy_attempts == 3
@@ -0,0 +1,37 @@
+import zipfile
+from io import BytesIO
+
+from utils.zip import stream_zip
+
+
+def test_stream_zip():
+    files = [
+        ("ABC123/application-ABC123.pdf", [b"pdf"]),
+        ("ABC123/documents/large.txt", (b"x" * 1024 for _ in range(1024))),
+    ]
+    chunks = list(stream_zip(files))
+
+    # the archive is yielded as it's written, rather than in one go at the end
+    assert len([chunk for chunk in chunks if chunk]) > 2
+    with zipfile.ZipFile(BytesIO(b"".join(chunks))) as zip_file:
+        assert zip_file.namelist() == ["ABC123/application-ABC123.pdf", "ABC123/documents/large.txt"]
+        assert zip_file.read("ABC123/application-ABC123.pdf") == b"pdf"
+        assert zip_file.read("ABC123/documents/large.txt") == b"x" * 1024 * 1024
+        assert zip_file.testzip() is None
+
+
+def test_stream_zip_no_files():
+    with zipfile.ZipFile(BytesIO(b"".join(stream_zip([])))) as zip_file:
+        assert zip_file.namelist() == []
+
+
+def test_stream_zip_file_fails():
+    def get_chunks():
+        yield b"start"
+        raise OSError("Connection reset")
+
+    files = [("broken.txt", get_chunks()), ("fine.txt", [b"fine"])]
+    with zipfile.ZipFile(BytesIO(b"".join(stream_zip(files)))) as zip_file:
+        assert zip_file.namelist() == ["broken.txt", "broken.txt.failed.txt", "fine.txt"]
+        assert zip_file.read("fine.txt") == b"fine"
+        assert zip_file.testzip() is None
@@ -1,10 +1,18 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
 from django.test import override_settings
 from django.urls import reverse
 from view_a_licence.utils import (
     craft_view_a_licence_url,
+    get_bulk_export_files,
     get_view_a_licence_application_url,
 )
 
+from tests.factories import LicenceFactory
+
 
 @override_settings(PROTOCOL="https://", VIEW_A_LICENCE_DOMAIN="view-a-licence.com")
 def test_craft_view_a_licence_url():
@@ -24,3 +32,31 @@ def test_get_view_a_licence_application_url_matches_hardcoded_url():
     actual_url = reverse("view_a_licence:view_application", kwargs={"reference": "123"})
     crafted_url = get_view_a_licence_application_url("123")
     assert crafted_url == actual_url
+
+
+@pytest.mark.django_db
+@patch("view_a_licence.utils.get_licence_pdf")
+def test_get_bulk_export_files_bounded(mocked_get_licence_pdf, settings):
+    settings.BULK_EXPORT_WORKERS = 2
+    licences = LicenceFactory.create_batch(5)
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def get_licence_pdf(licence, template_name, header):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return licence.reference.encode()
+
+    mocked_get_licence_pdf.side_effect = get_licence_pdf
+    files = list(get_bulk_export_files(licences, "view_a_licence/view_application_pdf.html", "header"))
+
+    # the files come back in order, and no more than BULK_EXPORT_WORKERS are fetched at once
+    assert [name for name, _ in files] == [f"{licence.reference}/application-{licence.reference}.pdf" for licence in licences]
+    assert [b"".join(chunks) for _, chunks in files] == [licence.reference.encode() for licence in licences]
+    assert max_in_flight <= 2
@@ -1,6 +1,25 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from apply_for_a_licence.choices import (
+    TypeOfRelationshipChoices,
+    WhoDoYouWantTheLicenceToCoverChoices,
+)
+from apply_for_a_licence.models import Licence
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from view_a_licence.search import FACET_COUNTS_CACHE_KEY_PREFIX
+
+from tests.factories import IndividualFactory, LicenceFactory, OrganisationFactory
+
 
-from tests.factories import LicenceFactory
+@pytest.fixture(autouse=True)
+def clear_facet_counts():
+    for cache_key in list(cache.iter_keys(f"{FACET_COUNTS_CACHE_KEY_PREFIX}:*")):
+        cache.delete(cache_key)
 
 
 class TestApplicationListView:
@@ -8,5 +27,183 @@ class TestApplicationListView:
         LicenceFactory.create_batch(3)
         response = vl_client_logged_in.get(reverse("view_a_licence:application_list"))
         objects = response.context["licence_list"]
-        assert objects.count() == 3
+        assert len(objects) == 3
         assert objects[0].created_at > objects[1].created_at > objects[2].created_at
+
+    def test_oldest_first(self, vl_client_logged_in):
+        LicenceFactory.create_batch(3)
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list") + "?sort_by=oldest")
+        objects = response.context["licence_list"]
+        assert objects[0].created_at < objects[1].created_at < objects[2].created_at
+        assert response.context["selected_sort"] == "oldest"
+
+    def test_pagination(self, vl_client_logged_in, monkeypatch):
+        monkeypatch.setattr("view_a_licence.views.ApplicationListView.page_size", 2)
+        licences = LicenceFactory.create_batch(5)
+        newest_first = sorted(licences, key=lambda licence: (licence.created_at, licence.pk), reverse=True)
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+        assert response.context["licence_list"] == newest_first[:2]
+        assert response.context["previous_cursor"] is None
+
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list") + f"?after={response.context['next_cursor']}"
+        )
+        assert response.context["licence_list"] == newest_first[2:4]
+
+        last_page = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list") + f"?after={response.context['next_cursor']}"
+        )
+        assert last_page.context["licence_list"] == newest_first[4:]
+        assert last_page.context["next_cursor"] is None
+
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list") + f"?before={last_page.context['previous_cursor']}"
+        )
+        assert response.context["licence_list"] == newest_first[2:4]
+
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list") + f"?before={response.context['previous_cursor']}"
+        )
+        assert response.context["licence_list"] == newest_first[:2]
+        assert response.context["previous_cursor"] is None
+        assert response.context["next_cursor"] is not None
+
+    def test_invalid_cursor(self, vl_client_logged_in):
+        LicenceFactory.create_batch(3)
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list") + "?after=invalid")
+        assert len(response.context["licence_list"]) == 3
+
+    def test_number_of_queries_does_not_depend_on_number_of_licences(self, vl_client_logged_in):
+        def create_licences():
+            for _ in range(2):
+                business_licence = LicenceFactory(
+                    who_do_you_want_the_licence_to_cover=WhoDoYouWantTheLicenceToCoverChoices.business.value
+                )
+                OrganisationFactory(licence=business_licence, type_of_relationship=TypeOfRelationshipChoices.business)
+                OrganisationFactory(licence=business_licence, type_of_relationship=TypeOfRelationshipChoices.recipient)
+                individual_licence = LicenceFactory(
+                    who_do_you_want_the_licence_to_cover=WhoDoYouWantTheLicenceToCoverChoices.individual.value
+                )
+                IndividualFactory(licence=individual_licence)
+
+        create_licences()
+        # the first request also caches the site
+        vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+        with CaptureQueriesContext(connection) as queries:
+            vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+
+        create_licences()
+        with CaptureQueriesContext(connection) as more_queries:
+            response = vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+
+        assert len(response.context["licence_list"]) == 8
+        assert len(more_queries) == len(queries)
+
+
+class TestSearchApplicationList:
+    def test_search(self, vl_client_logged_in):
+        licence = LicenceFactory(applicant_full_name="Ada Lovelace", service_activities="Advising on shipping insurance")
+        OrganisationFactory(
+            licence=licence,
+            name="Analytical Engines Ltd",
+            registered_company_number="12345678",
+            type_of_relationship=TypeOfRelationshipChoices.recipient,
+        )
+        LicenceFactory(applicant_full_name="Charles Babbage", service_activities="Accounting")
+
+        for query in ("lovelace", "analytical engines", "12345678", licence.reference, "insured", "advise"):
+            response = vl_client_logged_in.get(reverse("view_a_licence:application_list"), data={"q": query})
+            assert response.context["licence_list"] == [licence], query
+
+    def test_search_is_updated_when_application_changes(self, vl_client_logged_in):
+        licence = LicenceFactory(applicant_full_name="Ada Lovelace")
+        organisation = OrganisationFactory(
+            licence=licence, name="Analytical Engines Ltd", type_of_relationship=TypeOfRelationshipChoices.recipient
+        )
+
+        licence.applicant_full_name = "Ada King"
+        licence.save()
+        organisation.name = "Difference Engines Ltd"
+        organisation.save()
+
+        for query, expected in (("king", [licence]), ("lovelace", []), ("difference", [licence]), ("analytical", [])):
+            response = vl_client_logged_in.get(reverse("view_a_licence:application_list"), data={"q": query})
+            assert response.context["licence_list"] == expected, query
+
+        organisation.delete()
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list"), data={"q": "difference"})
+        assert response.context["licence_list"] == []
+
+    def test_facets(self, vl_client_logged_in):
+        LicenceFactory(
+            regimes=["Russia", "Belarus"],
+            who_do_you_want_the_licence_to_cover=WhoDoYouWantTheLicenceToCoverChoices.business.value,
+        )
+        LicenceFactory(
+            regimes=["Russia"],
+            who_do_you_want_the_licence_to_cover=WhoDoYouWantTheLicenceToCoverChoices.myself.value,
+        )
+
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list"),
+            data={"regimes": "Belarus"},
+        )
+
+        assert len(response.context["licence_list"]) == 1
+        facets = {facet.name: facet for facet in response.context["facets"]}
+        # the counts for a facet aren't filtered by the facet itself, so the other values can still be selected
+        assert [(option.value, option.count, option.selected) for option in facets["regimes"].options] == [
+            ("Belarus", 1, True),
+            ("Russia", 2, False),
+        ]
+        assert [(option.value, option.count) for option in facets["who_do_you_want_the_licence_to_cover"].options] == [
+            ("business", 1),
+        ]
+        assert "regimes=Belarus" in response.context["search_parameters"]
+
+    def test_facet_counts_cached(self, vl_client_logged_in):
+        LicenceFactory(regimes=["Russia"])
+        vl_client_logged_in.get(reverse("view_a_licence:application_list"))
+        LicenceFactory(regimes=["Belarus"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = vl_client_logged_in.get(reverse("view_a_licence:application_list"), data={"regimes": "Russia"})
+        # filtering on a facet doesn't change its own counts, so they're still those of all the licences, from the cache
+        assert not [query for query in queries if "unnest" in query["sql"]]
+        facets = {facet.name: facet for facet in response.context["facets"]}
+        assert [(option.value, option.count) for option in facets["regimes"].options] == [("Russia", 1)]
+
+        # anything else being searched for is counted on its own
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list"), data={"regimes": "Russia", "date_min": "2000-01-01"}
+        )
+        facets = {facet.name: facet for facet in response.context["facets"]}
+        assert [(option.value, option.count) for option in facets["regimes"].options] == [("Belarus", 1), ("Russia", 1)]
+
+    def test_date_range(self, vl_client_logged_in):
+        licence = LicenceFactory()
+
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list"),
+            data={"date_min": licence.created_at.date().isoformat(), "date_max": licence.created_at.date().isoformat()},
+        )
+        assert response.context["licence_list"] == [licence]
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:application_list"), data={"date_min": "2999-01-01"})
+        assert response.context["licence_list"] == []
+
+    def test_date_range_is_whole_days(self, vl_client_logged_in):
+        day = date(2025, 3, 10)
+        start_of_day = timezone.make_aware(datetime.combine(day, time.min))
+        licence = LicenceFactory()
+        Licence.objects.filter(pk=licence.pk).update(created_at=start_of_day + timedelta(days=1) - timedelta(microseconds=1))
+        before = LicenceFactory()
+        Licence.objects.filter(pk=before.pk).update(created_at=start_of_day - timedelta(microseconds=1))
+        after = LicenceFactory()
+        Licence.objects.filter(pk=after.pk).update(created_at=start_of_day + timedelta(days=1))
+
+        response = vl_client_logged_in.get(
+            reverse("view_a_licence:application_list"), data={"date_min": day.isoformat(), "date_max": day.isoformat()}
+        )
+        assert response.context["licence_list"] == [licence]
@@ -0,0 +1,124 @@
+import zipfile
+from io import BytesIO
+from unittest.mock import patch
+
+from apply_for_a_licence.models import Document
+from asgiref.sync import async_to_sync
+from botocore.exceptions import ClientError
+from core.sites import SiteName
+from django.contrib.sites.models import Site
+from django.test import AsyncClient
+from django.urls import reverse
+
+from tests.factories import LicenceFactory
+
+
+@patch("view_a_licence.utils.get_s3_client_from_storage")
+@patch("view_a_licence.utils.get_licence_pdf", return_value=b"pdf")
+class TestBulkExportView:
+    def get_zip_file(self, response) -> zipfile.ZipFile:
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/zip"
+        return zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+
+    def test_selected_applications(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        licence = LicenceFactory(reference="ABC123")
+        LicenceFactory(reference="DEF456")
+        LicenceFactory(reference="GHI789")
+        Document.objects.create(licence=licence, file="session/document.pdf")
+        mocked_get_s3_client.return_value.get_object.return_value["Body"].iter_chunks.return_value = iter([b"document"])
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"references": ["ABC123", "DEF456"]})
+        with self.get_zip_file(response) as zip_file:
+            assert sorted(zip_file.namelist()) == [
+                "ABC123/application-ABC123.pdf",
+                "ABC123/documents/document.pdf",
+                "DEF456/application-DEF456.pdf",
+            ]
+            assert zip_file.read("ABC123/application-ABC123.pdf") == b"pdf"
+            assert zip_file.read("ABC123/documents/document.pdf") == b"document"
+
+        mocked_get_s3_client.return_value.get_object.assert_called_once_with(
+            Bucket="permanent-document-bucket", Key="session/document.pdf"
+        )
+
+    def test_date_range(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        licence = LicenceFactory(reference="ABC123")
+        date = licence.created_at.date().isoformat()
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"date_min": date, "date_max": date})
+        with self.get_zip_file(response) as zip_file:
+            assert zip_file.namelist() == ["ABC123/application-ABC123.pdf"]
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"date_max": "2000-01-01"})
+        assert response.status_code == 400
+
+    def test_failed_file(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        LicenceFactory(reference="ABC123")
+        mocked_get_licence_pdf.side_effect = Exception("Failed to render")
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"references": ["ABC123"]})
+        with self.get_zip_file(response) as zip_file:
+            assert zip_file.namelist() == ["ABC123/application-ABC123.pdf.failed.txt"]
+
+    def test_nothing_selected(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"))
+        assert response.status_code == 400
+
+    def test_invalid_date(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"date_min": "2024-02-30"})
+        assert response.status_code == 400
+
+    def test_too_many_applications(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in, settings):
+        settings.BULK_EXPORT_MAX_APPLICATIONS = 1
+        LicenceFactory(reference="ABC123")
+        LicenceFactory(reference="DEF456")
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"references": ["ABC123", "DEF456"]})
+        assert response.status_code == 400
+
+    def test_streamed_under_asgi(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        licence = LicenceFactory(reference="ABC123")
+        Document.objects.create(licence=licence, file="session/document.pdf")
+        mocked_get_s3_client.return_value.get_object.return_value["Body"].iter_chunks.return_value = iter(
+            [b"x" * 1024 for _ in range(1024)]
+        )
+        # the async test client always sends requests to testserver
+        Site.objects.filter(name=SiteName.view_a_licence).update(domain="testserver")
+        client = AsyncClient()
+        client.cookies = vl_client_logged_in.cookies
+
+        @async_to_sync
+        async def get_chunks() -> list[bytes]:
+            response = await client.get(
+                reverse("view_a_licence:bulk_export"),
+                data={"references": ["ABC123"]},
+            )
+            assert response.status_code == 200
+            assert response.is_async
+            return [chunk async for chunk in response.streaming_content]
+
+        chunks = get_chunks()
+        # the ZIP is sent as it's written, not built up in memory first
+        assert len([chunk for chunk in chunks if chunk]) > 2
+        with zipfile.ZipFile(BytesIO(b"".join(chunks))) as zip_file:
+            assert zip_file.read("ABC123/documents/document.pdf") == b"x" * 1024 * 1024
+
+    def test_document_fails_part_way(self, mocked_get_licence_pdf, mocked_get_s3_client, vl_client_logged_in):
+        licence = LicenceFactory(reference="ABC123")
+        Document.objects.create(licence=licence, file="session/document.pdf")
+
+        def get_chunks():
+            yield b"first chunk"
+            raise ClientError({"Error": {"Code": "500"}}, "GetObject")
+
+        mocked_get_s3_client.return_value.get_object.return_value["Body"].iter_chunks.return_value = get_chunks()
+
+        response = vl_client_logged_in.get(reverse("view_a_licence:bulk_export"), data={"references": ["ABC123"]})
+        with self.get_zip_file(response) as zip_file:
+            assert zip_file.testzip() is None
+            assert sorted(zip_file.namelist()) == [
+                "ABC123/application-ABC123.pdf",
+                "ABC123/documents/document.pdf",
+                "ABC123/documents/document.pdf.failed.txt",
+            ]
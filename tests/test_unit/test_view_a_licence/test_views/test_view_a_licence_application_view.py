@@ -1,7 +1,9 @@
 from apply_for_a_licence.choices import (
+    DocumentStorageStatusChoices,
     TypeOfRelationshipChoices,
     WhoDoYouWantTheLicenceToCoverChoices,
 )
+from apply_for_a_licence.models import Document
 from django.urls import reverse
 
 from tests.factories import OrganisationFactory
@@ -17,3 +19,16 @@ def test_context_data(vl_client_logged_in, licence):
     )
     response = vl_client_logged_in.get(reverse("view_a_licence:view_application", kwargs={"reference": licence.reference}))
     assert response.context["business_individuals_work_for"] == org
+
+
+def test_document_not_stored(vl_client_logged_in, licence):
+    licence.assign_reference()
+    licence.who_do_you_want_the_licence_to_cover = WhoDoYouWantTheLicenceToCoverChoices.business
+    licence.save()
+    Document.objects.create(
+        licence=licence, file=f"{licence.pk}/session/missing.pdf", storage_status=DocumentStorageStatusChoices.failed
+    )
+    response = vl_client_logged_in.get(reverse("view_a_licence:view_application", kwargs={"reference": licence.reference}))
+    # it's listed, but not linked to
+    assert "missing.pdf (couldn't be stored, ask the applicant to send it again)" in response.content.decode()
+    assert "missing.pdf</a>" not in response.content.decode()
@@ -3,6 +3,7 @@ from unittest.mock import patch
 import pytest
 from apply_for_a_licence.choices import WhoDoYouWantTheLicenceToCoverChoices
 from authentication.mixins import LoginRequiredMixin
+from core.models import OutboxEmail
 from django.contrib.auth.models import User
 from django.urls import reverse
 from view_a_licence.mixins import ActiveUserRequiredMixin, StaffUserOnlyMixin
@@ -12,7 +13,7 @@ from tests.factories import LicenceFactory
 
 @pytest.mark.django_db
 class TestApplicationListView:
-    @patch("view_a_licence.mixins.send_email")
+    @patch("view_a_licence.mixins.queue_emails")
     def test_successful_view_application_list(self, mock_email, vl_client):
         test_user = User.objects.create_user(
             "John",
@@ -25,7 +26,7 @@ class TestApplicationListView:
         assert response.status_code == 200
         mock_email.assert_not_called()
 
-    @patch("view_a_licence.mixins.send_email")
+    @patch("view_a_licence.mixins.queue_emails")
     def test_inactive_user_view_application_list(self, mock_email, vl_client):
         test_user = User.objects.create_user(
             "John",
@@ -39,6 +40,28 @@ class TestApplicationListView:
         response = vl_client.get(reverse("view_a_licence:application_list"))
         assert response.status_code == 401
         mock_email.assert_called_once()
+        assert mock_email.call_args.args[0] == ["staff@example.com"]
+        assert mock_email.call_args.kwargs["context"]["user_email"] == "test@example.com"
+
+    def test_inactive_user_staff_only_alerted_once(self, vl_client, django_capture_on_commit_callbacks):
+        test_user = User.objects.create_user(
+            "John",
+            "test@example.com",
+            is_active=False,
+        )
+        vl_client.force_login(test_user)
+        User.objects.create_user("Polly", "staff@example.com", is_staff=True, is_active=True)
+        User.objects.create_user("Peter", "staff2@example.com", is_staff=True, is_active=True)
+
+        with patch("utils.notifier.run_in_background") as mock_run_in_background:
+            with django_capture_on_commit_callbacks(execute=True):
+                for _ in range(3):
+                    response = vl_client.get(reverse("view_a_licence:application_list"))
+                    assert response.status_code == 401
+
+        # the alerts are left in the outbox for the worker, rather than being sent while the user waits
+        assert sorted(OutboxEmail.objects.values_list("email", flat=True)) == ["staff2@example.com", "staff@example.com"]
+        mock_run_in_background.assert_called_once()
 
     def test_anonymous_user(self, vl_client, licence):
         response = vl_client.get(reverse("view_a_licence:application_list"))
@@ -50,7 +73,7 @@ class TestApplicationListView:
 
 @pytest.mark.django_db
 class TestViewApplicationView:
-    @patch("view_a_licence.mixins.send_email")
+    @patch("view_a_licence.mixins.queue_emails")
     def test_successful_view_a_single_licence_application(self, mock_email, vl_client):
         test_user = User.objects.create_user(
             "John",
@@ -65,7 +88,7 @@ class TestViewApplicationView:
         assert response.status_code == 200
         mock_email.assert_not_called()
 
-    @patch("view_a_licence.mixins.send_email")
+    @patch("view_a_licence.mixins.queue_emails")
     def test_inactive_user_view_a_single_licence_application(self, mock_email, vl_client):
         test_user = User.objects.create_user(
             "John",